@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""
+Общий пакет AGI-скриптов
+Скрипты в agi-bin — тонкие точки входа, которые импортируют main() из модулей пакета.
+Модули импортируют только то, что нужно на пути вызова, тяжёлые зависимости
+(psycopg2, websockets) загружаются при первом обращении
+"""
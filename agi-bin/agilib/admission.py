@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+
+"""
+Контроль допуска и деградация AGI-обработчиков под нагрузкой
+
+AdmissionController ограничивает число одновременных обращений к БД
+из обработчиков верификации. Слоты — файлы с блокировкой flock, поэтому
+лимит общий для отдельных AGI-процессов и потоков FastAGI-сервера,
+а блокировка снимается ядром при аварийном завершении процесса.
+Если свободного слота нет, обработчик встаёт в ограниченную очередь
+ожидания; при переполнении очереди или истечении ожидания включается
+режим сброса нагрузки (AGI_LOAD=OVERLOAD):
+  - поиск клиента только по локальному кэшу (agilib/client_cache.py)
+  - отложенная запись логов в спул (DeferredWrites)
+  - пропуск конвертации записи (agilib/recording.py)
+
+Отложенные записи выполняет команда (из каталога agi-bin):
+    python3 -m agilib.admission drain [--loop СЕКУНДЫ]
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import time
+
+from agilib import metrics as agi_metrics
+from agilib.lazy import lazy_import
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, List, Optional, Sequence
+
+# Уровни нагрузки для переменной канала AGI_LOAD
+LOAD_NORMAL = "NORMAL"
+LOAD_BUSY = "BUSY"
+LOAD_OVERLOAD = "OVERLOAD"
+
+ADMISSION_DIR = os.getenv("ADMISSION_DIR", os.path.join(os.getenv("TMPDIR", "/tmp"), "agi-admission"))
+ADMISSION_SLOTS = int(os.getenv("ADMISSION_SLOTS", "8"))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "16"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "2.0"))
+
+SPOOL_DIR = os.getenv("DEFERRED_SPOOL_DIR", "/var/spool/asterisk/agi-deferred")
+
+# logging тянет traceback, string и textwrap — загружается только при первой записи в лог
+logging = lazy_import("logging")
+
+
+def _logger():
+    return logging.getLogger(__name__)
+
+
+class Ticket:
+    """Результат допуска: уровень нагрузки и занятый слот (если есть)"""
+
+    def __init__(self, handler: str, level: str, fd: Optional[int] = None, waited: float = 0.0):
+        self.handler = handler
+        self.level = level
+        self.waited = waited
+        self._fd = fd
+
+    @property
+    def admitted(self) -> bool:
+        """Обработчику выделен слот для работы с БД"""
+        return self._fd is not None
+
+    @property
+    def shed(self) -> bool:
+        """Включён режим сброса нагрузки"""
+        return self.level == LOAD_OVERLOAD
+
+    def degrade(self, reason: str) -> None:
+        """Переводит обработчик в режим сброса нагрузки (например, БД недоступна)"""
+        if self.level != LOAD_OVERLOAD:
+            self.level = LOAD_OVERLOAD
+            agi_metrics.emit("admission_degraded_total", handler=self.handler, reason=reason)
+        self.release()
+
+    def release(self) -> None:
+        """Освобождает слот"""
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Ограничитель параллелизма с ограниченной очередью ожидания"""
+
+    POLL_INTERVAL = 0.02
+    POLL_INTERVAL_MAX = 0.1
+
+    def __init__(self, handler: str, pool: str = "db", slots: int = ADMISSION_SLOTS,
+                 queue: int = ADMISSION_QUEUE, max_wait: float = ADMISSION_MAX_WAIT,
+                 lock_dir: str = ADMISSION_DIR):
+        """
+        Args:
+            handler: Имя обработчика (для метрик)
+            pool: Имя общего пула слотов
+            slots: Число одновременно допущенных обработчиков
+            queue: Максимальная длина очереди ожидания
+            max_wait: Максимальное время ожидания слота, сек
+            lock_dir: Каталог файлов блокировок
+        """
+        self.handler = handler
+        self.pool = pool
+        self.slots = slots
+        self.queue = queue
+        self.max_wait = max_wait
+        self.lock_dir = lock_dir
+
+    def _try_lock(self, kind: str, count: int) -> Optional[int]:
+        """Пытается занять любой свободный файл-слот без ожидания"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        start = int.from_bytes(os.urandom(2), "little") % count if count else 0
+        for i in range(count):
+            path = os.path.join(self.lock_dir, f"{self.pool}.{kind}.{(start + i) % count}")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o660)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, wait: bool = True) -> Ticket:
+        """
+        Запрашивает допуск
+
+        Args:
+            wait: Разрешено ли ждать в очереди
+
+        Returns:
+            Ticket с уровнем нагрузки NORMAL (слот сразу), BUSY (слот после
+            ожидания) или OVERLOAD (слот не получен — сброс нагрузки)
+        """
+        try:
+            fd = self._try_lock("slot", self.slots)
+        except OSError as e:
+            # Нет каталога блокировок — не ограничиваем, но фиксируем
+            _logger().warning(f"Контроль допуска недоступен: {e}")
+            agi_metrics.emit("admission_total", handler=self.handler, level="UNLIMITED")
+            return Ticket(self.handler, LOAD_NORMAL)
+
+        if fd is not None:
+            agi_metrics.emit("admission_total", handler=self.handler, level=LOAD_NORMAL)
+            return Ticket(self.handler, LOAD_NORMAL, fd)
+
+        queue_fd = self._try_lock("queue", self.queue) if wait else None
+        if queue_fd is None:
+            agi_metrics.emit("admission_total", handler=self.handler, level=LOAD_OVERLOAD)
+            agi_metrics.emit("admission_rejected_total", handler=self.handler,
+                             reason="queue_full" if wait else "no_slot")
+            return Ticket(self.handler, LOAD_OVERLOAD)
+
+        started = time.monotonic()
+        interval = self.POLL_INTERVAL
+        try:
+            while time.monotonic() - started < self.max_wait:
+                time.sleep(interval)
+                interval = min(interval * 2, self.POLL_INTERVAL_MAX)
+                fd = self._try_lock("slot", self.slots)
+                if fd is not None:
+                    waited = time.monotonic() - started
+                    agi_metrics.emit("admission_total", handler=self.handler, level=LOAD_BUSY)
+                    agi_metrics.emit("admission_wait_ms_total", waited * 1000, handler=self.handler)
+                    return Ticket(self.handler, LOAD_BUSY, fd, waited)
+        finally:
+            fcntl.flock(queue_fd, fcntl.LOCK_UN)
+            os.close(queue_fd)
+
+        waited = time.monotonic() - started
+        agi_metrics.emit("admission_total", handler=self.handler, level=LOAD_OVERLOAD)
+        agi_metrics.emit("admission_rejected_total", handler=self.handler, reason="timeout")
+        return Ticket(self.handler, LOAD_OVERLOAD, waited=waited)
+
+
+def record_shed(handler: str, mode: str) -> None:
+    """Фиксирует решение о сбросе нагрузки в метриках"""
+    agi_metrics.emit("shed_total", handler=handler, mode=mode)
+
+
+class DeferredWrites:
+    """
+    Спул отложенных записей в БД
+    Каждая запись — отдельный JSON-файл с именем канонического запроса agi_db
+    и его параметрами; файлы выполняются в порядке создания
+    """
+
+    def __init__(self, spool_dir: str = SPOOL_DIR):
+        self.spool_dir = spool_dir
+
+    @staticmethod
+    def now() -> str:
+        """Время события для запросов *_at/*_upsert"""
+        import datetime
+
+        return datetime.datetime.now().isoformat(sep=" ", timespec="microseconds")
+
+    def write(self, statement: str, params: Sequence[Any]) -> bool:
+        """Кладёт запрос в спул. Возвращает True при успехе"""
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            name = f"{time.time_ns():020d}-{os.urandom(4).hex()}"
+            tmp_path = os.path.join(self.spool_dir, f".{name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"statement": statement, "params": list(params)}, f, ensure_ascii=False)
+            os.replace(tmp_path, os.path.join(self.spool_dir, f"{name}.json"))
+            return True
+        except OSError as e:
+            _logger().error(f"Не удалось записать в спул: {e}")
+            return False
+
+    def pending(self) -> List[str]:
+        """Файлы спула в порядке создания"""
+        try:
+            return sorted(
+                os.path.join(self.spool_dir, name)
+                for name in os.listdir(self.spool_dir) if name.endswith(".json")
+            )
+        except FileNotFoundError:
+            return []
+
+    def drain(self, conn) -> int:
+        """
+        Выполняет отложенные записи на соединении psycopg2
+        Останавливается на первой ошибке БД (записи остаются в спуле)
+
+        Returns:
+            Число выполненных записей
+        """
+        import psycopg2
+
+        from agilib import db as agi_db
+
+        statements = agi_db.statements_for(conn)
+        done = 0
+        with conn.cursor() as cursor:
+            for path in self.pending():
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        record = json.load(f)
+                    if record["statement"] not in agi_db.STATEMENTS:
+                        raise ValueError(f"неизвестный запрос {record['statement']}")
+                except (OSError, ValueError, KeyError) as e:
+                    _logger().error(f"Повреждённая запись спула {path}: {e}")
+                    os.replace(path, f"{path}.bad")
+                    continue
+
+                try:
+                    statements.execute(cursor, record["statement"], record["params"])
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    _logger().error(f"Ошибка выполнения {record['statement']} из {path}: {e}")
+                    break
+
+                os.remove(path)
+                done += 1
+
+        if done:
+            agi_metrics.emit("deferred_drained_total", done)
+        return done
+
+
+def main():
+    """Точка входа: выполнение отложенных записей"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Контроль допуска AGI-обработчиков")
+    sub = parser.add_subparsers(dest="command", required=True)
+    drain_parser = sub.add_parser("drain", help="Выполнить отложенные записи в БД")
+    drain_parser.add_argument("--loop", type=float, default=0, help="Повторять каждые N секунд")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - DEFERRED - %(levelname)s - %(message)s')
+
+    import psycopg2
+
+    from agilib import config
+
+    spool = DeferredWrites()
+    conn = None
+    while True:
+        try:
+            if conn is None or conn.closed:
+                conn = psycopg2.connect(**config.db_config("agi_deferred_drain"))
+            done = spool.drain(conn)
+            if done:
+                _logger().info(f"✅ Выполнено отложенных записей: {done}, осталось: {len(spool.pending())}")
+        except psycopg2.Error as e:
+            _logger().error(f"❌ БД недоступна: {e}")
+            conn = None
+
+        if not args.loop:
+            break
+        time.sleep(args.loop)
+
+    if conn is not None:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+Локальный кэш клиентов для поиска без обращения к БД
+Заполняется при каждом успешном поиске клиента в БД (write-through)
+и используется в режиме сброса нагрузки (cache-only lookup).
+Один файл на ИНН с атомарной заменой — безопасно для параллельных AGI-процессов
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional
+
+CACHE_DIR = os.getenv("CLIENT_CACHE_DIR", "/var/lib/asterisk/agi-cache/clients")
+CACHE_TTL = int(os.getenv("CLIENT_CACHE_TTL", str(24 * 3600)))
+
+
+class ClientCache:
+    """Кэш записей clients по ИНН"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl: int = CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, inn: int) -> str:
+        return os.path.join(self.cache_dir, f"{int(inn)}.json")
+
+    def get(self, inn: int) -> Optional[Dict[str, Any]]:
+        """Возвращает клиента из кэша или None (нет записи или устарела)"""
+        path = self._path(inn)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, client: Dict[str, Any]) -> None:
+        """Сохраняет клиента в кэш"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(client["inn"])
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(client, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def delete(self, inn: int) -> None:
+        """Удаляет клиента из кэша (клиент не найден или деактивирован)"""
+        try:
+            os.remove(self._path(inn))
+        except OSError:
+            pass
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+
+"""
+AGI-скрипт для проверки кодового слова
+Ожидает уже установленную переменную VERIF_CODEWORD из предыдущего шага
+Устанавливает VERIF_STATUS = SUCCESS / WRONG / NO_INN / BLOCKED / ERROR
+(BLOCKED — превышен лимит попыток, см. agilib/limiter.py)
+и AGI_LOAD = NORMAL / BUSY / OVERLOAD (см. agilib/admission.py)
+Работает с таблицей verification_logs
+"""
+
+from __future__ import annotations
+
+import sys
+import re
+import os
+
+from basicagi import BasicAGI
+
+from agilib import config
+from agilib import db as agi_db
+from agilib import metrics as agi_metrics
+from agilib import profiler as agi_profiler
+from agilib.admission import AdmissionController, DeferredWrites, record_shed
+from agilib.client_cache import ClientCache
+from agilib.lazy import lazy_import
+from agilib.limiter import STAGE_CODEWORD, check_attempt
+from agilib.snapshot import ClientSnapshot
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Tuple
+
+psycopg2 = lazy_import("psycopg2")
+
+
+class CodeWordVerifier:
+    """Класс для проверки кодового слова"""
+    
+    # Конфигурация базы данных
+    DB_CONFIG = config.db_config("codeword_verifier_agi")
+    
+    # Статусы проверки
+    STATUS_SUCCESS = "SUCCESS"
+    STATUS_WRONG = "WRONG"
+    STATUS_NO_INN = "NO_INN"
+    STATUS_ERROR = "ERROR"
+    STATUS_BLOCKED = "BLOCKED"
+    
+    def __init__(self):
+        """Инициализация AGI и подключения к БД"""
+        self.agi = BasicAGI()
+        self.conn = None
+        self.cursor = None
+        self.db = None
+        self.ticket = None
+        self.client_cache = ClientCache()
+        self.snapshot = ClientSnapshot()
+        self.deferred = DeferredWrites()
+        
+    @staticmethod
+    def cleanup_text(text: str) -> str:
+        """
+        Очищает текст для сравнения
+        
+        Args:
+            text: Исходный текст
+            
+        Returns:
+            Очищенный текст (только буквы и цифры)
+        """
+        if not text:
+            return ""
+        # Приводим к нижнему регистру и удаляем всё кроме букв и цифр
+        # Поддерживаем русские и английские буквы
+        return re.sub(r'[^а-яёa-z0-9]', '', text.lower())
+    
+    def connect_to_db(self) -> bool:
+        """
+        Устанавливает соединение с базой данных
+        
+        Returns:
+            True если соединение успешно, иначе False
+        """
+        try:
+            self.conn = psycopg2.connect(**self.DB_CONFIG)
+            self.cursor = self.conn.cursor()
+            self.db = agi_db.statements_for(self.conn)
+            return True
+        except psycopg2.Error as e:
+            self.agi.verbose(f"Ошибка подключения к БД: {e}", 1)
+            return False
+    
+    def admit_and_connect(self) -> bool:
+        """
+        Запрашивает допуск к БД и подключается
+        При перегрузке или недоступности БД включает режим сброса нагрузки
+        
+        Returns:
+            True если соединение с БД установлено
+        """
+        self.ticket = AdmissionController("codeword_check").acquire()
+        if not self.ticket.shed and not self.connect_to_db():
+            self.ticket.degrade("db_connect")
+        
+        self.agi.set_variable("AGI_LOAD", self.ticket.level)
+        if self.ticket.shed:
+            self.agi.verbose(f"⚠ Перегрузка: режим сброса нагрузки (ожидание {self.ticket.waited:.2f} сек)", 1)
+        return self.conn is not None
+    
+    def get_agi_variables(self) -> Tuple[str, str, str, str]:
+        """
+        Получает необходимые переменные из AGI
+        
+        Returns:
+            Кортеж (spoken_text, uniqueid, inn_str, caller_number)
+        """
+        # SPEECH_RESULT задаёт speech_session.py; SPEECH_TEXT(0) — SpeechBackground, который
+        # диалплан вызывает только при ошибке сессии (ERROR). В остальных случаях SPEECH_TEXT(0)
+        # может остаться от предыдущей попытки этого же звонка
+        spoken_text = self.agi.get_variable("SPEECH_RESULT") or ""
+        if not spoken_text and self.agi.get_variable("SPEECH_STOP_REASON") == "ERROR":
+            spoken_text = self.agi.get_variable("SPEECH_TEXT(0)") or ""
+        uniqueid = self.agi.get_variable("UNIQUEID") or ""
+        inn_str = self.agi.get_variable("VERIF_INN") or ""
+        caller_number = self.agi.get_variable("CALLERID(num)") or ""
+        
+        return spoken_text.strip().lower(), uniqueid, inn_str, caller_number
+    
+    def find_log_entry(self, uniqueid: str, inn_value: int) -> Optional[int]:
+        """
+        Находит запись в логе верификации
+        
+        Args:
+            uniqueid: Уникальный ID вызова
+            inn_value: ИНН как число
+            
+        Returns:
+            ID записи если найдена, иначе None
+        """
+        try:
+            self.db.execute(self.cursor, "log_find_by_inn", (uniqueid, inn_value))
+            
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+            
+        except psycopg2.Error as e:
+            self.agi.verbose(f"Ошибка при поиске записи: {e}", 1)
+            return None
+    
+    def update_verification_log(self, spoken_text: str, uniqueid: str, 
+                               inn_str: str, caller_number: str) -> bool:
+        """
+        Обновляет запись в логе верификации
+        
+        Args:
+            spoken_text: Сказанное кодовое слово
+            uniqueid: Уникальный ID вызова
+            inn_str: Строка с ИНН
+            caller_number: Номер звонящего
+            
+        Returns:
+            True если запись обновлена, иначе False
+        """
+        try:
+            # Проверяем, что ИНН - число
+            inn_value = int(inn_str)
+            
+            # Сначала ищем существующую запись
+            log_id = self.find_log_entry(uniqueid, inn_value)
+            
+            if log_id:
+                # Обновляем существующую запись
+                self.db.execute(self.cursor, "log_update_codeword",
+                                (spoken_text, caller_number, log_id))
+            else:
+                # Создаем новую запись
+                self.db.execute(self.cursor, "log_insert_codeword",
+                                (uniqueid, caller_number, inn_value, spoken_text))
+            
+            if self.cursor.rowcount > 0:
+                self.conn.commit()
+                self.agi.verbose(f"✓ Запись в verification_logs обновлена (ID: {log_id if log_id else 'new'})", 1)
+                return True
+                
+        except ValueError as e:
+            self.agi.verbose(f"Некорректный ИНН: {inn_str} - {e}", 1)
+        except psycopg2.Error as e:
+            self.agi.verbose(f"Ошибка при обновлении лога: {e}", 1)
+            self.conn.rollback()
+            
+        return False
+    
+    def defer_verification_log(self, spoken_text: str, uniqueid: str,
+                               inn_str: str, caller_number: str) -> None:
+        """Откладывает обновление лога верификации (клиент из снимка или режим сброса нагрузки)"""
+        if not inn_str.isdigit():
+            return
+        inn_value = int(inn_str)
+        if self.ticket is not None:
+            record_shed("codeword_check", "deferred_write")
+        self.deferred.write("codeword_log_upsert", (
+            uniqueid, inn_value, spoken_text, caller_number,
+            uniqueid, caller_number, inn_value, spoken_text, self.deferred.now(),
+        ))
+        self.agi.verbose("Запись в verification_logs отложена", 2)
+    
+    def get_expected_codeword(self, inn_str: str) -> Optional[str]:
+        """
+        Получает ожидаемое кодовое слово из таблицы clients
+        
+        Args:
+            inn_str: Строка с ИНН
+            
+        Returns:
+            Ожидаемое кодовое слово или None
+        """
+        try:
+            inn_value = int(inn_str)
+            
+            self.db.execute(self.cursor, "codeword_by_inn", (inn_value,))
+            
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+            
+        except (ValueError, psycopg2.Error) as e:
+            self.agi.verbose(f"Ошибка при получении кодового слова: {e}", 1)
+            return None
+    
+    @classmethod
+    def verify_code_word(cls, spoken: str, expected: str) -> bool:
+        """
+        Проверяет соответствие кодового слова
+        
+        Args:
+            spoken: Сказанное слово
+            expected: Ожидаемое слово
+            
+        Returns:
+            True если слова совпадают, иначе False
+        """
+        if not spoken or not expected:
+            return False
+            
+        spoken_clean = cls.cleanup_text(spoken)
+        expected_clean = cls.cleanup_text(expected)
+        
+        # Проверяем точное совпадение или вхождение
+        exact_match = spoken_clean == expected_clean
+        contains_match = spoken_clean and spoken_clean in expected_clean
+        
+        # Дополнительная проверка для похожих слов (опционально)
+        # Например: "альт" и "олт" - считаем совпадением если разница не более 1 символа
+        fuzzy_match = False
+        if not exact_match and not contains_match:
+            # Простейшая проверка расстояния Левенштейна
+            if abs(len(spoken_clean) - len(expected_clean)) <= 1:
+                # Если длины почти равны, можно добавить более сложную логику
+                pass
+        
+        return exact_match or contains_match
+    
+    def run(self) -> None:
+        """Основной метод выполнения скрипта"""
+        try:
+            # Получаем переменные из AGI
+            spoken_text, uniqueid, inn_str, caller_number = self.get_agi_variables()
+            
+            self.agi.verbose(f"Проверка кодового слова для звонка {uniqueid}", 1)
+            self.agi.verbose(f"Сказано: '{spoken_text}', ИНН: {inn_str}, Номер: {caller_number}", 1)
+            
+            # Проверяем наличие ИНН
+            if not inn_str:
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_NO_INN)
+                self.agi.verbose("Нет сохранённого ИНН для проверки кодового слова", 1)
+                return
+
+            # Перебор кодовых слов отсекается до обращения к БД
+            allowed, limit = check_attempt(STAGE_CODEWORD, caller_number,
+                                           int(inn_str) if inn_str.isdigit() else None)
+            if not allowed:
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_BLOCKED)
+                self.agi.verbose(f"🚫 Попытка отклонена: превышен лимит попыток ({limit})", 1)
+                return
+            
+            # Снимок клиентов отвечает без допуска и подключения к БД (лог пишется через спул);
+            # к БД подключаемся только при промахе или устаревшем снимке
+            client = self.snapshot.get(int(inn_str)) if inn_str.isdigit() else None
+            if client:
+                expected_word = client["code_word"]
+                agi_metrics.emit("client_lookup_total", handler="codeword_check", source="snapshot")
+            elif self.admit_and_connect():
+                # Получаем ожидаемое кодовое слово из БД
+                expected_word = self.get_expected_codeword(inn_str)
+                agi_metrics.emit("client_lookup_total", handler="codeword_check", source="db")
+            else:
+                # Режим сброса нагрузки: только локальный кэш клиентов
+                record_shed("codeword_check", "cache_only")
+                cached = self.client_cache.get(int(inn_str)) if inn_str.isdigit() else None
+                expected_word = cached.get("code_word") if cached else None
+            
+            # Если не нашли в БД, пробуем получить из переменной AGI
+            if not expected_word:
+                expected_word = self.agi.get_variable("VERIF_CODEWORD") or ""
+            
+            # Проверяем наличие кодового слова
+            if not expected_word:
+                self.agi.verbose("ВНИМАНИЕ: Кодовое слово не найдено в БД и VERIF_CODEWORD не установлен", 1)
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_ERROR)
+                return
+            
+            # Проверяем кодовое слово
+            if self.verify_code_word(spoken_text, expected_word):
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_SUCCESS)
+                self.agi.verbose(f"✓ Кодовое слово совпало: '{spoken_text}' = '{expected_word}'", 1)
+                
+                # Обновляем запись в БД
+                if self.conn is None:
+                    self.defer_verification_log(spoken_text, uniqueid, inn_str, caller_number)
+                elif self.update_verification_log(spoken_text, uniqueid, inn_str, caller_number):
+                    self.agi.verbose("✓ Запись в verification_logs успешно обновлена", 1)
+                else:
+                    self.agi.verbose("⚠ Не удалось обновить запись в БД", 1)
+            else:
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_WRONG)
+                self.agi.verbose(f"✗ Кодовое слово неверно: ожидалось '{expected_word}', сказано '{spoken_text}'", 1)
+                
+                # Для отладки показываем очищенные версии
+                spoken_clean = self.cleanup_text(spoken_text)
+                expected_clean = self.cleanup_text(expected_word)
+                self.agi.verbose(f"  Очищенные версии: '{spoken_clean}' vs '{expected_clean}'", 3)
+                
+        except Exception as e:
+            self.handle_error(e)
+        finally:
+            self.cleanup()
+    
+    def handle_error(self, error: Exception) -> None:
+        """Обработка ошибок"""
+        self.agi.set_variable("VERIF_STATUS", self.STATUS_ERROR)
+        self.agi.verbose(f"❌ Ошибка в скрипте: {str(error)}", 1)
+        
+        # Детальная информация для отладки
+        if os.getenv("DEBUG"):
+            import traceback
+            traceback.print_exc(file=sys.stderr)
+    
+    def cleanup(self) -> None:
+        """Освобождение ресурсов"""
+        if self.db:
+            self.db.log_report(self.agi)
+            self.db = None
+        if self.cursor:
+            try:
+                self.cursor.close()
+            except:
+                pass
+        if self.conn:
+            agi_db.forget(self.conn)
+            try:
+                self.conn.close()
+            except:
+                pass
+        if self.ticket:
+            self.ticket.release()
+
+
+# ────────────────────────────────────────────────
+# Точка входа
+# ────────────────────────────────────────────────
+def main():
+    """Основная функция"""
+    verifier = CodeWordVerifier()
+    with agi_profiler.profile(verifier.agi, "codeword_check"):
+        verifier.run()
+
+
+if __name__ == "__main__":
+    main()
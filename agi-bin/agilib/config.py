@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+"""
+Общая конфигурация подключения к PostgreSQL для AGI-скриптов
+Значения по умолчанию совпадают с прежними DB_CONFIG скриптов,
+переопределяются переменными окружения AGI_DB_*
+"""
+
+import os
+
+DB_CONFIG = {
+    "dbname": os.getenv("AGI_DB_NAME", "asterisk_db"),
+    "user": os.getenv("AGI_DB_USER", "postgres"),
+    "password": os.getenv("AGI_DB_PASSWORD", "OP90wq21"),  # !!! ИЗМЕНИТЕ НА РЕАЛЬНЫЙ ПАРОЛЬ !!!
+    "host": os.getenv("AGI_DB_HOST", "localhost"),
+    "port": int(os.getenv("AGI_DB_PORT", "5432")),
+    "connect_timeout": 5,
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 5
+}
+
+
+def db_config(application_name: str) -> dict:
+    """Параметры psycopg2.connect с именем приложения для pg_stat_activity"""
+    return {**DB_CONFIG, "application_name": application_name}
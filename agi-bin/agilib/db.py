@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""
+Общий слой доступа к данным для AGI-скриптов
+Хранит канонические SQL-запросы верификации и выполняет их как
+подготовленные операторы (PREPARE/EXECUTE), подготавливая каждый
+запрос один раз на соединение, и собирает время выполнения по запросам
+
+Первое выполнение запроса на соединении идёт обычным execute (одно обращение
+к серверу, как и раньше), начиная с PREPARE_THRESHOLD-го — через EXECUTE
+без повторного разбора и планирования. Поэтому в коротких AGI-процессах
+накладных расходов нет, а долгоживущие соединения (FastAGI) получают выигрыш
+"""
+
+from __future__ import annotations
+
+import re
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional, Sequence
+
+# Канонические запросы (плейсхолдеры psycopg2)
+STATEMENTS: Dict[str, str] = {
+    # inn_check.py
+    "client_by_inn": """
+        SELECT id, inn, company_name, code_word, phone_number, telegram_chat_id
+        FROM clients
+        WHERE inn = %s AND active = true
+    """,
+    "clients_by_inns": """
+        SELECT id, inn, company_name, code_word, phone_number, telegram_chat_id
+        FROM clients
+        WHERE inn = ANY(%s) AND active = true
+    """,
+    "log_insert": """
+        INSERT INTO verification_logs
+        (call_uniqueid, caller_number, spoken_inn, matched_client_id, success)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """,
+    "log_exists": """
+        SELECT id FROM verification_logs
+        WHERE call_uniqueid = %s
+    """,
+
+    # codeword_check.py
+    "codeword_by_inn": """
+        SELECT code_word
+        FROM clients
+        WHERE inn = %s AND active = true
+    """,
+    "log_find_by_inn": """
+        SELECT id
+        FROM verification_logs
+        WHERE call_uniqueid = %s
+          AND spoken_inn = %s
+        ORDER BY created_at DESC
+        LIMIT 1
+    """,
+    "log_update_codeword": """
+        UPDATE verification_logs
+        SET spoken_codeword = %s,
+            success = true,
+            caller_number = COALESCE(caller_number, %s)
+        WHERE id = %s
+        RETURNING id
+    """,
+    "log_insert_codeword": """
+        INSERT INTO verification_logs
+            (call_uniqueid, caller_number, spoken_inn, spoken_codeword, success)
+        VALUES (%s, %s, %s, %s, true)
+        RETURNING id
+    """,
+
+    # save_problem.py
+    "problem_find_by_inn": """
+        SELECT id, call_uniqueid, caller_number, spoken_inn,
+               matched_client_id, success, problem_text, problem_recognized_at,
+               problem_audio_path
+        FROM verification_logs
+        WHERE call_uniqueid = %s AND spoken_inn = %s
+        ORDER BY id DESC
+        LIMIT 1
+    """,
+    "problem_find": """
+        SELECT id, call_uniqueid, caller_number, spoken_inn,
+               matched_client_id, success, problem_text, problem_recognized_at,
+               problem_audio_path
+        FROM verification_logs
+        WHERE call_uniqueid = %s
+        ORDER BY id DESC
+        LIMIT 1
+    """,
+    "problem_update": """
+        UPDATE verification_logs
+        SET problem_text = %s,
+            problem_audio_path = COALESCE(problem_audio_path, %s),
+            problem_recognized_at = NOW(),
+            caller_number = COALESCE(caller_number, %s),
+            matched_client_id = COALESCE(matched_client_id, %s)
+        WHERE id = %s
+        RETURNING id
+    """,
+    "problem_insert": """
+        INSERT INTO verification_logs
+            (call_uniqueid, caller_number, spoken_inn,
+             matched_client_id, problem_text, problem_audio_path,
+             problem_recognized_at, success, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, NOW(), false, NOW())
+        RETURNING id
+    """,
+
+    # Отложенные записи (admission.py): поиск и обновление/вставка одним запросом,
+    # время события передаётся явно, так как запись выполняется позже
+    "log_insert_at": """
+        INSERT INTO verification_logs
+        (call_uniqueid, caller_number, spoken_inn, matched_client_id, success, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """,
+    "codeword_log_upsert": """
+        WITH found AS (
+            SELECT id
+            FROM verification_logs
+            WHERE call_uniqueid = %s
+              AND spoken_inn = %s
+            ORDER BY created_at DESC
+            LIMIT 1
+        ), updated AS (
+            UPDATE verification_logs v
+            SET spoken_codeword = %s,
+                success = true,
+                caller_number = COALESCE(v.caller_number, %s)
+            FROM found
+            WHERE v.id = found.id
+            RETURNING v.id
+        )
+        INSERT INTO verification_logs
+            (call_uniqueid, caller_number, spoken_inn, spoken_codeword, success, created_at)
+        SELECT %s, %s, %s, %s, true, %s
+        WHERE NOT EXISTS (SELECT 1 FROM updated)
+        RETURNING id
+    """,
+    "problem_upsert": """
+        WITH found AS (
+            SELECT id
+            FROM verification_logs
+            WHERE call_uniqueid = %s
+              AND (%s::bigint IS NULL OR spoken_inn = %s)
+            ORDER BY id DESC
+            LIMIT 1
+        ), updated AS (
+            UPDATE verification_logs v
+            SET problem_text = %s,
+                problem_audio_path = COALESCE(v.problem_audio_path, %s),
+                problem_recognized_at = %s,
+                caller_number = COALESCE(v.caller_number, %s),
+                matched_client_id = COALESCE(v.matched_client_id, %s)
+            FROM found
+            WHERE v.id = found.id
+            RETURNING v.id
+        )
+        INSERT INTO verification_logs
+            (call_uniqueid, caller_number, spoken_inn,
+             matched_client_id, problem_text, problem_audio_path,
+             problem_recognized_at, success, created_at)
+        SELECT %s, %s, %s, %s, %s, %s, %s, false, %s
+        WHERE NOT EXISTS (SELECT 1 FROM updated)
+        RETURNING id
+    """,
+
+    # speech_session.py — всегда через спул, без соединения на пути вызова
+    "utterance_insert": """
+        INSERT INTO speech_utterances
+            (call_uniqueid, caller_number, stage, onset_ms, duration_ms,
+             timeout_ms, stop_reason, truncated, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+}
+
+# Сколько раз запрос выполняется обычным execute до подготовки
+PREPARE_THRESHOLD = 1
+
+
+def to_server_placeholders(query: str) -> str:
+    """Заменяет плейсхолдеры %s на $1, $2, ... для PREPARE"""
+    counter = iter(range(1, 1000))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+
+class PreparedStatements:
+    """
+    Подготовленные операторы одного соединения psycopg2
+
+    Подготовленные операторы живут до закрытия сессии и не откатываются
+    при ROLLBACK, поэтому множество подготовленных имён хранится на объекте,
+    привязанном к соединению
+    """
+
+    def __init__(self, conn, prepare_threshold: int = PREPARE_THRESHOLD,
+                 force_generic_plan: bool = True):
+        """
+        Args:
+            conn: Соединение psycopg2
+            prepare_threshold: Число обычных выполнений до PREPARE
+            force_generic_plan: Сразу использовать общий план (без 5 пробных
+                custom-планов, которые PostgreSQL строит по умолчанию)
+        """
+        self.conn = conn
+        self.prepare_threshold = prepare_threshold
+        self.force_generic_plan = force_generic_plan
+        self._prepared = set()
+        self._executions: Dict[str, int] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, name: str, mode: str, elapsed: float) -> None:
+        """Учитывает время выполнения запроса"""
+        stat = self.timings.setdefault(name, {
+            "plain_count": 0, "plain_ms": 0.0,
+            "prepared_count": 0, "prepared_ms": 0.0,
+            "prepare_ms": 0.0, "max_ms": 0.0,
+        })
+        ms = elapsed * 1000
+        if mode == "prepare":
+            stat["prepare_ms"] += ms
+            return
+        stat[f"{mode}_count"] += 1
+        stat[f"{mode}_ms"] += ms
+        stat["max_ms"] = max(stat["max_ms"], ms)
+
+    def prepare(self, cursor, name: str) -> None:
+        """Подготавливает запрос на текущем соединении"""
+        if name in self._prepared:
+            return
+        started = time.perf_counter()
+        if self.force_generic_plan and not self._prepared:
+            cursor.execute("SET plan_cache_mode = force_generic_plan")
+        cursor.execute(f"PREPARE {name} AS {to_server_placeholders(STATEMENTS[name])}")
+        self._prepared.add(name)
+        self._record(name, "prepare", time.perf_counter() - started)
+
+    def execute(self, cursor, name: str, params: Sequence[Any] = ()):
+        """
+        Выполняет канонический запрос по имени
+
+        Args:
+            cursor: Курсор этого соединения
+            name: Имя запроса из STATEMENTS
+            params: Параметры запроса
+
+        Returns:
+            Курсор (для fetchone/rowcount)
+        """
+        executions = self._executions.get(name, 0)
+        self._executions[name] = executions + 1
+
+        if name not in self._prepared and executions < self.prepare_threshold:
+            started = time.perf_counter()
+            cursor.execute(STATEMENTS[name], params)
+            self._record(name, "plain", time.perf_counter() - started)
+            return cursor
+
+        self.prepare(cursor, name)
+        placeholders = ", ".join(["%s"] * len(params))
+        started = time.perf_counter()
+        cursor.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
+        self._record(name, "prepared", time.perf_counter() - started)
+        return cursor
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Сводка времени выполнения по запросам (мс)"""
+        report = {}
+        for name, stat in self.timings.items():
+            count = stat["plain_count"] + stat["prepared_count"]
+            total = stat["plain_ms"] + stat["prepared_ms"]
+            report[name] = {
+                "count": count,
+                "prepared_count": stat["prepared_count"],
+                "avg_ms": round(total / count, 3) if count else 0.0,
+                "max_ms": round(stat["max_ms"], 3),
+                "prepare_ms": round(stat["prepare_ms"], 3),
+            }
+        return report
+
+    def log_report(self, agi, level: int = 3) -> None:
+        """Выводит сводку времени выполнения в консоль Asterisk"""
+        for name, stat in self.report().items():
+            agi.verbose(
+                f"SQL {name}: {stat['count']}x, среднее {stat['avg_ms']} мс, "
+                f"макс {stat['max_ms']} мс, подготовлено {stat['prepared_count']}x", level
+            )
+
+
+_registry: Dict[int, PreparedStatements] = {}
+
+
+def statements_for(conn) -> PreparedStatements:
+    """Возвращает PreparedStatements, привязанный к соединению"""
+    key = id(conn)
+    prepared: Optional[PreparedStatements] = _registry.get(key)
+    if prepared is None or prepared.conn is not conn:
+        prepared = PreparedStatements(conn)
+        _registry[key] = prepared
+    return prepared
+
+
+def forget(conn) -> None:
+    """Забывает подготовленные операторы закрытого соединения"""
+    _registry.pop(id(conn), None)
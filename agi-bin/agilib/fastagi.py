@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+Минимальный FastAGI-сервер для AGI-обработчиков
+Позволяет выполнять обработчики внутри долгоживущего процесса вместо запуска
+отдельного интерпретатора на каждый вызов AGI()
+
+Использование в диалплане: AGI(agi://127.0.0.1:4573/<имя_обработчика>)
+Обработчик получает объект FastAGI с тем же интерфейсом, что и BasicAGI
+"""
+
+import logging
+import socketserver
+from typing import Callable, Dict, Optional, Tuple
+
+from basicagi import BasicAGI
+
+from agilib import profiler as agi_profiler
+
+logger = logging.getLogger(__name__)
+
+# Порт FastAGI по умолчанию (стандартный для Asterisk)
+DEFAULT_FASTAGI_PORT = 4573
+
+
+class FastAGI(BasicAGI):
+    """BasicAGI-совместимый канал поверх TCP-соединения FastAGI"""
+
+    def __init__(self, rfile, wfile):
+        """
+        Args:
+            rfile: Бинарный поток чтения сокета
+            wfile: Бинарный поток записи сокета
+        """
+        self.env = {}
+        self.debug_enabled = False
+        self.hungup = False
+        self._rfile = rfile
+        self._wfile = wfile
+        self.read_channel()
+
+    def _readline(self) -> str:
+        """Читает одну строку протокола"""
+        line = self._rfile.readline()
+        if not line:
+            # Asterisk закрыл соединение
+            self.hungup = True
+            return ""
+        return line.decode("utf-8", "replace").strip()
+
+    def _send_command(self, command, parse_mode=None):
+        """Отправляет команду в Asterisk (см. BasicAGI._send_command)"""
+        if self.hungup:
+            return (None, None) if parse_mode == 1 else None
+
+        self._wfile.write(f"{command}\n".encode("utf-8"))
+        self._wfile.flush()
+
+        response = self._readline()
+        # После разрыва канала Asterisk присылает строку HANGUP перед ответом
+        if response == "HANGUP":
+            self.hungup = True
+            response = self._readline()
+
+        if parse_mode is None:
+            return None
+        elif parse_mode == 1:
+            parts = response.split("result=", 1)
+            if len(parts) != 2:
+                return None, None
+            result_part = parts[1]
+            result = result_part.split(" ", 1)[0].strip()
+            value = None
+            if "(" in result_part and ")" in result_part:
+                value = result_part.split("(", 1)[1].rsplit(")", 1)[0]
+            return result, value
+        return response
+
+    def debug(self, message):
+        """Отладочные сообщения уходят в лог сервера"""
+        logger.debug(message)
+
+    def read_channel(self):
+        """Читает заголовок agi_* до пустой строки"""
+        while True:
+            line = self._readline()
+            if not line:
+                break
+            if ":" in line:
+                key, value = line.split(":", 1)
+                if key.startswith("agi_"):
+                    key = key[4:]
+                self.env[key] = value.strip()
+
+    @property
+    def script(self) -> str:
+        """Имя обработчика из URL agi://host:port/<script>?args"""
+        script = self.env.get("network_script", "")
+        return script.split("?", 1)[0].strip("/")
+
+
+class _FastAGIRequestHandler(socketserver.StreamRequestHandler):
+    """Обслуживает одно FastAGI-подключение"""
+
+    def handle(self):
+        agi = FastAGI(self.rfile, self.wfile)
+        handler = self.server.handlers.get(agi.script)
+
+        if handler is None:
+            logger.warning(f"⚠️ Неизвестный FastAGI-обработчик: '{agi.script}'")
+            agi.verbose(f"FastAGI: неизвестный обработчик '{agi.script}'", 1)
+            return
+
+        try:
+            with agi_profiler.profile(agi, agi.script):
+                handler(agi)
+        except Exception as e:
+            logger.exception(f"❌ Ошибка в обработчике '{agi.script}': {e}")
+
+
+class FastAGIServer(socketserver.ThreadingTCPServer):
+    """Многопоточный FastAGI-сервер с маршрутизацией по имени скрипта"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int],
+                 handlers: Optional[Dict[str, Callable[[FastAGI], None]]] = None):
+        """
+        Args:
+            address: Адрес (host, port) для прослушивания
+            handlers: Словарь {имя_скрипта: обработчик(agi)}
+        """
+        self.handlers = dict(handlers or {})
+        super().__init__(address, _FastAGIRequestHandler)
+
+    def register(self, name: str, handler: Callable[[FastAGI], None]) -> None:
+        """Регистрирует обработчик под именем скрипта"""
+        self.handlers[name] = handler
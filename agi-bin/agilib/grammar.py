@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+Опубликованные грамматики Vosk для этапов распознавания
+Грамматика — JSON-список фраз в формате phrase_list сервера Vosk
+({"config": {"phrase_list": [...]}}) с фразой "[unk]" для всего остального.
+Сборка и публикация — speech_grammar.py; здесь только чтение на пути вызова
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional
+
+GRAMMAR_DIR = os.getenv("GRAMMAR_DIR", "/var/lib/asterisk/grammars")
+UNK = "[unk]"
+STAGES = ("inn", "codeword")
+
+
+def grammar_path(stage: str, grammar_dir: str = GRAMMAR_DIR) -> str:
+    """Путь к опубликованной грамматике этапа"""
+    return os.path.join(grammar_dir, f"{stage}.json")
+
+
+def load_grammar(stage: str, grammar_dir: str = GRAMMAR_DIR) -> Optional[List[str]]:
+    """
+    Загружает опубликованную грамматику этапа
+
+    Returns:
+        Список фраз или None, если грамматика не опубликована
+    """
+    try:
+        with open(grammar_path(stage, grammar_dir), encoding="utf-8") as f:
+            phrases = json.load(f)
+        return phrases if isinstance(phrases, list) and phrases else None
+    except (OSError, ValueError):
+        return None
+
+
+def grammar_config(stage: str, grammar_dir: str = GRAMMAR_DIR) -> Optional[Dict[str, Any]]:
+    """Конфигурационное сообщение Vosk с грамматикой этапа (или None)"""
+    phrases = load_grammar(stage, grammar_dir)
+    return {"config": {"phrase_list": phrases}} if phrases else None
@@ -0,0 +1,1111 @@
+# -*- coding: utf-8 -*-
+
+"""
+AGI-скрипт для проверки ИНН с использованием BasicAGI
+Устанавливает переменные:
+VERIF_STATUS = SUCCESS / NOT_FOUND / INVALID / BUSY / BLOCKED / ERROR
+(BLOCKED — превышен лимит попыток, см. agilib/limiter.py)
+VERIF_INN, VERIF_COMPANY, VERIF_CODEWORD — если успех
+VERIF_CODEWORD_STATUS = SUCCESS / WRONG / NONE — проверка кодового слова,
+сказанного в той же фразе после ИНН (SUCCESS — второй этап не нужен)
+INN_HYPOTHESES — цифры неудачных попыток этого вызова (для голосования)
+Читает VERIF_RECHECK = 1 — повтор проверки после BUSY (попытка уже учтена)
+AGI_LOAD = NORMAL / BUSY / OVERLOAD — уровень нагрузки (см. agilib/admission.py)
+Работает с таблицами clients и verification_logs
+"""
+
+from __future__ import annotations
+
+import sys
+import re
+import os
+import itertools
+from basicagi import BasicAGI
+
+from agilib import config
+from agilib import db as agi_db
+from agilib import metrics as agi_metrics
+from agilib import profiler as agi_profiler
+from agilib.admission import AdmissionController, DeferredWrites, record_shed
+from agilib.client_cache import ClientCache
+from agilib.codeword import CodeWordVerifier
+from agilib.lazy import lazy_import
+from agilib.limiter import STAGE_CODEWORD, STAGE_INN, check_attempt
+from agilib.snapshot import ClientSnapshot
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Tuple, Dict, Any, List
+
+psycopg2 = lazy_import("psycopg2")
+
+
+class _QuietAGI:
+    """Заглушка вывода для разбора текста вне AGI-сессии"""
+
+    def verbose(self, message, level=0):
+        pass
+
+
+class InnVerifier:
+    """Класс для проверки ИНН по распознанному тексту"""
+
+    # Конфигурация базы данных
+    DB_CONFIG = config.db_config("inn_verifier_agi")
+
+    # Статусы проверки
+    STATUS_SUCCESS = "SUCCESS"
+    STATUS_NOT_FOUND = "NOT_FOUND"
+    STATUS_INVALID = "INVALID"
+    STATUS_ERROR = "ERROR"
+    STATUS_BUSY = "BUSY"
+    STATUS_BLOCKED = "BLOCKED"
+    STATUS_NONE = "NONE"
+
+    # Допустимая длина ИНН
+    INN_MIN_LENGTH = 10
+    INN_MAX_LENGTH = 12
+
+    # Весовые коэффициенты контрольных цифр ИНН
+    INN_WEIGHTS_10 = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+    INN_WEIGHTS_12_1 = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+    INN_WEIGHTS_12_2 = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+
+    # Слова, которыми абонент может отделить кодовое слово от ИНН
+    CODEWORD_MARKERS = ("кодовое", "слово", "код", "пароль")
+    # Кодовое слово из фразы с ИНН засчитывается только целиком и не короче этого
+    INLINE_CODEWORD_MIN_LENGTH = 3
+    # Неизвестное слово в результате Vosk с грамматикой
+    UNKNOWN_WORD = "[unk]"
+
+    # Голосование по попыткам: переменная канала, число попыток,
+    # минимальная длина гипотезы и предел кандидатов при равенстве голосов
+    HYPOTHESES_VARIABLE = "INN_HYPOTHESES"
+    MAX_HYPOTHESES = 3
+    MIN_HYPOTHESIS_LENGTH = 6
+    MAX_VOTE_CANDIDATES = 16
+
+    # Диалплан выставляет VERIF_RECHECK=1, повторяя проверку того же ИНН после BUSY
+    RECHECK_VARIABLE = "VERIF_RECHECK"
+
+    def __init__(self):
+        """Инициализация BasicAGI и переменных"""
+        self.agi = BasicAGI()
+        self.conn = None
+        self.cursor = None
+        self.db = None
+        self.ticket = None
+        self.recheck = False
+        self.client_cache = ClientCache()
+        self.snapshot = ClientSnapshot()
+        self.deferred = DeferredWrites()
+
+        # Инициализация словарей для распознавания ИНН
+        self.init_recognition_dicts()
+
+    @classmethod
+    def parser(cls, agi=None) -> "InnVerifier":
+        """
+        Экземпляр только для разбора текста — без подключения к AGI и БД
+
+        Args:
+            agi: Объект с методом verbose (по умолчанию вывод отключён)
+        """
+        verifier = cls.__new__(cls)
+        verifier.agi = agi or _QuietAGI()
+        verifier.init_recognition_dicts()
+        return verifier
+
+    @classmethod
+    def inn_checksum_valid(cls, inn: int) -> bool:
+        """
+        Проверяет контрольные цифры ИНН
+
+        Args:
+            inn: ИНН из 10 или 12 цифр (ведущий ноль мог потеряться при int)
+
+        Returns:
+            True, если контрольные цифры совпадают
+        """
+        digits = str(inn)
+        if len(digits) in (cls.INN_MIN_LENGTH - 1, cls.INN_MAX_LENGTH - 1):
+            digits = "0" + digits
+        values = [int(d) for d in digits]
+
+        def check_digit(weights):
+            return sum(w * v for w, v in zip(weights, values)) % 11 % 10
+
+        if len(values) == 10:
+            return check_digit(cls.INN_WEIGHTS_10) == values[9]
+        if len(values) == 12:
+            return (check_digit(cls.INN_WEIGHTS_12_1) == values[10]
+                    and check_digit(cls.INN_WEIGHTS_12_2) == values[11])
+        return False
+
+    def init_recognition_dicts(self):
+        """Инициализация словарей для распознавания чисел"""
+        # Словарь произношений цифр
+        self.digit_map = {
+            # Русские
+            'ноль': 0, 'нуль': 0,
+            'один': 1, 'одна': 1, 'первый': 1, 'раз': 1,
+            'два': 2, 'две': 2, 'второй': 2,
+            'три': 3, 'третий': 3,
+            'четыре': 4, 'четвертый': 4,
+            'пять': 5, 'пятый': 5,
+            'шесть': 6, 'шестой': 6,
+            'семь': 7, 'седьмой': 7,
+            'восемь': 8, 'восьмой': 8,
+            'девять': 9, 'девятый': 9,
+            # Английские
+            'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4,
+            'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9
+        }
+
+        # Словарь двухзначных чисел
+        self.tens_map = {
+            'десять': 10, 'одиннадцать': 11, 'двенадцать': 12,
+            'тринадцать': 13, 'четырнадцать': 14, 'пятнадцать': 15,
+            'шестнадцать': 16, 'семнадцать': 17, 'восемнадцать': 18,
+            'девятнадцать': 19,
+            'двадцать': 20, 'тридцать': 30, 'сорок': 40,
+            'пятьдесят': 50, 'шестьдесят': 60, 'семьдесят': 70,
+            'восемьдесят': 80, 'девяносто': 90
+        }
+
+        # Словарь трёхзначных чисел
+        self.hundreds_map = {
+            'сто': 100, 'двести': 200, 'триста': 300,
+            'четыреста': 400, 'пятьсот': 500, 'шестьсот': 600,
+            'семьсот': 700, 'восемьсот': 800, 'девятьсот': 900
+        }
+
+    def _normalize_text(self, text: str) -> str:
+        """
+        Нормализует текст: нижний регистр, замена разделителей
+
+        Args:
+            text: Исходный текст
+
+        Returns:
+            Нормализованный текст
+        """
+        if not text:
+            return ""
+
+        # Приводим к нижнему регистру и заменяем разделители
+        normalized = text.lower()
+        normalized = re.sub(r'[-–—.,;:/\\|]', ' ', normalized)
+        # Убираем лишние пробелы
+        normalized = re.sub(r'\s+', ' ', normalized).strip()
+
+        return normalized
+
+    def word_to_number(self, word: str) -> Optional[int]:
+        """
+        Переводит слово в число
+
+        Args:
+            word: Слово для перевода
+
+        Returns:
+            Число или None, если не удалось перевести
+        """
+        word = word.lower().strip()
+        clean_word = re.sub(r'[^а-яёa-z]', '', word)
+
+        if not clean_word:
+            return None
+
+        if clean_word in self.digit_map:
+            return self.digit_map[clean_word]
+        elif clean_word in self.tens_map:
+            return self.tens_map[clean_word]
+        elif clean_word in self.hundreds_map:
+            return self.hundreds_map[clean_word]
+
+        return None
+
+    def _extract_digit_sequences(self, text: str) -> List[str]:
+        """
+        Извлекает все последовательности цифр из текста
+
+        Args:
+            text: Текст для поиска
+
+        Returns:
+            Список найденных цифровых последовательностей
+        """
+        return re.findall(r'\d+', text)
+
+    def extract_inn(self, text: str) -> Optional[int]:
+        """
+        Извлекает наиболее вероятный ИНН из распознанного текста
+        ИНН может состоять из 10 или 12 цифр
+
+        Использует два подхода:
+        1. Отдельные цифры (10 или 12 слов)
+        2. Двухзначные числа с обработкой составных числительных
+
+        Args:
+            text: Распознанный текст
+
+        Returns:
+            ИНН или None, если не удалось извлечь
+        """
+        if not text:
+            return None
+
+        self.agi.verbose(f"Извлечение ИНН из текста: '{text}'", 3)
+
+        # Нормализуем текст
+        normalized = self._normalize_text(text)
+
+        # ШАГ 1: Прямые последовательности цифр (быстрый путь)
+        digit_sequences = self._extract_digit_sequences(normalized)
+        if digit_sequences:
+            digit_sequences.sort(key=len, reverse=True)
+            for seq in digit_sequences:
+                if self.INN_MIN_LENGTH <= len(seq) <= self.INN_MAX_LENGTH:
+                    self.agi.verbose(f"✓ Найдена прямая последовательность цифр: {seq}", 3)
+                    return int(seq)
+
+        # Разбиваем на слова для дальнейшего анализа
+        words = normalized.split()
+
+        if not words:
+            return None
+
+        # ============= ШАГ 2: Отдельные цифры (10 или 12 слов) =============
+        if len(words) in [10, 12]:
+            result_digits = []
+            valid = True
+
+            for word in words:
+                num = self.word_to_number(word)
+                if num is None or num > 9:  # Для отдельных цифр ожидаем только 0-9
+                    valid = False
+                    break
+                result_digits.append(str(num))
+
+            if valid and len(result_digits) in [10, 12]:
+                result = int(''.join(result_digits))
+                self.agi.verbose(f"✓ Найден по отдельным цифрам: {result}", 3)
+                return result
+
+        # ============= ШАГ 3: Двухзначные числа с обработкой составных числительных =============
+        if len(words) <= 12:  # Ограничиваем максимальное количество слов
+            result_digits = []
+            i = 0
+            error = False
+
+            while i < len(words) and not error:
+                current_word = words[i]
+
+                # Проверяем, является ли слово двухзначным числом из словаря
+                if current_word in self.tens_map:
+                    # Проверяем, есть ли следующее слово и является ли оно цифрой (для составных типа "двадцать один")
+                    if i + 1 < len(words) and words[i + 1] in self.digit_map:
+                        # Составное двухзначное число: двадцать один -> 21
+                        tens = self.tens_map[current_word]
+                        units = self.digit_map[words[i + 1]]
+                        num = tens + units
+                        result_digits.append(f"{num:02d}")  # Всегда две цифры
+                        i += 2
+                    else:
+                        # Простое двухзначное число: двадцать -> 20
+                        num = self.tens_map[current_word]
+                        result_digits.append(str(num))
+                        i += 1
+
+                # Проверяем, является ли слово трёхзначным числом (для смешанных случаев)
+                elif current_word in self.hundreds_map:
+                    # Проверяем, есть ли следующее слово и является ли оно двухзначным или цифрой
+                    if i + 1 < len(words):
+                        next_word = words[i + 1]
+                        if next_word in self.tens_map:
+                            # Трёхзначное + двухзначное: сто двадцать -> 120
+                            hundreds = self.hundreds_map[current_word]
+                            tens = self.tens_map[next_word]
+
+                            # Проверяем, есть ли ещё цифра после двухзначного
+                            if i + 2 < len(words) and words[i + 2] in self.digit_map:
+                                # Полное трёхзначное: сто двадцать один -> 121
+                                units = self.digit_map[words[i + 2]]
+                                num = hundreds + tens + units
+                                result_digits.append(str(num))
+                                i += 3
+                            else:
+                                # Трёхзначное с десятками: сто двадцать -> 120
+                                num = hundreds + tens
+                                result_digits.append(str(num))
+                                i += 2
+                        elif next_word in self.digit_map:
+                            # Трёхзначное + цифра: сто один -> 101
+                            hundreds = self.hundreds_map[current_word]
+                            units = self.digit_map[next_word]
+                            num = hundreds + units
+                            result_digits.append(str(num))
+                            i += 2
+                        else:
+                            # Только сотни: сто -> 100
+                            num = self.hundreds_map[current_word]
+                            result_digits.append(str(num))
+                            i += 1
+                    else:
+                        # Только сотни в конце строки
+                        num = self.hundreds_map[current_word]
+                        result_digits.append(str(num))
+                        i += 1
+
+                # Проверяем, является ли слово простой цифрой
+                elif current_word in self.digit_map:
+                    result_digits.append(str(self.digit_map[current_word]))
+                    i += 1
+
+                # Проверяем особый случай: "ноль" может быть частью числа
+                elif current_word == "ноль" or current_word == "нуль":
+                    result_digits.append("0")
+                    i += 1
+
+                else:
+                    # Встретилось нечисловое слово - прерываем обработку
+                    error = True
+                    break
+
+            # Если успешно обработали все слова без ошибок
+            if not error and result_digits:
+                result_str = ''.join(result_digits)
+
+                # Проверяем, что длина соответствует ИНН (10 или 12 цифр)
+                if len(result_str) == 10:
+                    result = int(result_str)
+                    self.agi.verbose(f"✓ Найден по двухзначным числам (10 цифр): {result}", 3)
+                    return result
+                elif len(result_str) == 12:
+                    result = int(result_str)
+                    self.agi.verbose(f"✓ Найден по двухзначным числам (12 цифр): {result}", 3)
+                    return result
+                elif len(result_str) in [10, 12]:
+                    try:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по двухзначным числам: {result}", 3)
+                        return result
+                    except ValueError:
+                        self.agi.verbose(f"✗ Ошибка преобразования: {result_str}", 3)
+                else:
+                    self.agi.verbose(f"✗ Неподходящая длина: {len(result_str)} цифр", 3)
+
+        # ============= ШАГ 4: Трёхзначные числа с обработкой составных числительных =============
+        if len(words) <= 8:  # Для 12-значного ИНН максимум 4 трёхзначных числа, для 10-значного - 3-4 числа
+            result_digits = []
+            i = 0
+            error = False
+
+            while i < len(words) and not error:
+                current_word = words[i]
+
+                # Проверяем, является ли слово трёхзначным числом
+                if current_word in self.hundreds_map:
+                    hundreds = self.hundreds_map[current_word]
+
+                    # Проверяем наличие десятков после сотен
+                    if i + 1 < len(words):
+                        next_word = words[i + 1]
+
+                        # Случай: сотни + десятки (сто двадцать)
+                        if next_word in self.tens_map:
+                            tens = self.tens_map[next_word]
+
+                            # Проверяем наличие единиц после десятков (сто двадцать один)
+                            if i + 2 < len(words) and words[i + 2] in self.digit_map:
+                                units = self.digit_map[words[i + 2]]
+                                num = hundreds + tens + units
+                                result_digits.append(str(num))
+                                i += 3
+                            else:
+                                # Только сотни + десятки
+                                num = hundreds + tens
+                                result_digits.append(str(num))
+                                i += 2
+
+                        # Случай: сотни + единицы (сто один)
+                        elif next_word in self.digit_map:
+                            units = self.digit_map[next_word]
+                            num = hundreds + units
+                            result_digits.append(str(num))
+                            i += 2
+
+                        # Случай: только сотни (сто)
+                        else:
+                            result_digits.append(str(hundreds))
+                            i += 1
+                    else:
+                        # Только сотни в конце строки
+                        result_digits.append(str(hundreds))
+                        i += 1
+
+                # Проверяем, является ли слово двухзначным числом (может быть частью трёхзначного)
+                elif current_word in self.tens_map:
+                    tens = self.tens_map[current_word]
+
+                    # Проверяем наличие единиц после десятков
+                    if i + 1 < len(words) and words[i + 1] in self.digit_map:
+                        units = self.digit_map[words[i + 1]]
+                        num = tens + units
+                        # Проверяем, не должно ли это быть трёхзначным числом с пропущенными сотнями
+                        if i > 0 and words[i - 1] in self.hundreds_map:
+                            # Уже обработано в предыдущем шаге с сотнями
+                            error = True
+                            break
+                        result_digits.append(f"{num:02d}" if num < 100 else str(num))
+                        i += 2
+                    else:
+                        # Просто двухзначное число
+                        if i > 0 and words[i - 1] in self.hundreds_map:
+                            # Уже обработано в предыдущем шаге с сотнями
+                            error = True
+                            break
+                        result_digits.append(str(tens))
+                        i += 1
+
+                # Проверяем, является ли слово простой цифрой
+                elif current_word in self.digit_map:
+                    # Проверяем, не является ли это частью трёхзначного числа
+                    if i > 0 and (words[i - 1] in self.hundreds_map or words[i - 1] in self.tens_map):
+                        # Уже обработано в составных числах
+                        error = True
+                        break
+                    result_digits.append(str(self.digit_map[current_word]))
+                    i += 1
+
+                # Проверяем особый случай: "ноль"
+                elif current_word == "ноль" or current_word == "нуль":
+                    # Проверяем, не является ли это частью числа (например, "сто ноль" -> 100)
+                    if i > 0 and words[i - 1] in self.hundreds_map:
+                        # Уже обработано как "сто"
+                        error = True
+                        break
+                    result_digits.append("0")
+                    i += 1
+
+                else:
+                    # Встретилось нечисловое слово
+                    error = True
+                    break
+
+            # Если успешно обработали все слова без ошибок
+            if not error and result_digits:
+                result_str = ''.join(result_digits)
+
+                # Проверяем различные схемы для трёхзначных чисел
+                num_count = len(result_digits)
+
+                # Схема 3-3-3-1 (для 10-значного ИНН)
+                if num_count == 4 and len(result_digits[0]) == 3 and len(result_digits[1]) == 3 and \
+                        len(result_digits[2]) == 3 and len(result_digits[3]) == 1:
+                    if len(result_str) == 10:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по схеме 3-3-3-1: {result}", 3)
+                        return result
+
+                # Схема 3-3-3-3 (для 12-значного ИНН)
+                elif num_count == 4 and all(len(part) == 3 for part in result_digits):
+                    if len(result_str) == 12:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по схеме 3-3-3-3: {result}", 3)
+                        return result
+
+                # Схема 3-3-2-2 (альтернативная для 10-значного)
+                elif num_count == 4 and len(result_digits[0]) == 3 and len(result_digits[1]) == 3 and \
+                        len(result_digits[2]) == 2 and len(result_digits[3]) == 2:
+                    if len(result_str) == 10:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по схеме 3-3-2-2: {result}", 3)
+                        return result
+
+                # Схема 3-2-3-2 (альтернативная)
+                elif num_count == 4 and len(result_digits[0]) == 3 and len(result_digits[1]) == 2 and \
+                        len(result_digits[2]) == 3 and len(result_digits[3]) == 2:
+                    if len(result_str) == 10:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по схеме 3-2-3-2: {result}", 3)
+                        return result
+
+                # Схема 2-3-3-2
+                elif num_count == 4 and len(result_digits[0]) == 2 and len(result_digits[1]) == 3 and \
+                        len(result_digits[2]) == 3 and len(result_digits[3]) == 2:
+                    if len(result_str) == 10:
+                        result = int(result_str)
+                        self.agi.verbose(f"✓ Найден по схеме 2-3-3-2: {result}", 3)
+                        return result
+
+                # Если просто подходит по длине
+                elif len(result_str) == 10:
+                    result = int(result_str)
+                    self.agi.verbose(f"✓ Найден по трёхзначным числам (10 цифр): {result}", 3)
+                    return result
+                elif len(result_str) == 12:
+                    result = int(result_str)
+                    self.agi.verbose(f"✓ Найден по трёхзначным числам (12 цифр): {result}", 3)
+                    return result
+                else:
+                    self.agi.verbose(f"✗ Неподходящая длина: {len(result_str)} цифр из {num_count} чисел", 3)
+
+        self.agi.verbose("✗ ИНН не найден", 3)
+        return None
+
+    def extract_digits(self, text: str) -> str:
+        """
+        Переводит все числительные фразы в строку цифр без проверки длины
+        Нечисловые слова пропускаются — результат служит гипотезой для голосования
+
+        Args:
+            text: Распознанный текст
+
+        Returns:
+            Строка цифр (может быть пустой)
+        """
+        words = self._normalize_text(text).split()
+        digits = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word.isdigit():
+                digits.append(word)
+                i += 1
+                continue
+
+            value = None
+            if word in self.hundreds_map:
+                value = self.hundreds_map[word]
+                i += 1
+                if i < len(words) and words[i] in self.tens_map:
+                    value += self.tens_map[words[i]]
+                    i += 1
+                if i < len(words) and words[i] in self.digit_map and value % 10 == 0:
+                    value += self.digit_map[words[i]]
+                    i += 1
+            elif word in self.tens_map:
+                value = self.tens_map[word]
+                i += 1
+                if value >= 20 and i < len(words) and words[i] in self.digit_map:
+                    value += self.digit_map[words[i]]
+                    i += 1
+            elif word in self.digit_map:
+                value = self.digit_map[word]
+                i += 1
+            else:
+                i += 1
+
+            if value is not None:
+                digits.append(str(value))
+        return "".join(digits)
+
+    def vote_inn_candidates(self, hypotheses: List[str]) -> List[int]:
+        """
+        Объединяет цифры нескольких попыток голосованием по позициям
+
+        Каждая гипотеза длины 10 или 12 по очереди служит опорной; остальные
+        выравниваются на неё (difflib), и в каждой позиции побеждает цифра,
+        набравшая больше голосов. При равенстве голосов перебираются варианты.
+        Возвращаются только кандидаты с верными контрольными цифрами
+
+        Args:
+            hypotheses: Строки цифр из попыток (старые первыми)
+
+        Returns:
+            Кандидаты ИНН в порядке убывания числа голосов
+        """
+        # Голосование нужно только после неудачной попытки
+        from difflib import SequenceMatcher
+
+        scored: Dict[int, int] = {}
+        for index in reversed(range(len(hypotheses))):
+            reference = hypotheses[index]
+            if len(reference) not in (self.INN_MIN_LENGTH, self.INN_MAX_LENGTH):
+                continue
+
+            votes = [{digit: 1} for digit in reference]
+            for other_index, other in enumerate(hypotheses):
+                # Одинаковые строки из разных попыток голосуют каждая
+                if other_index == index:
+                    continue
+                matcher = SequenceMatcher(None, reference, other, autojunk=False)
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                    # Голосуют только позиции, сопоставленные один к одному
+                    if tag in ("equal", "replace") and i2 - i1 == j2 - j1:
+                        for offset in range(i2 - i1):
+                            position = votes[i1 + offset]
+                            digit = other[j1 + offset]
+                            position[digit] = position.get(digit, 0) + 1
+
+            options = []
+            for position in votes:
+                best = max(position.values())
+                options.append([digit for digit, count in position.items() if count == best])
+            support = sum(max(position.values()) for position in votes)
+
+            for combination in itertools.islice(itertools.product(*options), self.MAX_VOTE_CANDIDATES):
+                inn = int("".join(combination))
+                if self.inn_checksum_valid(inn):
+                    scored[inn] = max(scored.get(inn, 0), support)
+
+        return sorted(scored, key=scored.get, reverse=True)
+
+    def load_hypotheses(self) -> List[str]:
+        """Цифры предыдущих попыток этого вызова из переменной канала"""
+        value = self.agi.get_variable(self.HYPOTHESES_VARIABLE) or ""
+        return [h for h in value.split("-") if h.isdigit()]
+
+    def save_hypotheses(self, hypotheses: List[str]) -> None:
+        """Сохраняет цифры последних попыток в переменную канала"""
+        self.agi.set_variable(self.HYPOTHESES_VARIABLE, "-".join(hypotheses[-self.MAX_HYPOTHESES:]))
+
+    def split_inn_and_codeword(self, text: str) -> Tuple[Optional[int], str]:
+        """
+        Разделяет фразу «ИНН + кодовое слово», сказанную на одном дыхании
+
+        Args:
+            text: Распознанный текст
+
+        Returns:
+            (ИНН или None, кандидат кодового слова или пустая строка)
+        """
+        if not text:
+            return None, ""
+
+        words = [w for w in self._normalize_text(text).split() if w != self.UNKNOWN_WORD]
+
+        # Хвост — слова после последнего числа
+        split_at = len(words)
+        while split_at > 0 and not words[split_at - 1].isdigit() \
+                and self.word_to_number(words[split_at - 1]) is None:
+            split_at -= 1
+
+        tail = words[split_at:]
+        while tail and tail[0] in self.CODEWORD_MARKERS:
+            tail = tail[1:]
+
+        if split_at and tail:
+            inn = self.extract_inn(" ".join(words[:split_at]))
+            if inn is not None:
+                return inn, " ".join(tail)
+
+        return self.extract_inn(" ".join(words[:split_at]) if split_at else text), ""
+
+    def connect_to_db(self) -> bool:
+        """Устанавливает соединение с базой данных"""
+        try:
+            self.conn = psycopg2.connect(**self.DB_CONFIG)
+            self.cursor = self.conn.cursor()
+            self.db = agi_db.statements_for(self.conn)
+            return True
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка подключения к БД: {e}", 1)
+            return False
+
+    def admit_and_connect(self) -> bool:
+        """
+        Запрашивает допуск к БД и подключается
+        При перегрузке или недоступности БД включает режим сброса нагрузки
+
+        Returns:
+            True если соединение с БД установлено
+        """
+        self.ticket = AdmissionController("inn_check").acquire()
+        if not self.ticket.shed and not self.connect_to_db():
+            self.ticket.degrade("db_connect")
+
+        self.agi.set_variable("AGI_LOAD", self.ticket.level)
+        if self.ticket.shed:
+            self.agi.verbose(f"⚠ Перегрузка: режим сброса нагрузки (ожидание {self.ticket.waited:.2f} сек)", 1)
+        return self.conn is not None
+
+    def lookup_client(self, inn: int) -> Optional[Dict[str, Any]]:
+        """
+        Ищет клиента в снимке клиентов, при промахе (или устаревшем снимке) — в БД,
+        а в режиме сброса нагрузки — в локальном кэше
+        Допуск к БД и подключение запрашиваются только при промахе снимка
+        """
+        client = self.snapshot.get(inn)
+        if client:
+            agi_metrics.emit("client_lookup_total", handler="inn_check", source="snapshot")
+            self.agi.verbose("Клиент найден в снимке клиентов", 3)
+            return client
+
+        # Подключаемся к БД (или переходим в режим сброса нагрузки)
+        if self.ticket is None:
+            self.admit_and_connect()
+
+        if self.conn is None:
+            record_shed("inn_check", "cache_only")
+            agi_metrics.emit("client_lookup_total", handler="inn_check", source="cache")
+            client = self.client_cache.get(inn)
+            self.agi.verbose(f"Поиск клиента только в кэше: {'найден' if client else 'нет в кэше'}", 2)
+            return client
+
+        agi_metrics.emit("client_lookup_total", handler="inn_check", source="db")
+        client = self.find_client_by_inn(inn)
+        if client:
+            self.client_cache.put(client)
+        return client
+
+    def write_log(self, uniqueid: str, caller_num: str,
+                  spoken_inn: int, client_id: Optional[int] = None) -> Optional[int]:
+        """
+        Записывает лог верификации сразу или откладывает его в спул:
+        при перегрузке и когда клиент найден в снимке без подключения к БД
+        """
+        if self.conn is not None:
+            return self.create_verification_log(uniqueid, caller_num, spoken_inn, client_id)
+
+        if self.ticket is not None:
+            record_shed("inn_check", "deferred_write")
+        self.deferred.write("log_insert_at", (uniqueid, caller_num, spoken_inn, client_id,
+                                              client_id is not None, self.deferred.now()))
+        self.agi.verbose("Запись в verification_logs отложена", 2)
+        return None
+
+    def write_codeword_log(self, uniqueid: str, caller_num: str, spoken_inn: int,
+                           spoken_codeword: str, log_id: Optional[int]) -> None:
+        """Дописывает в лог кодовое слово, подтверждённое в той же фразе"""
+        if self.conn is None:
+            self.deferred.write("codeword_log_upsert", (
+                uniqueid, spoken_inn, spoken_codeword, caller_num,
+                uniqueid, caller_num, spoken_inn, spoken_codeword, self.deferred.now(),
+            ))
+            return
+
+        try:
+            if log_id:
+                self.db.execute(self.cursor, "log_update_codeword", (spoken_codeword, caller_num, log_id))
+            else:
+                self.db.execute(self.cursor, "log_insert_codeword",
+                                (uniqueid, caller_num, spoken_inn, spoken_codeword))
+            self.conn.commit()
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка при записи кодового слова в лог: {e}", 1)
+            self.conn.rollback()
+
+    @classmethod
+    def inline_codeword_matches(cls, candidate: str, expected: str) -> bool:
+        """
+        Строгое сравнение кодового слова, сказанного после ИНН
+
+        В отличие от CodeWordVerifier.verify_code_word (засчитывает любую часть
+        слова) кодовое слово должно совпасть целиком: вся фраза или подряд
+        идущие слова фразы. Хвостом фразы может оказаться слово-паразит или
+        обрывок распознавания, и частичное совпадение пропустило бы этап
+        кодового слова
+        """
+        expected_clean = CodeWordVerifier.cleanup_text(expected)
+        if len(expected_clean) < cls.INLINE_CODEWORD_MIN_LENGTH:
+            return False
+        tokens = [t for t in (CodeWordVerifier.cleanup_text(w) for w in candidate.split()) if t]
+        width = len(expected.split())
+        return any("".join(tokens[i:i + width]) == expected_clean for i in range(len(tokens) - width + 1))
+
+    def check_inline_codeword(self, client: Dict[str, Any], candidate: str) -> str:
+        """
+        Проверяет кодовое слово, сказанное после ИНН
+
+        Returns:
+            Статус для VERIF_CODEWORD_STATUS: SUCCESS при точном совпадении,
+            иначе NONE — кодовое слово спросит обычный этап
+        """
+        if not candidate or not client['code_word']:
+            return self.STATUS_NONE
+        if self.inline_codeword_matches(candidate, client['code_word']):
+            self.agi.verbose(f"✓ Кодовое слово из той же фразы совпало: '{candidate}'", 1)
+            return self.STATUS_SUCCESS
+        self.agi.verbose(f"✗ Кодовое слово из той же фразы не совпало: '{candidate}', спросим отдельно", 1)
+        return self.STATUS_NONE
+
+    def attempt_allowed(self, caller_num: str, inn: Optional[int], count_caller: bool = True) -> bool:
+        """
+        Проверяет лимит попыток в сервисе состояния вызовов (agilib/limiter.py)
+
+        Args:
+            caller_num: Номер абонента (скрытые номера делят общий счётчик)
+            inn: ИНН попытки
+            count_caller: False — попытка номера уже учтена, учитывается только ИНН
+                          (ИНН, восстановленный голосованием)
+        """
+        if self.recheck:
+            # Повтор проверки после BUSY: номер и ИНН учтены при первой проверке попытки
+            return True
+        allowed, limit = check_attempt(STAGE_INN, caller_num, inn, count_caller)
+        if not allowed:
+            self.agi.set_variable("VERIF_STATUS", self.STATUS_BLOCKED)
+            self.agi.verbose(f"🚫 Попытка отклонена: превышен лимит попыток ({limit})", 1)
+        return allowed
+
+    def get_agi_variables(self) -> Tuple[str, str, str]:
+        """Получает необходимые переменные из AGI"""
+        # SPEECH_RESULT задаёт speech_session.py; SPEECH_TEXT(0) — SpeechBackground, который
+        # диалплан вызывает только при ошибке сессии (ERROR). В остальных случаях SPEECH_TEXT(0)
+        # может остаться от предыдущей попытки этого же звонка
+        spoken_text = self.agi.get_variable("SPEECH_RESULT") or ""
+        if not spoken_text and self.agi.get_variable("SPEECH_STOP_REASON") == "ERROR":
+            spoken_text = self.agi.get_variable("SPEECH_TEXT(0)") or ""
+        uniqueid = self.agi.get_variable("UNIQUEID") or ""
+        caller_num = self.agi.get_variable("CALLERID(num)") or "unknown"
+        channel = self.agi.get_variable("CHANNEL") or ""
+        self.agi.verbose(f"Канал: {channel}", 3)
+        return spoken_text.strip(), uniqueid, caller_num
+
+    def find_client_by_inn(self, inn: int) -> Optional[Dict[str, Any]]:
+        """Ищет клиента по ИНН в таблице clients"""
+        try:
+            self.db.execute(self.cursor, "client_by_inn", (inn,))
+            row = self.cursor.fetchone()
+            if row:
+                return {
+                    'id': row[0],
+                    'inn': row[1],
+                    'company_name': row[2],
+                    'code_word': row[3],
+                    'phone_number': row[4],
+                    'telegram_chat_id': row[5]
+                }
+            return None
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка при поиске клиента: {e}", 1)
+            return None
+
+    def find_client_by_inns(self, inns: List[int]) -> Optional[Dict[str, Any]]:
+        """Ищет первого найденного клиента среди кандидатов ИНН одним запросом"""
+        try:
+            self.db.execute(self.cursor, "clients_by_inns", (inns,))
+            found = {row[1]: row for row in self.cursor.fetchall()}
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка при поиске клиентов: {e}", 1)
+            return None
+
+        for inn in inns:
+            row = found.get(inn)
+            if row:
+                return {
+                    'id': row[0],
+                    'inn': row[1],
+                    'company_name': row[2],
+                    'code_word': row[3],
+                    'phone_number': row[4],
+                    'telegram_chat_id': row[5]
+                }
+        return None
+
+    def resolve_by_vote(self, spoken_text: str, inn: Optional[int]) -> Optional[Dict[str, Any]]:
+        """
+        Добавляет цифры текущей попытки к гипотезам вызова и ищет клиента
+        среди кандидатов, полученных голосованием по всем попыткам
+
+        Returns:
+            Клиент или None
+        """
+        digits = self.extract_digits(spoken_text)
+        hypotheses = self.load_hypotheses()
+        # Повтор проверки той же попытки (BUSY) не добавляет голосов
+        if len(digits) >= self.MIN_HYPOTHESIS_LENGTH and (not hypotheses or hypotheses[-1] != digits):
+            hypotheses.append(digits)
+            self.save_hypotheses(hypotheses)
+        if len(hypotheses) < 2:
+            return None
+
+        candidates = [c for c in self.vote_inn_candidates(hypotheses[-self.MAX_HYPOTHESES:]) if c != inn]
+        self.agi.verbose(f"Голосование по {len(hypotheses[-self.MAX_HYPOTHESES:])} попыткам: "
+                         f"кандидаты {candidates[:5]}", 2)
+        if not candidates:
+            agi_metrics.emit("inn_vote_total", result="no_candidates")
+            return None
+
+        # Снимок клиентов, при промахе — БД или (при перегрузке) локальный кэш
+        client = next(filter(None, (self.snapshot.get(c) for c in candidates)), None)
+        if client is None and self.conn is None:
+            client = next(filter(None, (self.client_cache.get(c) for c in candidates)), None)
+        elif client is None:
+            client = self.find_client_by_inns(candidates)
+            if client:
+                self.client_cache.put(client)
+        agi_metrics.emit("inn_vote_total", result="resolved" if client else "not_found")
+        return client
+
+    def create_verification_log(self, uniqueid: str, caller_num: str,
+                               spoken_inn: int, client_id: Optional[int] = None) -> Optional[int]:
+        """Создает запись в таблице verification_logs"""
+        try:
+            success = client_id is not None
+            self.db.execute(self.cursor, "log_insert",
+                            (uniqueid, caller_num, spoken_inn, client_id, success))
+            log_id = self.cursor.fetchone()[0]
+            self.conn.commit()
+            self.agi.verbose(f"✓ Создана запись в verification_logs (ID: {log_id})", 2)
+            return log_id
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка при создании записи в логе: {e}", 1)
+            self.conn.rollback()
+            return None
+
+    def check_existing_log(self, uniqueid: str) -> bool:
+        """Проверяет, существует ли уже запись для данного вызова"""
+        try:
+            self.db.execute(self.cursor, "log_exists", (uniqueid,))
+            return self.cursor.fetchone() is not None
+        except psycopg2.Error as e:
+            self.agi.verbose(f"Ошибка при проверке существующей записи: {e}", 2)
+            return False
+
+    def set_success_variables(self, client_data: Dict[str, Any]) -> None:
+        """Устанавливает переменные AGI для успешной проверки"""
+        self.agi.set_variable("VERIF_INN", str(client_data['inn']))
+        self.agi.set_variable("VERIF_COMPANY", client_data['company_name'] or "")
+        self.agi.set_variable("VERIF_CODEWORD", client_data['code_word'] or "")
+        self.agi.set_variable("VERIF_CLIENT_ID", str(client_data['id']))
+        self.agi.set_variable("VERIF_STATUS", self.STATUS_SUCCESS)
+        if client_data['phone_number']:
+            self.agi.set_variable("VERIF_PHONE", client_data['phone_number'])
+        self.agi.verbose(f"✓ Установлены переменные для клиента ID {client_data['id']}", 2)
+
+    def run(self) -> None:
+        """Основной метод выполнения скрипта"""
+        try:
+            # Получаем переменные из AGI
+            spoken_text, uniqueid, caller_num = self.get_agi_variables()
+            self.recheck = self.agi.get_variable(self.RECHECK_VARIABLE) == "1"
+
+            # Логируем входные данные для отладки
+            self.agi.verbose(f"=== НАЧАЛО ПРОВЕРКИ ИНН ===", 1)
+            self.agi.verbose(f"Получен текст: '{spoken_text}'", 1)
+            self.agi.verbose(f"UniqueID: {uniqueid}, Caller: {caller_num}", 1)
+
+            # Проверяем наличие текста
+            if not spoken_text:
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_INVALID)
+                self.agi.verbose("✗ Пустой текст для распознавания", 1)
+                self.admit_and_connect()
+                self.write_log(uniqueid, caller_num, 0, None)
+                return
+
+            # Извлекаем ИНН и (если сказано в той же фразе) кодовое слово
+            inn, codeword_candidate = self.split_inn_and_codeword(spoken_text)
+            self.agi.set_variable("VERIF_CODEWORD_STATUS", self.STATUS_NONE)
+
+            # Перебор ИНН отсекается до обращения к БД
+            if not self.attempt_allowed(caller_num, inn):
+                return
+
+            # ИНН не извлечён — пробуем голосование по цифрам предыдущих попыток
+            if inn is None:
+                self.admit_and_connect()
+                client = self.resolve_by_vote(spoken_text, None)
+                if client:
+                    # Учитывается ИНН, который действительно проверен
+                    if not self.attempt_allowed(caller_num, client['inn'], count_caller=False):
+                        return
+                    inn = client['inn']
+                    self.agi.verbose(f"✓ ИНН {inn} восстановлен голосованием по попыткам", 1)
+                else:
+                    self.agi.set_variable("VERIF_STATUS", self.STATUS_INVALID)
+                    self.agi.verbose(f"✗ Не удалось извлечь ИНН из текста: '{spoken_text}'", 1)
+                    self.write_log(uniqueid, caller_num, 0, None)
+                    return
+
+            self.agi.verbose(f"✓ Извлечён ИНН: {inn} (длина: {len(str(inn))})", 1)
+
+            # Ищем клиента по ИНН (снимок, при промахе — БД или кэш), затем — по результатам голосования
+            client = self.lookup_client(inn)
+            if self.conn is not None and self.check_existing_log(uniqueid):
+                # Запись для этого звонка уже создана предыдущей проверкой
+                self.agi.verbose(f"⚠ Запись для звонка {uniqueid} уже существует", 1)
+            if client is None and (self.conn is not None or not self.inn_checksum_valid(inn)):
+                client = self.resolve_by_vote(spoken_text, inn)
+                if client and not self.attempt_allowed(caller_num, client['inn'], count_caller=False):
+                    return
+                if client:
+                    self.agi.verbose(f"✓ ИНН {client['inn']} вместо {inn} восстановлен голосованием", 1)
+                    inn = client['inn']
+
+            if client:
+                # Клиент найден
+                self.set_success_variables(client)
+                self.save_hypotheses([])
+                log_id = self.write_log(uniqueid, caller_num, inn, client['id'])
+                codeword_status = self.STATUS_NONE
+                if codeword_candidate and client['code_word']:
+                    # Кодовое слово из фразы с ИНН — такая же попытка, как на этапе кодового слова
+                    # Номер уже учтён попыткой ИНН, учитывается только ИНН
+                    allowed, limit = check_attempt(STAGE_CODEWORD, caller_num, client['inn'],
+                                                   count_caller=False)
+                    if allowed:
+                        codeword_status = self.check_inline_codeword(client, codeword_candidate)
+                    else:
+                        self.agi.verbose(f"🚫 Кодовое слово из той же фразы не проверяется: "
+                                         f"превышен лимит попыток ({limit})", 1)
+                self.agi.set_variable("VERIF_CODEWORD_STATUS", codeword_status)
+                if codeword_status == self.STATUS_SUCCESS:
+                    self.write_codeword_log(uniqueid, caller_num, inn, codeword_candidate, log_id)
+                self.agi.verbose(f"✓ ИНН {inn} найден: {client['company_name']}", 1)
+                if client['code_word']:
+                    self.agi.verbose(f"✓ Кодовое слово: '{client['code_word']}'", 1)
+                else:
+                    self.agi.verbose("⚠ Кодовое слово отсутствует в базе", 1)
+            elif self.conn is None:
+                # БД перегружена, а в кэше клиента нет — просим подождать
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_BUSY)
+                self.agi.verbose(f"⚠ ИНН {inn} не проверен: БД перегружена", 1)
+            else:
+                # Клиент не найден
+                self.agi.set_variable("VERIF_STATUS", self.STATUS_NOT_FOUND)
+                self.client_cache.delete(inn)
+                self.write_log(uniqueid, caller_num, inn, None)
+                self.agi.verbose(f"✗ ИНН {inn} не найден в базе данных", 1)
+
+            self.agi.verbose(f"=== ЗАВЕРШЕНИЕ ПРОВЕРКИ ИНН ===", 1)
+
+        except Exception as e:
+            self.handle_error(e)
+        finally:
+            self.cleanup()
+
+    def handle_error(self, error: Exception) -> None:
+        """Обработка ошибок"""
+        self.agi.set_variable("VERIF_STATUS", self.STATUS_ERROR)
+        self.agi.verbose(f"❌ Ошибка в скрипте: {str(error)}", 1)
+        if os.getenv("DEBUG") or os.getenv("ASTERISK_DEBUG"):
+            import traceback
+            traceback.print_exc(file=sys.stderr)
+            self.agi.verbose(f"Traceback: {traceback.format_exc()}", 3)
+
+    def cleanup(self) -> None:
+        """Освобождение ресурсов"""
+        if self.db:
+            self.db.log_report(self.agi)
+            self.db = None
+        if self.cursor:
+            try:
+                self.cursor.close()
+            except:
+                pass
+        if self.conn:
+            agi_db.forget(self.conn)
+            try:
+                self.conn.close()
+            except:
+                pass
+        if self.ticket:
+            self.ticket.release()
+
+
+# ────────────────────────────────────────────────
+# Точка входа
+# ────────────────────────────────────────────────
+def main():
+    """Основная функция"""
+    verifier = InnVerifier()
+    with agi_profiler.profile(verifier.agi, "inn_check"):
+        verifier.run()
+
+
+if __name__ == "__main__":
+    main()
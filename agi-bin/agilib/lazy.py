@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+Отложенный импорт тяжёлых модулей
+Модуль регистрируется в sys.modules сразу, а исполняется при первом
+обращении к атрибуту. Ветки сценария без БД (BUSY, ошибка аргументов,
+повтор ИНН из кэша) не платят за импорт psycopg2
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Возвращает модуль, который загрузится при первом обращении к атрибуту
+
+    Args:
+        name: Полное имя модуля
+
+    Returns:
+        Модуль (уже загруженный или отложенный)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
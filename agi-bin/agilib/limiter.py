@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ограничение перебора ИНН и кодовых слов
+Счётчики попыток со скользящим окном живут в памяти call_state_service.py
+и общие для всех AGI-обработчиков. Попытка учитывается по ключам:
+  caller:<номер>     — все попытки с одного номера (перебор ИНН)
+  caller:anonymous   — общий счётчик всех звонков со скрытым номером
+  inn:<ИНН>          — попытки назвать ИНН с любых номеров
+  codeword:<ИНН>     — попытки кодового слова к одному ИНН (перебор кодовых слов)
+Превышение любого лимита отклоняет попытку до обращения к БД.
+
+Окно приближённое: на ключ хранятся счётчики текущего и предыдущего
+фиксированных окон, оценка = предыдущий * доля непрошедшей части окна
++ текущий. Это O(1) по времени и памяти на попытку. Число ключей ограничено
+LIMITER_MAX_KEYS — давно не использованные ключи вытесняются (LRU).
+Решения пишутся в лог через очередь фоновым потоком, не задерживая ответ.
+
+AGI-скрипты обращаются к сервису функцией check_attempt (POST /attempt);
+если сервис недоступен, попытка разрешается — ограничитель не должен
+останавливать обслуживание.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from agilib import metrics as agi_metrics
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple
+
+STAGE_INN = "inn"
+STAGE_CODEWORD = "codeword"
+
+# Лимиты: попыток за окно (сек) по видам ключей
+LIMITS: Dict[str, Tuple[int, float]] = {
+    "caller": (int(os.getenv("LIMITER_CALLER_ATTEMPTS", "12")),
+               float(os.getenv("LIMITER_CALLER_WINDOW", "600"))),
+    "inn": (int(os.getenv("LIMITER_INN_ATTEMPTS", "10")),
+            float(os.getenv("LIMITER_INN_WINDOW", "600"))),
+    "codeword": (int(os.getenv("LIMITER_CODEWORD_ATTEMPTS", "5")),
+                 float(os.getenv("LIMITER_CODEWORD_WINDOW", "900"))),
+    # Один счётчик на всех абонентов со скрытым номером, поэтому лимит выше
+    "anonymous": (int(os.getenv("LIMITER_ANONYMOUS_ATTEMPTS", "30")),
+                  float(os.getenv("LIMITER_ANONYMOUS_WINDOW", "600"))),
+}
+
+# Номера, которые Asterisk подставляет вместо скрытого
+ANONYMOUS_CALLERS = ("", "unknown", "anonymous")
+MAX_KEYS = int(os.getenv("LIMITER_MAX_KEYS", "100000"))
+DECISIONS_LOG = os.getenv("LIMITER_LOG", "/var/log/asterisk/attempt_limiter.log")
+
+# Адрес сервиса состояния вызовов для AGI-скриптов
+SERVICE_HOST = os.getenv("CALL_STATE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("CALL_STATE_PORT", "8000"))
+SERVICE_SOCKET = os.getenv("CALL_STATE_SOCKET", "")
+CHECK_TIMEOUT = float(os.getenv("LIMITER_CHECK_TIMEOUT", "0.2"))
+
+
+class SlidingWindow:
+    """Счётчик попыток ключа: текущее и предыдущее фиксированные окна"""
+
+    __slots__ = ("started", "previous", "current")
+
+    def __init__(self, now: float):
+        self.started = now
+        self.previous = 0
+        self.current = 0
+
+    def estimate(self, now: float, window: float) -> float:
+        """Оценка числа попыток за последние window секунд"""
+        elapsed = now - self.started
+        if elapsed >= 2 * window:
+            self.started, self.previous, self.current = now, 0, 0
+            elapsed = 0.0
+        elif elapsed >= window:
+            self.started += window
+            self.previous, self.current = self.current, 0
+            elapsed -= window
+        return self.previous * (1 - elapsed / window) + self.current
+
+
+def caller_key(caller: str) -> Tuple[str, str]:
+    """(вид, ключ) номера абонента; скрытые номера делят один ключ"""
+    if caller.lower() in ANONYMOUS_CALLERS:
+        return "anonymous", "caller:anonymous"
+    return "caller", f"caller:{caller}"
+
+
+def attempt_keys(stage: str, caller: str, inn: Optional[int],
+                 count_caller: bool = True) -> List[Tuple[str, str]]:
+    """(вид, ключ) попытки этапа"""
+    keys = []
+    if count_caller:
+        keys.append(caller_key(caller))
+    if inn:
+        kind = "codeword" if stage == STAGE_CODEWORD else "inn"
+        keys.append((kind, f"{kind}:{inn}"))
+    return keys
+
+
+class AttemptLimiter:
+    """Счётчики попыток с вытеснением давно не использованных ключей"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]] = LIMITS, max_keys: int = MAX_KEYS,
+                 decisions_log: Optional[str] = DECISIONS_LOG):
+        self.limits = limits
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, SlidingWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"allowed": 0, "rejected": 0, "evicted": 0}
+        self._listener = None
+        self._decisions = self._decision_logger(decisions_log) if decisions_log else None
+
+    def _decision_logger(self, path: str):
+        """Логгер решений: запись в файл выполняет поток QueueListener"""
+        import logging
+        import logging.handlers
+        import queue
+
+        try:
+            handler = logging.FileHandler(path, encoding="utf-8")
+        except OSError:
+            handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s - LIMITER - %(levelname)s - %(message)s'))
+
+        records: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+
+        decisions = logging.getLogger("agilib.limiter.decisions")
+        decisions.propagate = False
+        decisions.setLevel(logging.INFO)
+        decisions.addHandler(logging.handlers.QueueHandler(records))
+        return decisions
+
+    def _window(self, key: str, now: float) -> SlidingWindow:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = SlidingWindow(now)
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+                self.counters["evicted"] += 1
+        else:
+            self._windows.move_to_end(key)
+        return window
+
+    def attempt(self, stage: str, caller: str, inn: Optional[int] = None,
+                count_caller: bool = True) -> Tuple[bool, str]:
+        """
+        Учитывает попытку и решает, допустить ли её
+
+        Args:
+            stage: Этап (inn или codeword)
+            caller: Номер абонента
+            inn: Названный или проверяемый ИНН
+            count_caller: Учитывать попытку номера (False — та же попытка
+                          уже учтена, дополнительно учитывается только ИНН)
+
+        Returns:
+            (допущена, вид превышенного лимита или "")
+        """
+        now = time.monotonic()
+        exceeded = ""
+        with self._lock:
+            for kind, key in attempt_keys(stage, caller, inn, count_caller):
+                limit, window_seconds = self.limits[kind]
+                window = self._window(key, now)
+                # Отклонённые попытки тоже учитываются: перебор не переждёт лимит
+                if window.estimate(now, window_seconds) >= limit and not exceeded:
+                    exceeded = kind
+                window.current += 1
+            self.counters["rejected" if exceeded else "allowed"] += 1
+
+        self._log(stage, caller, inn, exceeded)
+        return not exceeded, exceeded
+
+    def blocked(self, caller: str) -> bool:
+        """Превышен ли лимит номера (без учёта попытки)"""
+        now = time.monotonic()
+        kind, key = caller_key(caller)
+        limit, window_seconds = self.limits[kind]
+        with self._lock:
+            window = self._windows.get(key)
+            return window is not None and window.estimate(now, window_seconds) >= limit
+
+    def _log(self, stage: str, caller: str, inn: Optional[int], exceeded: str) -> None:
+        agi_metrics.emit("attempt_decisions_total", stage=stage, decision="rejected" if exceeded else "allowed",
+                         limit=exceeded or "none")
+        if self._decisions is not None:
+            if exceeded:
+                self._decisions.warning(f"🚫 {stage}: {caller or '-'} ИНН {inn or '-'} отклонено, лимит {exceeded}")
+            else:
+                self._decisions.info(f"{stage}: {caller or '-'} ИНН {inn or '-'} допущено")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"keys": len(self._windows), "max_keys": self.max_keys, **self.counters}
+
+    def close(self) -> None:
+        """Дописывает решения из очереди в лог"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+def check_attempt(stage: str, caller: str, inn: Optional[int] = None,
+                  count_caller: bool = True) -> Tuple[bool, str]:
+    """
+    Запрос к ограничителю сервиса состояния вызовов из AGI-скрипта
+    (аргументы — как у AttemptLimiter.attempt)
+
+    Returns:
+        (допущена, вид превышенного лимита или ""); при недоступности
+        сервиса попытка допускается
+    """
+    body = json.dumps({"stage": stage, "caller": caller, "inn": inn,
+                       "count_caller": count_caller}).encode("utf-8")
+    request = (
+        f"POST /attempt HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    ).encode("ascii") + body
+    try:
+        if SERVICE_SOCKET:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CHECK_TIMEOUT)
+            sock.connect(SERVICE_SOCKET)
+        else:
+            sock = socket.create_connection((SERVICE_HOST, SERVICE_PORT), timeout=CHECK_TIMEOUT)
+        with sock:
+            sock.sendall(request)
+            response = b""
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+        decision = json.loads(response.partition(b"\r\n\r\n")[2].decode("utf-8"))
+        return bool(decision["allowed"]), str(decision.get("limit") or "")
+    except (OSError, ValueError, KeyError, TypeError):
+        agi_metrics.emit("attempt_limiter_unavailable_total", stage=stage)
+        return True, ""
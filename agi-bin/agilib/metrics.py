@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+Метрики AGI-обработчиков
+AGI-скрипты живут по одному вызову, поэтому счётчики отправляются
+UDP-датаграммами (без ожидания ответа) в call_state_service.py,
+который их агрегирует и отдаёт на /metrics и /stats
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional, Tuple
+
+METRICS_HOST = os.getenv("AGI_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("AGI_METRICS_PORT", "8125"))
+
+_socket: Optional[socket.socket] = None
+
+
+def emit(name: str, value: float = 1, **tags: Any) -> None:
+    """
+    Увеличивает счётчик name на value
+
+    Args:
+        name: Имя метрики
+        value: Приращение
+        tags: Метки метрики (handler=..., mode=...)
+    """
+    global _socket
+    try:
+        if _socket is None:
+            _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _socket.setblocking(False)
+        payload = {"name": name, "value": value, "tags": {k: str(v) for k, v in tags.items()}}
+        _socket.sendto(json.dumps(payload).encode("utf-8"), (METRICS_HOST, METRICS_PORT))
+    except OSError:
+        # Метрики не должны влиять на обработку вызова
+        pass
+
+
+if TYPE_CHECKING:
+    MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class MetricsRegistry:
+    """Агрегатор счётчиков на стороне сервиса"""
+
+    def __init__(self):
+        self.counters: Dict[MetricKey, float] = {}
+
+    def add(self, name: str, value: float, tags: Dict[str, str]) -> None:
+        """Добавляет значение к счётчику"""
+        key = (name, tuple(sorted(tags.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_datagram(self, data: bytes) -> None:
+        """Разбирает датаграмму, отправленную emit()"""
+        try:
+            payload = json.loads(data.decode("utf-8"))
+            self.add(str(payload["name"]), float(payload.get("value", 1)), dict(payload.get("tags") or {}))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def as_dict(self) -> Dict[str, float]:
+        """Счётчики в виде {'name{tag="v"}': value}"""
+        return {self._format_key(key): value for key, value in sorted(self.counters.items())}
+
+    def as_prometheus(self) -> str:
+        """Счётчики в текстовом формате Prometheus"""
+        lines = [f"agi_{self._format_key(key)} {value:g}" for key, value in sorted(self.counters.items())]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_key(key: MetricKey) -> str:
+        name, tags = key
+        if not tags:
+            return name
+        labels = ",".join(f'{tag}="{value}"' for tag, value in tags)
+        return f"{name}{{{labels}}}"
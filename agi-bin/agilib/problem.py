@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+
+"""
+AGI-скрипт для сохранения описания проблемы клиента
+Сохраняет распознанный текст и путь к аудиозаписи в поле problem_text и problem_audio_path таблицы verification_logs
+Работает с таблицей verification_logs
+При перегрузке БД запись откладывается (PROBLEM_STATUS = DEFERRED, AGI_LOAD = OVERLOAD)
+"""
+
+from __future__ import annotations
+
+import sys
+import os
+
+from basicagi import BasicAGI
+
+from agilib import config
+from agilib import db as agi_db
+from agilib import profiler as agi_profiler
+from agilib.admission import AdmissionController, DeferredWrites, record_shed
+from agilib.lazy import lazy_import
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional, Tuple, Dict, Any
+
+psycopg2 = lazy_import("psycopg2")
+
+
+class ProblemSaver:
+    """Класс для сохранения описания проблемы"""
+
+    # Конфигурация базы данных
+    DB_CONFIG = config.db_config("problem_saver_agi")
+
+    # Статусы выполнения
+    STATUS_SUCCESS = "SAVED"
+    STATUS_NO_INN = "NO_INN"
+    STATUS_NO_TEXT = "NO_TEXT"
+    STATUS_NO_AUDIO = "NO_AUDIO"
+    STATUS_NO_UNIQUEID = "NO_UNIQUEID"
+    STATUS_ERROR = "ERROR"
+    STATUS_NOT_FOUND = "NOT_FOUND"
+    STATUS_DEFERRED = "DEFERRED"
+
+    def __init__(self):
+        """Инициализация AGI и подключения к БД"""
+        self.agi = BasicAGI()
+        self.conn = None
+        self.cursor = None
+        self.db = None
+        self.ticket = None
+        self.deferred = DeferredWrites()
+
+    def connect_to_db(self) -> bool:
+        """
+        Устанавливает соединение с базой данных
+
+        Returns:
+            True если соединение успешно, иначе False
+        """
+        try:
+            self.conn = psycopg2.connect(**self.DB_CONFIG)
+            self.cursor = self.conn.cursor()
+            self.db = agi_db.statements_for(self.conn)
+            self.agi.verbose("✓ Подключение к БД установлено", 3)
+            return True
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка подключения к БД: {e}", 1)
+            return False
+
+    def admit_and_connect(self) -> bool:
+        """
+        Запрашивает допуск к БД и подключается
+        При перегрузке или недоступности БД включает режим сброса нагрузки
+
+        Returns:
+            True если соединение с БД установлено
+        """
+        self.ticket = AdmissionController("save_problem").acquire()
+        if not self.ticket.shed and not self.connect_to_db():
+            self.ticket.degrade("db_connect")
+
+        self.agi.set_variable("AGI_LOAD", self.ticket.level)
+        if self.ticket.shed:
+            self.agi.verbose(f"⚠ Перегрузка: режим сброса нагрузки (ожидание {self.ticket.waited:.2f} сек)", 1)
+        return self.conn is not None
+
+    def defer_problem_description(self, problem_text: str, uniqueid: str,
+                                  inn_str: str, caller_number: str,
+                                  client_id: str, audio_path: str) -> bool:
+        """Откладывает сохранение проблемы (режим сброса нагрузки)"""
+        inn_value = int(inn_str) if inn_str.isdigit() else None
+        client_id_value = int(client_id) if client_id.isdigit() else None
+        now = self.deferred.now()
+        record_shed("save_problem", "deferred_write")
+        return self.deferred.write("problem_upsert", (
+            uniqueid, inn_value, inn_value,
+            problem_text, audio_path, now, caller_number, client_id_value,
+            uniqueid, caller_number, inn_value, client_id_value, problem_text, audio_path, now, now,
+        ))
+
+    def get_agi_variables(self) -> Tuple[str, str, str, str, str, str]:
+        """
+        Получает необходимые переменные из AGI
+
+        Returns:
+            Кортеж (problem_text, uniqueid, inn_str, caller_number, client_id, audio_path)
+        """
+        problem_text = self.agi.get_variable("SPEECH_TEXT(0)") or ""
+        uniqueid = self.agi.get_variable("UNIQUEID") or ""
+        inn_str = self.agi.get_variable("VERIF_INN") or ""
+        caller_number = self.agi.get_variable("CALLERID(num)") or ""
+        client_id = self.agi.get_variable("VERIF_CLIENT_ID") or ""
+        # AUDIO_FILE выставляет convert_recording.py (OGG или исходный WAV, если конвертации не было)
+        audio_path = self.agi.get_variable("AUDIO_FILE") or self.agi.get_variable("RECORDING_OGG") or ""
+
+        # Для отладки выводим все полученные переменные
+        self.agi.verbose(f"Получены переменные:", 3)
+        self.agi.verbose(f"  problem_text: '{problem_text}'", 3)
+        self.agi.verbose(f"  uniqueid: '{uniqueid}'", 3)
+        self.agi.verbose(f"  inn_str: '{inn_str}'", 3)
+        self.agi.verbose(f"  caller_number: '{caller_number}'", 3)
+        self.agi.verbose(f"  client_id: '{client_id}'", 3)
+        self.agi.verbose(f"  audio_path: '{audio_path}'", 3)
+
+        return problem_text, uniqueid, inn_str, caller_number, client_id, audio_path
+
+    def find_verification_log(self, uniqueid: str, inn_value: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Находит запись в таблице verification_logs
+
+        Args:
+            uniqueid: Уникальный ID вызова
+            inn_value: ИНН (опционально)
+
+        Returns:
+            Словарь с данными записи или None
+        """
+        try:
+            if inn_value:
+                # Ищем по uniqueid и ИНН
+                self.db.execute(self.cursor, "problem_find_by_inn", (uniqueid, inn_value))
+            else:
+                # Ищем только по uniqueid
+                self.db.execute(self.cursor, "problem_find", (uniqueid,))
+
+            row = self.cursor.fetchone()
+            if row:
+                return {
+                    'id': row[0],
+                    'call_uniqueid': row[1],
+                    'caller_number': row[2],
+                    'spoken_inn': row[3],
+                    'matched_client_id': row[4],
+                    'success': row[5],
+                    'problem_text': row[6],
+                    'problem_recognized_at': row[7],
+                    'problem_audio_path': row[8]
+                }
+            return None
+
+        except psycopg2.Error as e:
+            self.agi.verbose(f"Ошибка при поиске записи: {e}", 2)
+            return None
+
+    def save_problem_description(self, problem_text: str, uniqueid: str,
+                                inn_str: str, caller_number: str,
+                                client_id: str, audio_path: str) -> bool:
+        """
+        Сохраняет описание проблемы и путь к аудиофайлу в таблицу verification_logs
+
+        Args:
+            problem_text: Распознанный текст проблемы
+            uniqueid: Уникальный ID вызова
+            inn_str: Строка с ИНН
+            caller_number: Номер звонящего
+            client_id: ID клиента (если есть)
+            audio_path: Путь к файлу с записью проблемы
+
+        Returns:
+            True если запись сохранена, иначе False
+        """
+        try:
+            # Проверяем наличие обязательных данных
+            if not uniqueid:
+                self.agi.verbose("❌ Отсутствует uniqueid", 1)
+                return False
+
+            if not problem_text:
+                self.agi.verbose("❌ Отсутствует текст проблемы", 1)
+                return False
+
+            if not audio_path:
+                self.agi.verbose("⚠ Отсутствует путь к аудиофайлу, сохраняем только текст", 1)
+
+            # Преобразуем ИНН в число, если есть
+            inn_value = None
+            if inn_str:
+                try:
+                    inn_value = int(inn_str)
+                except ValueError:
+                    self.agi.verbose(f"⚠ Некорректный ИНН: {inn_str}, продолжаем без него", 1)
+
+            # Преобразуем client_id в число, если есть
+            client_id_value = None
+            if client_id:
+                try:
+                    client_id_value = int(client_id)
+                except ValueError:
+                    self.agi.verbose(f"⚠ Некорректный client_id: {client_id}", 1)
+
+            # Ищем существующую запись
+            existing_log = self.find_verification_log(uniqueid, inn_value)
+
+            if existing_log:
+                # Обновляем существующую запись
+                self.db.execute(self.cursor, "problem_update",
+                                (problem_text, audio_path, caller_number, client_id_value, existing_log['id']))
+
+                action = "обновлена"
+                record_id = existing_log['id']
+                self.agi.verbose(f"Найдена существующая запись ID: {record_id}", 2)
+
+            else:
+                # Создаем новую запись
+                self.db.execute(self.cursor, "problem_insert",
+                                (uniqueid, caller_number, inn_value, client_id_value, problem_text, audio_path))
+
+                action = "создана"
+                record_id = self.cursor.fetchone()[0]
+
+            if self.cursor.rowcount > 0:
+                self.conn.commit()
+                self.agi.verbose(f"✓ Запись {action} в verification_logs (ID: {record_id})", 1)
+
+                # Дополнительная информация для отладки
+                self.agi.verbose(f"  - Текст проблемы: '{problem_text[:50]}...'", 2)
+                self.agi.verbose(f"  - Длина текста: {len(problem_text)} символов", 2)
+                if audio_path:
+                    self.agi.verbose(f"  - Аудиофайл: {audio_path}", 2)
+                if inn_value:
+                    self.agi.verbose(f"  - ИНН: {inn_value}", 2)
+                if client_id_value:
+                    self.agi.verbose(f"  - Client ID: {client_id_value}", 2)
+
+                return True
+            else:
+                self.agi.verbose("⚠ Запись не была сохранена", 1)
+                return False
+
+        except psycopg2.Error as e:
+            self.agi.verbose(f"❌ Ошибка при сохранении в БД: {e}", 1)
+            if self.conn:
+                self.conn.rollback()
+        except Exception as e:
+            self.agi.verbose(f"❌ Неожиданная ошибка: {e}", 1)
+            if os.getenv("DEBUG"):
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+
+        return False
+
+    def run(self) -> None:
+        """Основной метод выполнения скрипта"""
+        try:
+            self.agi.verbose("=== НАЧАЛО СОХРАНЕНИЯ ПРОБЛЕМЫ ===", 1)
+
+            # Получаем переменные из AGI
+            problem_text, uniqueid, inn_str, caller_number, client_id, audio_path = self.get_agi_variables()
+
+            # Проверяем наличие uniqueid
+            if not uniqueid:
+                self.agi.set_variable("PROBLEM_STATUS", self.STATUS_NO_UNIQUEID)
+                self.agi.verbose("❌ Отсутствует UNIQUEID", 1)
+                return
+
+            # Проверяем наличие распознанного текста
+            if not problem_text:
+                self.agi.set_variable("PROBLEM_STATUS", self.STATUS_NO_TEXT)
+                self.agi.verbose("❌ Нет распознанного текста для сохранения", 1)
+                return
+
+            # Выводим информацию для отладки
+            self.agi.verbose(f"📝 Текст проблемы: '{problem_text}'", 1)
+            self.agi.verbose(f"📞 Номер звонящего: {caller_number or 'неизвестен'}", 1)
+            self.agi.verbose(f"🆔 UniqueID: {uniqueid}", 1)
+
+            if inn_str:
+                self.agi.verbose(f"🔢 ИНН: {inn_str}", 1)
+            if client_id:
+                self.agi.verbose(f"👤 Client ID: {client_id}", 1)
+            if audio_path:
+                self.agi.verbose(f"🎵 Аудиофайл: {audio_path}", 1)
+            else:
+                self.agi.verbose("⚠ Путь к аудиофайлу не указан", 1)
+
+            # Подключаемся к БД (при перегрузке откладываем запись)
+            if not self.admit_and_connect():
+                if self.defer_problem_description(problem_text, uniqueid, inn_str,
+                                                  caller_number, client_id, audio_path):
+                    self.agi.set_variable("PROBLEM_STATUS", self.STATUS_DEFERRED)
+                    self.agi.verbose("⏳ БД перегружена, сохранение проблемы отложено", 1)
+                else:
+                    self.agi.set_variable("PROBLEM_STATUS", self.STATUS_ERROR)
+                    self.agi.verbose("❌ Не удалось подключиться к БД", 1)
+                return
+
+            # Сохраняем проблему в БД
+            if self.save_problem_description(problem_text, uniqueid, inn_str, caller_number, client_id, audio_path):
+                self.agi.set_variable("PROBLEM_STATUS", self.STATUS_SUCCESS)
+                self.agi.verbose("✅ Проблема успешно сохранена в verification_logs", 1)
+            else:
+                self.agi.set_variable("PROBLEM_STATUS", self.STATUS_ERROR)
+                self.agi.verbose("❌ Не удалось сохранить проблему в БД", 1)
+
+            self.agi.verbose("=== ЗАВЕРШЕНИЕ СОХРАНЕНИЯ ПРОБЛЕМЫ ===", 1)
+
+        except Exception as e:
+            self.handle_error(e)
+        finally:
+            self.cleanup()
+
+    def handle_error(self, error: Exception) -> None:
+        """Обработка ошибок"""
+        self.agi.set_variable("PROBLEM_STATUS", self.STATUS_ERROR)
+        self.agi.verbose(f"❌ Ошибка в скрипте: {str(error)}", 1)
+
+        # Детальная информация для отладки
+        if os.getenv("DEBUG") or os.getenv("ASTERISK_DEBUG"):
+            import traceback
+            traceback.print_exc(file=sys.stderr)
+            self.agi.verbose(f"Traceback: {traceback.format_exc()}", 3)
+
+    def cleanup(self) -> None:
+        """Освобождение ресурсов"""
+        if self.db:
+            self.db.log_report(self.agi)
+            self.db = None
+        if self.cursor:
+            try:
+                self.cursor.close()
+                self.agi.verbose("✓ Курсор закрыт", 3)
+            except:
+                pass
+        if self.conn:
+            agi_db.forget(self.conn)
+            try:
+                self.conn.close()
+                self.agi.verbose("✓ Соединение с БД закрыто", 3)
+            except:
+                pass
+        if self.ticket:
+            self.ticket.release()
+
+
+# ────────────────────────────────────────────────
+# Точка входа
+# ────────────────────────────────────────────────
+def main():
+    """Основная функция"""
+    saver = ProblemSaver()
+    with agi_profiler.profile(saver.agi, "save_problem"):
+        saver.run()
+
+
+if __name__ == "__main__":
+    main()
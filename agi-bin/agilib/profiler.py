@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+Выборочный профилировщик AGI-обработчиков
+Фоновый поток раз в AGI_PROFILE_INTERVAL_MS снимает стек потока обработчика
+и копит его в формате collapsed stacks (одна строка «кадр;кадр;... число»).
+Профиль каждого вызова пишется в AGI_PROFILE_DIR в файл
+<этап>.<call_uniqueid>.<pid>.folded
+
+Включение:
+  AGI_PROFILE_RATE=0.01   — профилировать 1 вызов из 100 (все этапы вызова:
+                            выборка по хешу call_uniqueid одинакова во всех скриптах)
+  AGI_PROFILE=1           — профилировать все вызовы
+  AGI_PROFILE=channel     — профилировать вызовы с переменной канала AGI_PROFILE=1
+Без этих переменных профилировщик ничего не делает
+
+Объединение профилей в файл для flamegraph.pl / speedscope (из каталога agi-bin):
+    python3 -m agilib.profiler merge [--stage inn_check] [--by stage|call] [-o profile.folded]
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Counter, Iterator, Optional
+
+PROFILE_DIR = os.getenv("AGI_PROFILE_DIR", "/var/log/asterisk/agi-profiles")
+PROFILE_MODE = os.getenv("AGI_PROFILE", "")
+PROFILE_RATE = float(os.getenv("AGI_PROFILE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("AGI_PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Переменная канала для AGI_PROFILE=channel
+PROFILE_VARIABLE = "AGI_PROFILE"
+
+FILE_PATTERN = re.compile(r"^(?P<stage>[^.]+)\.(?P<call>.+)\.(?P<pid>\d+)\.folded$")
+
+
+class StackSampler:
+    """Сэмплер стека одного потока"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="agi-profiler", daemon=True)
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def should_profile(agi) -> bool:
+    """Решает, профилировать ли текущий вызов"""
+    if PROFILE_MODE in ("1", "all"):
+        return True
+    # Выборка по хешу uniqueid: каждый скрипт вызова решает одинаково,
+    # и в профиль попадают все этапы выбранного вызова
+    uniqueid = agi.env.get("uniqueid", "")
+    if PROFILE_RATE and uniqueid and zlib.crc32(uniqueid.encode()) / 2 ** 32 < PROFILE_RATE:
+        return True
+    if PROFILE_MODE == "channel":
+        return (agi.get_variable(PROFILE_VARIABLE) or "") == "1"
+    return False
+
+
+def _safe(value: str) -> str:
+    return re.sub(r"[^\w-]", "_", value) or "unknown"
+
+
+def write_profile(stage: str, uniqueid: str, stacks: Counter[str],
+                  profile_dir: str = PROFILE_DIR) -> Optional[str]:
+    """Записывает профиль вызова. Возвращает путь к файлу"""
+    if not stacks:
+        return None
+    os.makedirs(profile_dir, exist_ok=True)
+    # uniqueid вида 1700000000.42 — точка заменяется, чтобы имя разбиралось однозначно
+    name = f"{_safe(stage)}.{_safe(uniqueid)}.{os.getpid()}.folded"
+    path = os.path.join(profile_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+@contextlib.contextmanager
+def profile(agi, stage: str) -> Iterator[None]:
+    """
+    Профилирует блок кода обработчика, если вызов попал в выборку
+
+    Args:
+        agi: BasicAGI или FastAGI текущего вызова
+        stage: Этап (имя обработчика) для имени файла
+    """
+    if not PROFILE_MODE and not PROFILE_RATE:
+        yield
+        return
+
+    try:
+        enabled = should_profile(agi)
+    except Exception:
+        enabled = False
+    if not enabled:
+        yield
+        return
+
+    sampler = StackSampler(threading.get_ident())
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        stacks = sampler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            path = write_profile(stage, agi.env.get("uniqueid", ""), stacks)
+            agi.verbose(f"Профиль {stage}: {sampler.samples} сэмплов за {elapsed_ms:.0f} мс -> {path}", 3)
+        except Exception:
+            # Профилирование не должно влиять на обработку вызова
+            pass
+
+
+def merge(files, by: str = "") -> Counter[str]:
+    """
+    Объединяет профили вызовов
+
+    Args:
+        files: Пути к файлам .folded
+        by: Корневой кадр: stage — этап, call — этап и вызов, пусто — без него
+
+    Returns:
+        Счётчик collapsed stacks
+    """
+    merged: Counter[str] = collections.Counter()
+    for path in files:
+        match = FILE_PATTERN.match(os.path.basename(path))
+        prefix = ""
+        if match and by == "stage":
+            prefix = f"{match['stage']};"
+        elif match and by == "call":
+            prefix = f"{match['stage']};{match['call']};"
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    merged[prefix + stack] += int(count)
+    return merged
+
+
+def main():
+    """Точка входа: объединение профилей"""
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Профили AGI-обработчиков")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge_parser = sub.add_parser("merge", help="Объединить профили в один файл collapsed stacks")
+    merge_parser.add_argument("files", nargs="*", help="Файлы .folded (по умолчанию все в AGI_PROFILE_DIR)")
+    merge_parser.add_argument("--dir", default=PROFILE_DIR, help="Каталог профилей")
+    merge_parser.add_argument("--stage", help="Только профили указанного этапа")
+    merge_parser.add_argument("--by", choices=("stage", "call"), default="stage",
+                              help="Корневой кадр графа (по умолчанию этап)")
+    merge_parser.add_argument("-o", "--output", help="Файл результата (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(args.dir, "*.folded")))
+    if args.stage:
+        files = [f for f in files if os.path.basename(f).startswith(f"{_safe(args.stage)}.")]
+    merged = merge(files, args.by)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for stack, count in sorted(merged.items()):
+            out.write(f"{stack} {count}\n")
+    finally:
+        if args.output:
+            out.close()
+    print(f"Объединено профилей: {len(files)}, стеков: {len(merged)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
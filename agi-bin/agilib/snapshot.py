@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+Снимок активных клиентов в отображаемом в память файле
+AGI-скрипты живут по одному вызову, и соединение с PostgreSQL только ради
+поиска клиента по ИНН стоит дороже самого поиска. Экспортёр (client_snapshot.py)
+выгружает активных клиентов в компактный файл, а скрипты ищут в нём
+двоичным поиском без обращения к сети; при промахе или устаревшем снимке
+поиск идёт в БД как раньше.
+
+Формат файла (little-endian):
+  заголовок  HEADER: магия, версия, число записей, время сборки, смещение кучи
+  индекс     count записей INDEX_ENTRY, отсортированных по ИНН:
+             ИНН (u64), id клиента (u64), смещение (u32) и длина (u32) в куче
+  куча       UTF-8 строки записей: company_name, code_word, phone_number,
+             telegram_chat_id, разделённые FIELD_SEPARATOR
+
+Свежесть снимка — mtime файла: экспортёр обновляет его после каждой проверки
+таблицы clients, даже если клиенты не менялись
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterable, Optional, Tuple
+
+SNAPSHOT_PATH = os.getenv("CLIENT_SNAPSHOT_PATH", "/var/lib/asterisk/agi-cache/clients.snapshot")
+# Снимок старше этого (экспортёр остановлен) не используется, сек
+SNAPSHOT_MAX_AGE = float(os.getenv("CLIENT_SNAPSHOT_MAX_AGE", "300"))
+
+MAGIC = b"AGCS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIdQ")
+INDEX_ENTRY = struct.Struct("<QQII")
+INN_KEY = struct.Struct("<Q")
+FIELD_SEPARATOR = "\x1f"
+
+
+def clients_fingerprint(cursor) -> Tuple[Any, ...]:
+    """Дешёвый отпечаток таблицы clients для инкрементальной пересборки"""
+    cursor.execute("SELECT count(*), count(*) FILTER (WHERE active), max(updated_at) FROM clients")
+    return tuple(cursor.fetchone())
+
+
+def active_clients(cursor) -> Iterable[Tuple[Any, ...]]:
+    """Активные клиенты в порядке ИНН"""
+    cursor.execute("""
+        SELECT id, inn, company_name, code_word, phone_number, telegram_chat_id
+        FROM clients
+        WHERE active = true
+        ORDER BY inn
+    """)
+    return cursor.fetchall()
+
+
+def build(rows: Iterable[Tuple[Any, ...]]) -> bytes:
+    """
+    Собирает содержимое файла снимка
+
+    Args:
+        rows: (id, inn, company_name, code_word, phone_number, telegram_chat_id)
+
+    Returns:
+        Байты файла
+    """
+    rows = sorted(rows, key=lambda row: row[1])
+    index = bytearray()
+    heap = bytearray()
+    for client_id, inn, company_name, code_word, phone_number, telegram_chat_id in rows:
+        fields = (company_name, code_word, phone_number, telegram_chat_id)
+        record = FIELD_SEPARATOR.join("" if f is None else str(f).replace(FIELD_SEPARATOR, " ") for f in fields)
+        data = record.encode("utf-8")
+        index += INDEX_ENTRY.pack(int(inn), int(client_id), len(heap), len(data))
+        heap += data
+
+    heap_offset = HEADER.size + len(index)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(rows), time.time(), heap_offset)
+    return header + bytes(index) + bytes(heap)
+
+
+def publish(path: str, body: bytes) -> None:
+    """Атомарно заменяет файл снимка (открытые читателями отображения остаются целыми)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    # Снимок содержит кодовые слова клиентов
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+
+def touch(path: str) -> None:
+    """Подтверждает свежесть неизменившегося снимка"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class ClientSnapshot:
+    """Поиск клиента по ИНН в файле снимка"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH, max_age: float = SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        self._heap_offset = 0
+        self._opened = False
+
+    def _open(self) -> bool:
+        """Отображает файл в память один раз за процесс"""
+        if self._opened:
+            return self._map is not None
+        self._opened = True
+        try:
+            with open(self.path, "rb") as f:
+                if time.time() - os.fstat(f.fileno()).st_mtime > self.max_age:
+                    return False
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        magic, version, _, count, _, heap_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or heap_offset != HEADER.size + count * INDEX_ENTRY.size:
+            self.close()
+            return False
+        self._count = count
+        self._heap_offset = heap_offset
+        return True
+
+    @property
+    def available(self) -> bool:
+        """Снимок есть, свежий и корректный"""
+        return self._open()
+
+    def get(self, inn: int) -> Optional[Dict[str, Any]]:
+        """
+        Ищет клиента двоичным поиском по индексу
+
+        Returns:
+            Клиент в формате InnVerifier.find_client_by_inn или None
+            (нет в снимке или снимок недоступен)
+        """
+        if not self._open():
+            return None
+
+        key = int(inn)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if INN_KEY.unpack_from(self._map, HEADER.size + mid * INDEX_ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._count:
+            return None
+
+        inn_value, client_id, offset, length = INDEX_ENTRY.unpack_from(self._map, HEADER.size + lo * INDEX_ENTRY.size)
+        if inn_value != key:
+            return None
+
+        start = self._heap_offset + offset
+        company_name, code_word, phone_number, telegram_chat_id = (
+            self._map[start:start + length].decode("utf-8").split(FIELD_SEPARATOR)
+        )
+        return {
+            'id': client_id,
+            'inn': inn_value,
+            'company_name': company_name,
+            'code_word': code_word,
+            'phone_number': phone_number or None,
+            'telegram_chat_id': int(telegram_chat_id) if telegram_chat_id else None
+        }
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+"""
+EAGI-скрипт сессии распознавания речи
+Сам передаёт звук канала (fd 3, slin 8 кГц) на сервер Vosk по WebSocket
+с грамматикой этапа (agilib/grammar.py) и разбирает промежуточные
+результаты по мере поступления. На этапе inn прослушивание прекращается,
+как только в промежуточном результате устойчиво держится ИНН с верными
+контрольными цифрами, — без ожидания конца фразы и таймаута.
+Если после ИНН в той же фразе звучат другие слова (кодовое слово),
+сессия дожидается конца фразы.
+
+Вызов из диалплана:
+    EAGI(speech_session.py,inn,10)            ; этап, таймаут ожидания речи (сек)
+    EAGI(speech_session.py,inn+codeword,10)   ; ИНН и кодовое слово одной фразой
+    EAGI(speech_session.py,inn,6,14)          ; и предел длительности фразы (сек)
+
+Таймауты подбираются по истории (speech_stats.py, agilib/timeouts.py); для этого
+начало и длительность каждой фразы уходят в спул отложенных записей
+(utterance_insert) — без соединения с БД на пути вызова.
+
+Устанавливает переменные:
+SPEECH_RESULT = распознанный текст
+SPEECH_STOP_REASON = VALID_INN / END_OF_SPEECH / TIMEOUT / HANGUP / ERROR
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+import websockets
+from basicagi import BasicAGI
+
+from agilib import grammar as speech_grammar
+from agilib import metrics as agi_metrics
+from agilib import profiler as agi_profiler
+from agilib.admission import DeferredWrites
+from agilib.inn import InnVerifier
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Optional
+
+VOSK_URL = os.getenv("VOSK_URL", "ws://10.7.35.3:2700")
+
+# Звук EAGI: signed linear 16 бит, 8 кГц, по 100 мс на сообщение
+EAGI_AUDIO_FD = 3
+SAMPLE_RATE = 8000
+CHUNK_BYTES = SAMPLE_RATE * 2 // 10
+
+# Максимальная длительность фразы, сек
+MAX_UTTERANCE = float(os.getenv("SPEECH_MAX_UTTERANCE", "30"))
+
+# Сколько ИНН из 10 цифр должен продержаться в промежуточных результатах, мс:
+# за паузой между цифрами может последовать продолжение 12-значного ИНН.
+# ИНН из 12 цифр продолжить нечем — он принимается сразу
+INN_STABLE_MS = int(os.getenv("SPEECH_INN_STABLE_MS", "700"))
+
+
+class SpeechSession:
+    """Сессия распознавания одного этапа"""
+
+    STOP_VALID_INN = "VALID_INN"
+    STOP_END_OF_SPEECH = "END_OF_SPEECH"
+    STOP_TIMEOUT = "TIMEOUT"
+    STOP_HANGUP = "HANGUP"
+    STOP_ERROR = "ERROR"
+
+    def __init__(self, stage: str, timeout: float, max_utterance: float = MAX_UTTERANCE):
+        """
+        Args:
+            stage: Этап распознавания (inn, codeword или inn+codeword)
+            timeout: Сколько ждать начала речи, сек
+            max_utterance: Предел длительности прослушивания, сек
+        """
+        self.agi = BasicAGI()
+        self.stage = stage
+        self.timeout = timeout
+        self.max_utterance = max_utterance
+        self.stages = stage.split("+")
+        self.inn_parser = InnVerifier.parser() if "inn" in self.stages else None
+
+        # Текущий (промежуточный или итоговый) результат
+        self.text = ""
+
+        # Кандидат ИНН и время его первого появления
+        self.candidate: Optional[int] = None
+        self.candidate_since = 0.0
+
+        # Начало и конец речи от начала прослушивания, сек
+        self.onset: Optional[float] = None
+        self.speech_end: Optional[float] = None
+
+    def valid_inn_stable(self, now: float) -> bool:
+        """Держится ли в тексте ИНН с верными контрольными цифрами"""
+        inn, tail = self.inn_parser.split_inn_and_codeword(self.text)
+        if tail:
+            # Абонент продолжает фразу кодовым словом — ждём её конца
+            self.candidate = None
+            return False
+        if inn is None or not InnVerifier.inn_checksum_valid(inn):
+            self.candidate = None
+            return False
+
+        if inn != self.candidate:
+            self.candidate = inn
+            self.candidate_since = now
+
+        if len(str(inn)) > InnVerifier.INN_MIN_LENGTH:
+            return True
+        return (now - self.candidate_since) * 1000 >= INN_STABLE_MS
+
+    async def listen(self) -> str:
+        """
+        Передаёт звук на сервер Vosk до условия остановки
+
+        Returns:
+            Причина остановки
+        """
+        loop = asyncio.get_running_loop()
+        config = {"sample_rate": SAMPLE_RATE}
+        grammar = []
+        for stage in self.stages:
+            phrases = speech_grammar.load_grammar(stage)
+            if phrases is None:
+                # Без грамматики одного из этапов — полный словарь
+                grammar = []
+                break
+            grammar.extend(p for p in phrases if p not in grammar)
+        if grammar:
+            config["phrase_list"] = grammar
+
+        started = time.monotonic()
+        heard = False
+        async with websockets.connect(VOSK_URL) as ws:
+            await ws.send(json.dumps({"config": config}))
+            while True:
+                chunk = await loop.run_in_executor(None, os.read, EAGI_AUDIO_FD, CHUNK_BYTES)
+                if not chunk:
+                    return self.STOP_HANGUP
+
+                await ws.send(chunk)
+                result = json.loads(await ws.recv())
+                now = time.monotonic()
+                elapsed = now - started
+
+                if result.get("text"):
+                    # Конец фразы по детектору тишины Vosk: итог заменяет промежуточный результат
+                    self.text = result["text"]
+                    if self.onset is None:
+                        self.onset = elapsed
+                    self.speech_end = elapsed
+                    return self.STOP_END_OF_SPEECH
+
+                if result.get("partial") and result["partial"] != self.text:
+                    self.text = result["partial"]
+                    if not heard:
+                        self.onset = elapsed
+                    heard = True
+                    self.speech_end = elapsed
+
+                if heard and self.inn_parser and self.valid_inn_stable(now):
+                    return self.STOP_VALID_INN
+
+                if (not heard and elapsed >= self.timeout) or elapsed >= self.max_utterance:
+                    return self.STOP_TIMEOUT
+
+    def record_utterance(self, reason: str) -> None:
+        """Кладёт начало и длительность фразы в спул для speech_stats.py"""
+        if reason == self.STOP_ERROR:
+            return
+        onset_ms = None if self.onset is None else int(self.onset * 1000)
+        duration_ms = None
+        if self.onset is not None and self.speech_end is not None:
+            duration_ms = int((self.speech_end - self.onset) * 1000)
+        # Речь шла, когда сработал предел длительности
+        truncated = reason == self.STOP_TIMEOUT and self.onset is not None
+        DeferredWrites().write("utterance_insert", (
+            self.agi.get_variable("UNIQUEID") or "",
+            self.agi.get_variable("CALLERID(num)") or "",
+            self.stage, onset_ms, duration_ms, int(self.timeout * 1000),
+            reason, truncated, DeferredWrites.now(),
+        ))
+
+    def run(self) -> None:
+        """Основной метод выполнения скрипта"""
+        started = time.monotonic()
+        reason = self.STOP_ERROR
+        try:
+            reason = asyncio.run(self.listen())
+        except Exception as e:
+            self.agi.verbose(f"❌ Ошибка сессии распознавания: {e}", 1)
+            if os.getenv("DEBUG") or os.getenv("ASTERISK_DEBUG"):
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+        finally:
+            listened_ms = (time.monotonic() - started) * 1000
+            agi_metrics.emit("speech_sessions_total", stage=self.stage, reason=reason)
+            agi_metrics.emit("speech_listen_ms_total", listened_ms, stage=self.stage)
+
+        self.agi.set_variable("SPEECH_RESULT", self.text)
+        self.agi.set_variable("SPEECH_STOP_REASON", reason)
+        self.agi.verbose(f"Распознано ({self.stage}, {reason}, {listened_ms:.0f} мс): '{self.text}'", 2)
+        self.record_utterance(reason)
+
+
+# ────────────────────────────────────────────────
+# Точка входа
+# ────────────────────────────────────────────────
+def main():
+    """Основная функция"""
+    stage = sys.argv[1] if len(sys.argv) > 1 else "inn"
+    timeout = float(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] else 10
+    max_utterance = float(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] else MAX_UTTERANCE
+    session = SpeechSession(stage, timeout, max_utterance)
+    with agi_profiler.profile(session.agi, f"speech_{stage.replace('+', '_')}"):
+        session.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+AGI-скрипт публикации таймаутов распознавания
+Вызывается в начале вызова: читает рекомендации speech_stats.py
+(файл SPEECH_TIMEOUTS_PATH, без обращения к БД) и устанавливает переменные
+канала для этапов inn, codeword и problem:
+SPEECH_TIMEOUT_<ЭТАП> = сколько ждать начала речи, сек
+SPEECH_MAX_UTTERANCE_<ЭТАП> = предел длительности фразы, сек (этапы EAGI-сессии)
+
+Значения абонента (если по нему накоплено достаточно фраз) важнее значений
+этапа. Если файла нет, он устарел или этапа в нём нет, переменные не
+меняются — действуют значения по умолчанию из диалплана.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from basicagi import BasicAGI
+
+from agilib import profiler as agi_profiler
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional
+
+TIMEOUTS_PATH = os.getenv("SPEECH_TIMEOUTS_PATH", "/var/lib/asterisk/agi-cache/speech_timeouts.json")
+# Рекомендации старше этого (задача пересчёта остановлена) не используются, сек
+TIMEOUTS_MAX_AGE = float(os.getenv("SPEECH_TIMEOUTS_MAX_AGE", str(7 * 24 * 3600)))
+
+STAGES = ("inn", "codeword", "problem")
+
+
+def variable_suffix(stage: str) -> str:
+    """Этап в имени переменной: inn+codeword -> INN"""
+    return stage.split("+")[0].upper()
+
+
+def load(path: str = TIMEOUTS_PATH, max_age: float = TIMEOUTS_MAX_AGE) -> Optional[Dict[str, Any]]:
+    """Рекомендации из файла или None (нет, устарели, повреждены)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            if time.time() - os.fstat(f.fileno()).st_mtime > max_age:
+                return None
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def publish(path: str, data: Dict[str, Any]) -> None:
+    """Атомарно заменяет файл рекомендаций"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def recommend(data: Dict[str, Any], caller: str) -> Dict[str, float]:
+    """
+    Переменные канала для абонента
+
+    Args:
+        data: Содержимое файла рекомендаций
+        caller: Номер абонента
+
+    Returns:
+        {имя_переменной: секунды}
+    """
+    variables = {}
+    personal = data.get("callers", {}).get(caller, {})
+    for stage in STAGES:
+        values = dict(data.get("stages", {}).get(stage, {}))
+        values.update(personal.get(stage, {}))
+        if values.get("timeout"):
+            variables[f"SPEECH_TIMEOUT_{variable_suffix(stage)}"] = values["timeout"]
+        if values.get("max_utterance"):
+            variables[f"SPEECH_MAX_UTTERANCE_{variable_suffix(stage)}"] = values["max_utterance"]
+    return variables
+
+
+class TimeoutPublisher:
+    """Установка рекомендованных таймаутов в переменные канала"""
+
+    def __init__(self):
+        self.agi = BasicAGI()
+
+    def run(self) -> None:
+        """Основной метод выполнения скрипта"""
+        data = load()
+        if data is None:
+            self.agi.verbose("Рекомендаций таймаутов нет, действуют значения диалплана", 3)
+            return
+
+        caller = self.agi.get_variable("CALLERID(num)") or ""
+        variables = recommend(data, caller)
+        for name, value in variables.items():
+            self.agi.set_variable(name, f"{value:g}")
+        self.agi.verbose(
+            "Таймауты распознавания: " + ", ".join(f"{name}={value:g}" for name, value in variables.items()), 3
+        )
+
+
+# ────────────────────────────────────────────────
+# Точка входа
+# ────────────────────────────────────────────────
+def main():
+    """Основная функция"""
+    publisher = TimeoutPublisher()
+    with agi_profiler.profile(publisher.agi, "speech_timeouts"):
+        publisher.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк распознавания с грамматикой этапа и без неё
+Каждый WAV-файл (моно, 16 бит) передаётся на сервер Vosk по WebSocket
+в реальном темпе или с заданным ускорением; измеряется задержка
+от конца аудио до финального результата и итоговый текст.
+Для этапа inn дополнительно проверяется, извлекается ли ИНН
+
+Использование:
+    ./bench_grammar.py --stage inn [--url ws://...] [--speed 0] файл.wav ...
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import wave
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+
+from agilib import grammar as speech_grammar
+
+VOSK_URL = os.getenv("VOSK_URL", "ws://10.7.35.3:2700")
+
+# 100 мс аудио на сообщение — как у res_speech_vosk
+CHUNK_SECONDS = 0.1
+
+
+async def recognize(url: str, path: str, grammar: Optional[List[str]], speed: float) -> Tuple[str, float, float]:
+    """
+    Распознаёт файл
+
+    Args:
+        url: Адрес сервера Vosk
+        path: WAV-файл
+        grammar: Список фраз или None (полный словарь)
+        speed: Ускорение передачи (0 — без пауз)
+
+    Returns:
+        (текст, задержка_после_конца_аудио_мс, общее_время_мс)
+    """
+    with wave.open(path, "rb") as wav:
+        rate = wav.getframerate()
+        frames_per_chunk = int(rate * CHUNK_SECONDS)
+        chunks = []
+        while True:
+            data = wav.readframes(frames_per_chunk)
+            if not data:
+                break
+            chunks.append(data)
+
+    config: Dict[str, Any] = {"sample_rate": rate}
+    if grammar:
+        config["phrase_list"] = grammar
+
+    started = time.perf_counter()
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps({"config": config}))
+        for chunk in chunks:
+            await ws.send(chunk)
+            await ws.recv()
+            if speed:
+                await asyncio.sleep(CHUNK_SECONDS / speed)
+        eof_at = time.perf_counter()
+        await ws.send('{"eof" : 1}')
+        result = json.loads(await ws.recv())
+    finished = time.perf_counter()
+
+    return result.get("text", ""), (finished - eof_at) * 1000, (finished - started) * 1000
+
+
+def inn_extracted(text: str) -> bool:
+    """Извлекается ли ИНН из текста (без обращения к БД)"""
+    from agilib.inn import InnVerifier
+
+    verifier = InnVerifier.parser()
+    return verifier.extract_inn(text) is not None
+
+
+async def run(args) -> None:
+    grammar = speech_grammar.load_grammar(args.stage, args.dir)
+    if grammar is None:
+        print(f"Грамматика {args.stage} не опубликована в {args.dir}, запустите ./speech_grammar.py")
+        sys.exit(1)
+
+    modes = (("без грамматики", None), ("с грамматикой", grammar))
+    latencies: Dict[str, List[float]] = {name: [] for name, _ in modes}
+    totals: Dict[str, List[float]] = {name: [] for name, _ in modes}
+    extracted: Dict[str, int] = {name: 0 for name, _ in modes}
+
+    for path in args.files:
+        print(f"\n{os.path.basename(path)}")
+        for name, phrases in modes:
+            for _ in range(args.repeat):
+                text, latency, total = await recognize(args.url, path, phrases, args.speed)
+                latencies[name].append(latency)
+                totals[name].append(total)
+            if args.stage == "inn" and inn_extracted(text):
+                extracted[name] += 1
+            print(f"  {name:<16} {latency:>8.1f} мс после конца аудио, всего {total:>8.1f} мс: {text!r}")
+
+    print(f"\n{'режим':<16} {'медиана':>10} {'p95':>10} {'всего':>10}" +
+          (f" {'ИНН извлечён':>14}" if args.stage == "inn" else ""))
+    for name, _ in modes:
+        values = sorted(latencies[name])
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        line = (f"{name:<16} {statistics.median(values):>8.1f}мс {p95:>8.1f}мс "
+                f"{statistics.median(totals[name]):>8.1f}мс")
+        if args.stage == "inn":
+            line += f" {extracted[name]:>7}/{len(args.files)}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк грамматик Vosk")
+    parser.add_argument("files", nargs="+", help="WAV-файлы (моно, 16 бит)")
+    parser.add_argument("--stage", choices=speech_grammar.STAGES, default="inn")
+    parser.add_argument("--url", default=VOSK_URL, help="Адрес сервера Vosk")
+    parser.add_argument("--dir", default=speech_grammar.GRAMMAR_DIR, help="Каталог грамматик")
+    parser.add_argument("--speed", type=float, default=0, help="Ускорение передачи (1 — реальный темп, 0 — без пауз)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов на файл")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк подготовленных операторов agi_db
+Для каждого канонического запроса сравнивает обычный execute и EXECUTE
+подготовленного оператора: время планирования по EXPLAIN (ANALYZE, SUMMARY)
+и среднее время выполнения в цикле. Все изменения откатываются
+
+Использование: ./bench_prepared.py [число_итераций]
+"""
+
+import datetime
+import json
+import sys
+import time
+from typing import Any, Dict, Sequence, Tuple
+
+import psycopg2
+
+from agilib import db as agi_db
+from agilib.inn import InnVerifier
+
+
+def sample_params(cursor) -> Dict[str, Sequence[Any]]:
+    """Подбирает параметры запросов по существующим данным"""
+    cursor.execute("SELECT inn FROM clients WHERE active = true LIMIT 1")
+    row = cursor.fetchone()
+    inn = row[0] if row else 7707083893
+
+    cursor.execute("SELECT id, call_uniqueid FROM verification_logs ORDER BY id DESC LIMIT 1")
+    row = cursor.fetchone()
+    log_id, uniqueid = row if row else (0, "bench.0")
+    now = datetime.datetime.now()
+
+    return {
+        "client_by_inn": (inn,),
+        "clients_by_inns": ([inn],),
+        "log_insert": (uniqueid, "bench", inn, None, False),
+        "log_exists": (uniqueid,),
+        "codeword_by_inn": (inn,),
+        "log_find_by_inn": (uniqueid, inn),
+        "log_update_codeword": ("bench", "bench", log_id),
+        "log_insert_codeword": (uniqueid, "bench", inn, "bench"),
+        "problem_find_by_inn": (uniqueid, inn),
+        "problem_find": (uniqueid,),
+        "problem_update": ("bench", None, "bench", None, log_id),
+        "problem_insert": (uniqueid, "bench", inn, None, "bench", None),
+        "log_insert_at": (uniqueid, "bench", inn, None, False, now),
+        "codeword_log_upsert": (uniqueid, inn, "bench", "bench", uniqueid, "bench", inn, "bench", now),
+        "problem_upsert": (uniqueid, inn, inn, "bench", None, now, "bench", None,
+                           uniqueid, "bench", inn, None, "bench", None, now, now),
+    }
+
+
+def planning_time(cursor, query: str, params: Sequence[Any]) -> float:
+    """Время планирования (мс) по EXPLAIN (ANALYZE, SUMMARY)"""
+    cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0].get("Planning Time", 0.0))
+
+
+def bench_statement(cursor, prepared: agi_db.PreparedStatements, name: str,
+                    params: Sequence[Any], iterations: int) -> Tuple[float, float, float, float]:
+    """
+    Returns:
+        (план_обычный_мс, план_подготовленный_мс, exec_обычный_мс, exec_подготовленный_мс)
+    """
+    query = agi_db.STATEMENTS[name]
+    prepared.prepare(cursor, name)
+    placeholders = ", ".join(["%s"] * len(params))
+    execute_query = f"EXECUTE {name} ({placeholders})"
+
+    plain_plan = planning_time(cursor, query, params)
+    prepared_plan = planning_time(cursor, execute_query, params)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        cursor.execute(query, params)
+    plain_exec = (time.perf_counter() - started) * 1000 / iterations
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        cursor.execute(execute_query, params)
+    prepared_exec = (time.perf_counter() - started) * 1000 / iterations
+
+    return plain_plan, prepared_plan, plain_exec, prepared_exec
+
+
+def main():
+    """Главная функция"""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    conn = psycopg2.connect(**InnVerifier.DB_CONFIG)
+    cursor = conn.cursor()
+    prepared = agi_db.PreparedStatements(conn)
+
+    try:
+        params = sample_params(cursor)
+        print(f"Итераций на запрос: {iterations}")
+        print(f"{'запрос':<22} {'план обыч.':>11} {'план подг.':>11} "
+              f"{'exec обыч.':>11} {'exec подг.':>11} {'выигрыш':>8}")
+
+        total_plain = total_prepared = 0.0
+        for name in agi_db.STATEMENTS:
+            plain_plan, prepared_plan, plain_exec, prepared_exec = bench_statement(
+                cursor, prepared, name, params[name], iterations
+            )
+            total_plain += plain_exec
+            total_prepared += prepared_exec
+            gain = (1 - prepared_exec / plain_exec) * 100 if plain_exec else 0.0
+            print(f"{name:<22} {plain_plan:>9.3f}мс {prepared_plan:>9.3f}мс "
+                  f"{plain_exec:>9.3f}мс {prepared_exec:>9.3f}мс {gain:>7.1f}%")
+
+        print(f"\nСумма на один проход всех запросов: обычный {total_plain:.3f} мс, "
+              f"подготовленный {total_prepared:.3f} мс "
+              f"(снято {total_plain - total_prepared:.3f} мс)")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк запуска AGI-скриптов
+Каждый вызов AGI() — новый интерпретатор, поэтому время запуска и импорта
+платится на каждом этапе диалога. Для каждого скрипта измеряется:
+  - импорт модулей пакета по -X importtime (без модулей, которые
+    интерпретатор загружает и для пустой программы) и самые дорогие из них
+  - холодный запуск: байткод agilib не найден и компилируется заново
+    (копия пакета без __pycache__, PYTHONDONTWRITEBYTECODE=1)
+  - тёплый запуск: байткод из __pycache__ (как после compileall при установке)
+Время запуска — разница с пустой программой (python -c pass)
+
+Использование:
+    ./bench_startup.py [--runs 20] [--top 10] [--json result.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+AGI_BIN = os.path.dirname(os.path.abspath(__file__))
+
+# Скрипт диалплана -> модуль пакета
+SCRIPTS = {
+    "inn_check.py": "agilib.inn",
+    "codeword_check.py": "agilib.codeword",
+    "save_problem.py": "agilib.problem",
+    "convert_recording.py": "agilib.recording",
+    "speech_session.py": "agilib.speech",
+    "speech_timeouts.py": "agilib.timeouts",
+}
+
+# Допустимый рост тёплого запуска при сравнении, % и мс (шум измерения)
+REGRESSION_PERCENT = 20.0
+REGRESSION_MIN_MS = 2.0
+
+
+def run_python(python: str, code: str, cwd: str, env: Optional[Dict[str, str]] = None) -> Tuple[float, str]:
+    """
+    Запускает python -c code
+
+    Returns:
+        (время_мс, stderr)
+    """
+    started = time.perf_counter()
+    result = subprocess.run([python, "-c", code], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{code!r} завершился с кодом {result.returncode}:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def measure(python: str, code: str, cwd: str, runs: int, env: Optional[Dict[str, str]] = None) -> float:
+    """Лучшее время запуска из runs, мс (минимум устойчивее медианы к фоновой нагрузке)"""
+    return min(run_python(python, code, cwd, env)[0] for _ in range(runs))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    Разбирает вывод -X importtime
+
+    Returns:
+        [(модуль, собственное_время_мкс, накопленное_время_мкс), ...]
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def import_profile(python: str, module: str, cwd: str, startup: set, top: int) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Время импорта модуля без модулей запуска интерпретатора
+
+    Returns:
+        (суммарное_время_мс, [(модуль, собственное_время_мс), ...] — top самых дорогих)
+    """
+    _, stderr = run_python(python, f"import {module}", cwd, {**os.environ, "PYTHONPROFILEIMPORTTIME": "1"})
+    entries = [(name, self_us) for name, self_us, _ in parse_importtime(stderr) if name not in startup]
+    total = sum(self_us for _, self_us in entries) / 1000
+    heaviest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    return total, [(name, self_us / 1000) for name, self_us in heaviest]
+
+
+def cold_tree() -> str:
+    """Копия пакета agilib без байткода во временном каталоге"""
+    tree = tempfile.mkdtemp(prefix="agi-startup-")
+    shutil.copytree(os.path.join(AGI_BIN, "agilib"), os.path.join(tree, "agilib"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    return tree
+
+
+def bench(python: str, runs: int, top: int) -> Dict[str, Any]:
+    """Измеряет все скрипты"""
+    # Прогрев: байткод agilib в __pycache__ и файловый кэш ОС
+    for module in SCRIPTS.values():
+        run_python(python, f"import {module}", AGI_BIN)
+
+    _, stderr = run_python(python, "pass", AGI_BIN, {**os.environ, "PYTHONPROFILEIMPORTTIME": "1"})
+    startup = {name for name, _, _ in parse_importtime(stderr)}
+    baseline = measure(python, "pass", AGI_BIN, runs)
+
+    tree = cold_tree()
+    cold_env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    result: Dict[str, Any] = {"python": python, "runs": runs, "baseline_ms": baseline, "scripts": {}}
+    try:
+        for script, module in SCRIPTS.items():
+            code = f"from {module} import main"
+            import_ms, heaviest = import_profile(python, module, AGI_BIN, startup, top)
+            result["scripts"][script] = {
+                "module": module,
+                "import_ms": import_ms,
+                "cold_ms": measure(python, code, tree, runs, cold_env) - baseline,
+                "warm_ms": measure(python, code, AGI_BIN, runs) - baseline,
+                "heaviest": heaviest,
+            }
+    finally:
+        shutil.rmtree(tree, ignore_errors=True)
+    return result
+
+
+def report(result: Dict[str, Any]) -> None:
+    print(f"Пустой интерпретатор: {result['baseline_ms']:.1f} мс (лучшее из {result['runs']})")
+    for script, data in result["scripts"].items():
+        print(f"\n{script} ({data['module']})")
+        print(f"  импорт {data['import_ms']:>7.1f} мс   холодный {data['cold_ms']:>7.1f} мс   "
+              f"тёплый {data['warm_ms']:>7.1f} мс   (сверх пустого интерпретатора)")
+        for name, self_ms in data["heaviest"]:
+            print(f"    {self_ms:>7.2f} мс  {name}")
+
+
+def compare(result: Dict[str, Any], baseline_path: str) -> bool:
+    """
+    Сравнивает тёплый запуск с сохранённым результатом
+
+    Returns:
+        True, если регрессий нет
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        previous = json.load(f)
+
+    ok = True
+    print(f"\nСравнение с {baseline_path}")
+    for script, data in result["scripts"].items():
+        before = previous.get("scripts", {}).get(script)
+        if before is None:
+            continue
+        delta = data["warm_ms"] - before["warm_ms"]
+        percent = delta / before["warm_ms"] * 100 if before["warm_ms"] > 0 else 0.0
+        regressed = delta > REGRESSION_MIN_MS and percent > REGRESSION_PERCENT
+        ok = ok and not regressed
+        print(f"  {'❌' if regressed else '✅'} {script:<22} {before['warm_ms']:>7.1f} -> "
+              f"{data['warm_ms']:>7.1f} мс ({delta:+.1f} мс, {percent:+.0f}%)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска AGI-скриптов")
+    parser.add_argument("--python", default=sys.executable, help="Интерпретатор AGI-скриптов")
+    parser.add_argument("--runs", type=int, default=20, help="Запусков на измерение")
+    parser.add_argument("--top", type=int, default=10, help="Самых дорогих импортов в отчёте")
+    parser.add_argument("--json", help="Сохранить результат в файл")
+    parser.add_argument("--compare", help="Сравнить с сохранённым результатом (код 1 при регрессии)")
+    args = parser.parse_args()
+
+    result = bench(args.python, args.runs, args.top)
+    report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.compare and not compare(result, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
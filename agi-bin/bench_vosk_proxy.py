@@ -0,0 +1,77 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк сессий распознавания напрямую и через vosk_proxy.py
+Открывает сессии так же, как res_speech_vosk: соединение, фрагменты аудио
+по 100 мс, {"eof" : 1}. Измеряется время до первого ответа (то, что ждёт
+абонент после начала речи) и длительность сессии
+
+Использование:
+    ./bench_vosk_proxy.py [--sessions 20] [--concurrency 4] ws://10.7.35.3:2700 ws://127.0.0.1:2800
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Tuple
+
+import websockets
+
+# 100 мс slin 8 кГц
+CHUNK = b"\x01\x00" * 800
+
+
+async def session(url: str, chunks: int) -> Tuple[float, float, str]:
+    """
+    Одна сессия распознавания
+
+    Returns:
+        (до_первого_ответа_мс, всего_мс, финальный_текст)
+    """
+    started = time.perf_counter()
+    first = None
+    async with websockets.connect(url) as ws:
+        for _ in range(chunks):
+            await ws.send(CHUNK)
+            await ws.recv()
+            if first is None:
+                first = time.perf_counter()
+        await ws.send('{"eof" : 1}')
+        result = json.loads(await ws.recv())
+    finished = time.perf_counter()
+    return (first - started) * 1000, (finished - started) * 1000, result.get("text", "")
+
+
+async def bench(url: str, sessions: int, concurrency: int, chunks: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Tuple[float, float, str]] = []
+
+    async def one():
+        async with semaphore:
+            results.append(await session(url, chunks))
+
+    await asyncio.gather(*(one() for _ in range(sessions)))
+
+    firsts = sorted(r[0] for r in results)
+    totals = sorted(r[1] for r in results)
+    p95 = firsts[min(len(firsts) - 1, int(len(firsts) * 0.95))]
+    print(f"{url:<28} первый ответ: медиана {statistics.median(firsts):>7.1f} мс, p95 {p95:>7.1f} мс; "
+          f"сессия: медиана {statistics.median(totals):>7.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк прокси Vosk")
+    parser.add_argument("urls", nargs="+", help="Адреса сервера Vosk и/или прокси")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=10, help="Фрагментов по 100 мс на сессию")
+    args = parser.parse_args()
+    for url in args.urls:
+        asyncio.run(bench(url, args.sessions, args.concurrency, args.chunks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Сборщик голосовых подсказок для Asterisk (замена create_asterisk_sounds.sh)
+Читает phrases*.txt (формат: имя_файла|текст), синтезирует фразы через
+TTS-сервер параллельно с ограничением числа одновременных запросов и
+сохраняет каждую фразу сразу в нескольких нативных форматах Asterisk
+(wav, sln, ulaw, alaw, g722), чтобы при воспроизведении не требовалось
+перекодирование. Фразы, у которых не изменились текст и голос, пропускаются
+
+Использование:
+    ./build_prompts.py [phrases.txt ...]       — собрать фразы из файлов
+    ./build_prompts.py --phrase имя "текст"    — собрать одну фразу
+    ./build_prompts.py --stub                  — собрать через локальную заглушку TTS
+    ./build_prompts.py --serve-stub            — запустить только заглушку TTS
+    ./build_prompts.py --example               — создать пример файла с фразами
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Конфигурация
+SOUNDS_DIR = os.getenv("SOUNDS_DIR", "/var/lib/asterisk/sounds")
+TTS_SERVER = os.getenv("TTS_SERVER", "localhost:5000")
+LANGUAGE = os.getenv("TTS_LANGUAGE", "ru")
+VOICE = os.getenv("TTS_VOICE", "")
+TTS_TIMEOUT = 60
+MANIFEST_NAME = ".prompts_manifest.json"
+
+# Нативные форматы Asterisk: расширение -> параметры ffmpeg
+FORMATS: Dict[str, List[str]] = {
+    "wav": ["-ar", "8000", "-ac", "1", "-c:a", "pcm_s16le", "-f", "wav"],
+    "sln": ["-ar", "8000", "-ac", "1", "-c:a", "pcm_s16le", "-f", "s16le"],
+    "ulaw": ["-ar", "8000", "-ac", "1", "-c:a", "pcm_mulaw", "-f", "mulaw"],
+    "alaw": ["-ar", "8000", "-ac", "1", "-c:a", "pcm_alaw", "-f", "alaw"],
+    "g722": ["-ar", "16000", "-ac", "1", "-c:a", "g722", "-f", "g722"],
+}
+DEFAULT_FORMATS = list(FORMATS)
+
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+EXAMPLE_PHRASES = """# Формат: имя_файла|текст для озвучивания
+# Примеры:
+welcome|Добро пожаловать в нашу компанию
+goodbye|До свидания! Спасибо за звонок
+invalid_number|Вы набрали неправильный номер
+hold_music|Пожалуйста, оставайтесь на линии
+"""
+
+
+def read_phrases(paths: List[str]) -> List[Tuple[str, str]]:
+    """
+    Читает фразы из файлов формата имя_файла|текст
+
+    Returns:
+        Список (имя_файла, текст); при повторе имени побеждает последняя строка
+    """
+    phrases: Dict[str, str] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                name, _, text = line.partition("|")
+                name, text = name.strip(), text.strip()
+                if not name or not text:
+                    logger.warning(f"{path}:{line_num}: пропущена (некорректный формат)")
+                    continue
+                phrases[name] = text
+    return list(phrases.items())
+
+
+def phrase_hash(text: str, language: str, voice: str) -> str:
+    """Хэш содержимого фразы: текст + язык + голос"""
+    return hashlib.sha256(f"{language}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+class PromptBuilder:
+    """Параллельная сборка подсказок с пропуском неизменённых фраз"""
+
+    def __init__(self, sounds_dir: str, tts_server: str, language: str, voice: str,
+                 formats: List[str], jobs: int, force: bool = False):
+        self.sounds_dir = sounds_dir
+        self.tts_url = tts_server if tts_server.startswith("http") else f"http://{tts_server}"
+        self.language = language
+        self.voice = voice
+        self.formats = formats
+        self.jobs = jobs
+        self.force = force
+        self.manifest_path = os.path.join(sounds_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Dict[str, Dict[str, object]]:
+        """Загружает манифест ранее собранных фраз"""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        """Атомарно сохраняет манифест"""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_up_to_date(self, name: str, digest: str) -> bool:
+        """Фраза собрана с тем же текстом/голосом и все форматы на месте"""
+        entry = self.manifest.get(name)
+        if self.force or not entry or entry.get("hash") != digest:
+            return False
+        return all(
+            os.path.exists(os.path.join(self.sounds_dir, f"{name}.{fmt}"))
+            for fmt in self.formats
+        )
+
+    def synthesize(self, text: str) -> bytes:
+        """Запрашивает WAV у TTS-сервера"""
+        payload = {"text": text, "language": self.language}
+        if self.voice:
+            payload["voice"] = self.voice
+        request = urllib.request.Request(
+            self.tts_url,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=TTS_TIMEOUT) as response:
+            return response.read()
+
+    def convert(self, source_wav: bytes, name: str) -> None:
+        """Конвертирует WAV во все форматы одним вызовом ffmpeg с атомарной заменой"""
+        with tempfile.TemporaryDirectory(prefix="prompts_", dir=self.sounds_dir) as tmp_dir:
+            source_path = os.path.join(tmp_dir, "source.wav")
+            with open(source_path, "wb") as f:
+                f.write(source_wav)
+
+            cmd = ["ffmpeg", "-loglevel", "error", "-y", "-i", source_path]
+            outputs = []
+            for fmt in self.formats:
+                out_path = os.path.join(tmp_dir, f"out.{fmt}")
+                cmd += FORMATS[fmt] + [out_path]
+                outputs.append((out_path, os.path.join(self.sounds_dir, f"{name}.{fmt}")))
+
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg: {result.stderr.strip()[:300]}")
+
+            for out_path, final_path in outputs:
+                os.replace(out_path, final_path)
+
+    def build_one(self, name: str, text: str) -> str:
+        """Собирает одну фразу. Возвращает 'built' или 'skipped'"""
+        digest = phrase_hash(text, self.language, self.voice)
+        if self.is_up_to_date(name, digest):
+            return "skipped"
+
+        self.convert(self.synthesize(text), name)
+
+        with self._lock:
+            self.manifest[name] = {
+                "hash": digest,
+                "text": text,
+                "formats": self.formats,
+                "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        return "built"
+
+    def build(self, phrases: List[Tuple[str, str]]) -> Dict[str, int]:
+        """Собирает все фразы параллельно"""
+        counts = {"built": 0, "skipped": 0, "failed": 0}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self.build_one, name, text): name for name, text in phrases}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    status = future.result()
+                    counts[status] += 1
+                    if status == "built":
+                        logger.info(f"✓ {name}: {', '.join(self.formats)}")
+                    else:
+                        logger.debug(f"= {name}: без изменений")
+                except Exception as e:
+                    counts["failed"] += 1
+                    logger.error(f"✗ {name}: {e}")
+
+        self._save_manifest()
+        logger.info(
+            f"Готово за {time.monotonic() - started:.1f} сек. Собрано: {counts['built']}, "
+            f"без изменений: {counts['skipped']}, ошибок: {counts['failed']}"
+        )
+        return counts
+
+
+class _TTSStubHandler(BaseHTTPRequestHandler):
+    """Локальная заглушка TTS: возвращает тон, длительность которого зависит от текста"""
+
+    SAMPLE_RATE = 22050
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            text = json.loads(self.rfile.read(length).decode("utf-8")).get("text", "")
+        except ValueError:
+            self.send_error(400, "invalid json")
+            return
+
+        duration = min(0.3 + 0.06 * len(text), 10.0)
+        frames = int(self.SAMPLE_RATE * duration)
+        amplitude = 8000
+        samples = bytearray()
+        for i in range(frames):
+            value = int(amplitude * math.sin(2 * math.pi * 440 * i / self.SAMPLE_RATE))
+            samples += value.to_bytes(2, "little", signed=True)
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(bytes(samples))
+        body = buffer.getvalue()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f"TTS stub: {format % args}")
+
+
+def start_tts_stub(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Запускает заглушку TTS в фоновом потоке"""
+    server = ThreadingHTTPServer((host, port), _TTSStubHandler)
+    threading.Thread(target=server.serve_forever, name="tts-stub", daemon=True).start()
+    return server
+
+
+def main():
+    """Главная функция"""
+    parser = argparse.ArgumentParser(description="Сборка голосовых подсказок для Asterisk")
+    parser.add_argument("files", nargs="*", help="Файлы с фразами (по умолчанию phrases*.txt)")
+    parser.add_argument("--phrase", nargs=2, metavar=("ИМЯ", "ТЕКСТ"), help="Собрать одну фразу")
+    parser.add_argument("--sounds-dir", default=SOUNDS_DIR)
+    parser.add_argument("--tts", default=TTS_SERVER, help="Адрес TTS-сервера")
+    parser.add_argument("--language", default=LANGUAGE)
+    parser.add_argument("--voice", default=VOICE)
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"Форматы через запятую ({', '.join(FORMATS)})")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Одновременных запросов к TTS")
+    parser.add_argument("--force", action="store_true", help="Пересобрать все фразы")
+    parser.add_argument("--stub", action="store_true", help="Использовать локальную заглушку TTS")
+    parser.add_argument("--serve-stub", metavar="HOST:PORT", help="Только запустить заглушку TTS")
+    parser.add_argument("-e", "--example", action="store_true", help="Создать phrases_example.txt")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    if args.example:
+        if os.path.exists("phrases_example.txt"):
+            logger.warning("Файл phrases_example.txt уже существует")
+        else:
+            with open("phrases_example.txt", "w", encoding="utf-8") as f:
+                f.write(EXAMPLE_PHRASES)
+            logger.info("Создан пример файла: phrases_example.txt")
+        return
+
+    if args.serve_stub:
+        host, _, port = args.serve_stub.rpartition(":")
+        server = start_tts_stub(host or "127.0.0.1", int(port))
+        logger.info(f"Заглушка TTS слушает http://{server.server_address[0]}:{server.server_address[1]}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        logger.error(f"Неизвестные форматы: {', '.join(unknown)}")
+        sys.exit(1)
+
+    if shutil.which("ffmpeg") is None:
+        logger.error("ffmpeg не установлен. Установите: apt-get install ffmpeg")
+        sys.exit(1)
+
+    if args.phrase:
+        phrases = [(args.phrase[0], args.phrase[1])]
+    else:
+        files = args.files or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            "phrases*.txt")))
+        if not files:
+            logger.error("Не найдено файлов с фразами")
+            sys.exit(1)
+        phrases = read_phrases(files)
+
+    os.makedirs(args.sounds_dir, exist_ok=True)
+    if not os.access(args.sounds_dir, os.W_OK):
+        logger.error(f"Нет прав на запись в {args.sounds_dir}")
+        sys.exit(1)
+
+    stub: Optional[ThreadingHTTPServer] = None
+    tts = args.tts
+    if args.stub:
+        stub = start_tts_stub()
+        tts = f"127.0.0.1:{stub.server_address[1]}"
+        logger.info(f"Используется заглушка TTS: http://{tts}")
+
+    try:
+        builder = PromptBuilder(args.sounds_dir, tts, args.language, args.voice,
+                                formats, max(1, args.jobs), args.force)
+        counts = builder.build(phrases)
+    finally:
+        if stub:
+            stub.shutdown()
+
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальный сервис состояния вызовов
+Хранит состояние активных вызовов в памяти и обслуживает:
+  POST /reset_call          {"unique_id": "..."}  — сброс состояния вызова
+  GET  /call/<unique_id>                          — текущее состояние вызова
+  POST /call/<unique_id>    {...}                 — обновление состояния вызова
+  POST /attempt    {"stage", "caller", "inn", "count_caller"} — учёт попытки ИНН/кодового слова (agilib/limiter.py)
+  GET  /stats                                     — статистика сервиса
+  GET  /metrics                                   — метрики AGI-обработчиков (Prometheus)
+  GET  /health                                    — проверка доступности
+Метрики AGI-скриптов принимаются UDP-датаграммами (agilib/metrics.py)
+Дополнительно поднимает FastAGI-сервер, чтобы сброс выполнялся без curl:
+  AGI(agi://127.0.0.1:4573/reset_call)
+и проверка номера, исчерпавшего лимит попыток, до распознавания:
+  AGI(agi://127.0.0.1:4573/attempt_gate)   ; ATTEMPT_STATUS = ALLOWED / BLOCKED
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from agilib import metrics as agi_metrics
+from agilib.fastagi import DEFAULT_FASTAGI_PORT, FastAGI, FastAGIServer
+from agilib.limiter import AttemptLimiter
+
+# Настройка логирования
+logging.basicConfig(
+    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO")),
+    format='%(asctime)s - CALL_STATE - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Адрес HTTP-сервера (или путь к Unix-сокету, если задан CALL_STATE_SOCKET)
+HTTP_HOST = os.getenv("CALL_STATE_HOST", "127.0.0.1")
+HTTP_PORT = int(os.getenv("CALL_STATE_PORT", "8000"))
+HTTP_SOCKET = os.getenv("CALL_STATE_SOCKET", "")
+
+# Адрес FastAGI-сервера (пустой FASTAGI_HOST отключает FastAGI)
+FASTAGI_HOST = os.getenv("FASTAGI_HOST", "127.0.0.1")
+FASTAGI_PORT = int(os.getenv("FASTAGI_PORT", str(DEFAULT_FASTAGI_PORT)))
+
+# Время жизни состояния брошенного вызова и период очистки (секунды)
+CALL_TTL = int(os.getenv("CALL_STATE_TTL", "3600"))
+SWEEP_INTERVAL = int(os.getenv("CALL_STATE_SWEEP_INTERVAL", "60"))
+
+# Максимальный размер тела запроса
+MAX_BODY_SIZE = 64 * 1024
+
+
+class CallStateStore:
+    """
+    Хранилище состояния вызовов с вытеснением по TTL
+
+    Записи лежат в OrderedDict в порядке последнего обращения,
+    поэтому сброс — O(1), а очистка просматривает только устаревшие записи
+    """
+
+    def __init__(self, ttl: int = CALL_TTL):
+        self.ttl = ttl
+        self._calls: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {
+            "created": 0,
+            "updated": 0,
+            "resets": 0,
+            "resets_missing": 0,
+            "evicted": 0,
+        }
+        self.max_active = 0
+
+    def update(self, unique_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Создаёт или дополняет состояние вызова"""
+        now = time.time()
+        with self._lock:
+            state = self._calls.get(unique_id)
+            if state is None:
+                state = {"created_at": now, "data": {}}
+                self._calls[unique_id] = state
+                self.counters["created"] += 1
+                self.max_active = max(self.max_active, len(self._calls))
+            else:
+                self._calls.move_to_end(unique_id)
+                self.counters["updated"] += 1
+            state["touched_at"] = now
+            state["data"].update(data)
+            return dict(state["data"])
+
+    def get(self, unique_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает копию состояния вызова или None"""
+        with self._lock:
+            state = self._calls.get(unique_id)
+            return dict(state["data"]) if state else None
+
+    def reset(self, unique_id: str) -> bool:
+        """Сбрасывает состояние вызова. Возвращает True, если оно было"""
+        with self._lock:
+            existed = self._calls.pop(unique_id, None) is not None
+            self.counters["resets" if existed else "resets_missing"] += 1
+            return existed
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Удаляет вызовы, к которым не обращались дольше TTL"""
+        deadline = (now or time.time()) - self.ttl
+        evicted = 0
+        with self._lock:
+            while self._calls:
+                unique_id, state = next(iter(self._calls.items()))
+                if state["touched_at"] > deadline:
+                    break
+                self._calls.popitem(last=False)
+                evicted += 1
+            self.counters["evicted"] += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика для эндпоинта /stats"""
+        with self._lock:
+            oldest = next(iter(self._calls.values()), None)
+            return {
+                "active_calls": len(self._calls),
+                "max_active_calls": self.max_active,
+                "oldest_touch_age": round(time.time() - oldest["touched_at"], 3) if oldest else None,
+                "ttl": self.ttl,
+                "uptime": round(time.time() - self.started_at, 3),
+                **self.counters,
+            }
+
+
+class MetricsProtocol(asyncio.DatagramProtocol):
+    """Приём метрик AGI-обработчиков по UDP"""
+
+    def __init__(self, registry: agi_metrics.MetricsRegistry):
+        self.registry = registry
+
+    def datagram_received(self, data, addr):
+        self.registry.add_datagram(data)
+
+
+class CallStateHTTPServer:
+    """Минимальный asyncio HTTP/1.1 сервер для CallStateStore"""
+
+    def __init__(self, store: CallStateStore, metrics: agi_metrics.MetricsRegistry, limiter: AttemptLimiter):
+        self.store = store
+        self.metrics = metrics
+        self.limiter = limiter
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Обрабатывает одно HTTP-подключение (один запрос)"""
+        try:
+            status, payload = await self._dispatch(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки запроса: {e}")
+            status, payload = 500, {"error": "internal error"}
+
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("ascii") + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader) -> Tuple[int, Any]:
+        """Разбирает запрос и вызывает нужный обработчик"""
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return 400, {"error": "empty request"}
+        method, path, *_ = request_line.split(" ") + [""]
+
+        content_length = 0
+        while True:
+            header = (await reader.readline()).decode("latin-1").strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value.strip() or 0)
+
+        if content_length > MAX_BODY_SIZE:
+            return 413, {"error": "body too large"}
+
+        data: Dict[str, Any] = {}
+        if content_length:
+            raw = await reader.readexactly(content_length)
+            try:
+                data = json.loads(raw.decode("utf-8"))
+            except ValueError:
+                return 400, {"error": "invalid json"}
+            if not isinstance(data, dict):
+                return 400, {"error": "json object expected"}
+
+        path = path.split("?", 1)[0]
+
+        if method == "POST" and path == "/reset_call":
+            unique_id = str(data.get("unique_id") or "")
+            if not unique_id:
+                return 400, {"error": "unique_id required"}
+            existed = self.store.reset(unique_id)
+            logger.debug(f"Сброс состояния вызова {unique_id} (был: {existed})")
+            return 200, {"unique_id": unique_id, "reset": existed}
+
+        if method == "POST" and path == "/attempt":
+            stage = str(data.get("stage") or "")
+            if stage not in ("inn", "codeword"):
+                return 400, {"error": "stage must be inn or codeword"}
+            try:
+                inn = int(data["inn"]) if data.get("inn") else None
+            except (TypeError, ValueError):
+                return 400, {"error": "invalid inn"}
+            allowed, limit = self.limiter.attempt(stage, str(data.get("caller") or ""), inn,
+                                                  count_caller=bool(data.get("count_caller", True)))
+            return 200, {"allowed": allowed, "limit": limit}
+
+        if path.startswith("/call/"):
+            unique_id = path[len("/call/"):]
+            if not unique_id:
+                return 400, {"error": "unique_id required"}
+            if method == "GET":
+                state = self.store.get(unique_id)
+                if state is None:
+                    return 404, {"error": "not found"}
+                return 200, {"unique_id": unique_id, "state": state}
+            if method == "POST":
+                return 200, {"unique_id": unique_id, "state": self.store.update(unique_id, data)}
+
+        if method == "GET" and path == "/stats":
+            return 200, {**self.store.stats(), "limiter": self.limiter.stats(), "metrics": self.metrics.as_dict()}
+
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics.as_prometheus()
+
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+
+        return 404, {"error": "not found"}
+
+
+def make_fastagi_handlers(store: CallStateStore, limiter: AttemptLimiter):
+    """FastAGI-обработчики, работающие с тем же хранилищем и ограничителем"""
+
+    def reset_call(agi: FastAGI) -> None:
+        unique_id = agi.env.get("uniqueid", "")
+        if not unique_id:
+            agi.set_variable("CALL_STATE_RESET", "NO_UNIQUEID")
+            return
+        existed = store.reset(unique_id)
+        agi.set_variable("CALL_STATE_RESET", "1" if existed else "0")
+        logger.debug(f"FastAGI: сброс состояния вызова {unique_id} (был: {existed})")
+
+    def attempt_gate(agi: FastAGI) -> None:
+        caller = agi.env.get("callerid", "")
+        # Скрытые номера проверяются по общему счётчику
+        blocked = limiter.blocked(caller)
+        agi.set_variable("ATTEMPT_STATUS", "BLOCKED" if blocked else "ALLOWED")
+        if blocked:
+            logger.info(f"🚫 FastAGI: номер {caller} исчерпал лимит попыток")
+
+    return {"reset_call": reset_call, "attempt_gate": attempt_gate}
+
+
+async def sweep_loop(store: CallStateStore) -> None:
+    """Периодически вытесняет брошенные вызовы"""
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        evicted = store.evict_expired()
+        if evicted:
+            logger.info(f"🧹 Вытеснено брошенных вызовов: {evicted}")
+
+
+async def main():
+    """Главная функция"""
+    store = CallStateStore()
+    metrics = agi_metrics.MetricsRegistry()
+    limiter = AttemptLimiter()
+    http = CallStateHTTPServer(store, metrics, limiter)
+
+    if HTTP_SOCKET:
+        server = await asyncio.start_unix_server(http.handle, path=HTTP_SOCKET)
+        logger.info(f"✅ HTTP-сервер слушает unix:{HTTP_SOCKET}")
+    else:
+        server = await asyncio.start_server(http.handle, HTTP_HOST, HTTP_PORT)
+        logger.info(f"✅ HTTP-сервер слушает http://{HTTP_HOST}:{HTTP_PORT}")
+
+    fastagi = None
+    if FASTAGI_HOST:
+        fastagi = FastAGIServer((FASTAGI_HOST, FASTAGI_PORT), make_fastagi_handlers(store, limiter))
+        threading.Thread(target=fastagi.serve_forever, name="fastagi", daemon=True).start()
+        logger.info(f"✅ FastAGI слушает agi://{FASTAGI_HOST}:{FASTAGI_PORT}")
+
+    await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: MetricsProtocol(metrics),
+        local_addr=(agi_metrics.METRICS_HOST, agi_metrics.METRICS_PORT),
+    )
+    logger.info(f"✅ Метрики AGI принимаются на udp://{agi_metrics.METRICS_HOST}:{agi_metrics.METRICS_PORT}")
+
+    logger.info(f"⏱️ TTL состояния вызова: {CALL_TTL} сек, очистка каждые {SWEEP_INTERVAL} сек")
+    logger.info("🚫 Лимиты попыток: " + ", ".join(
+        f"{kind} {limit}/{window:g} сек" for kind, (limit, window) in limiter.limits.items()))
+
+    sweeper = asyncio.create_task(sweep_loop(store))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        limiter.close()
+        if fastagi:
+            fastagi.shutdown()
+            fastagi.server_close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Сервис состояния вызовов остановлен")
@@ -0,0 +1,93 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Экспортёр снимка активных клиентов для AGI-скриптов (agilib/snapshot.py)
+Выгружает активных клиентов в отсортированный файл, который скрипты
+отображают в память и ищут в нём ИНН без обращения к БД. В режиме --watch
+опрашивает отпечаток таблицы clients и пересобирает снимок только после
+изменения клиентов, а в остальных проверках подтверждает его свежесть
+
+Использование:
+    ./client_snapshot.py [--path ПУТЬ] [--watch СЕКУНДЫ]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from typing import Any, Optional, Tuple
+
+import psycopg2
+
+from agilib import config
+from agilib import snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotExporter:
+    """Сборка и публикация снимка клиентов"""
+
+    def __init__(self, path: str = snapshot.SNAPSHOT_PATH):
+        self.path = path
+        self.conn = None
+        self.fingerprint: Optional[Tuple[Any, ...]] = None
+
+    def _cursor(self):
+        """Курсор к БД (переподключение при необходимости)"""
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(**config.db_config("client_snapshot"))
+            self.conn.autocommit = True
+        return self.conn.cursor()
+
+    def export(self, only_if_changed: bool = False) -> None:
+        with self._cursor() as cursor:
+            fingerprint = snapshot.clients_fingerprint(cursor)
+            if only_if_changed and fingerprint == self.fingerprint:
+                snapshot.touch(self.path)
+                return
+            rows = snapshot.active_clients(cursor)
+        started = time.monotonic()
+        body = snapshot.build(rows)
+        snapshot.publish(self.path, body)
+        self.fingerprint = fingerprint
+        logger.info(f"✅ Снимок клиентов опубликован: {len(rows)} записей, {len(body)} байт, "
+                    f"{(time.monotonic() - started) * 1000:.1f} мс")
+
+    def watch(self, interval: float) -> None:
+        """Пересобирает снимок после изменения клиентов"""
+        logger.info(f"🔄 Отслеживание изменений clients каждые {interval} сек")
+        while True:
+            try:
+                self.export(only_if_changed=True)
+            except psycopg2.Error as e:
+                # Снимок перестаёт подтверждаться и устаревает — скрипты вернутся к БД
+                logger.error(f"❌ БД недоступна: {e}")
+                self.conn = None
+            time.sleep(interval)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Экспорт снимка клиентов для AGI-скриптов")
+    parser.add_argument("--path", default=snapshot.SNAPSHOT_PATH, help="Файл снимка")
+    parser.add_argument("--watch", type=float, default=0, help="Пересобирать при изменении клиентов каждые N секунд")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - SNAPSHOT - %(levelname)s - %(message)s')
+
+    exporter = SnapshotExporter(args.path)
+    try:
+        exporter.export()
+        if args.watch:
+            exporter.watch(args.watch)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"❌ Ошибка экспорта снимка: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 #!/bin/bash
 
 # AGI скрипт для сброса состояния вызова
+# Обращается к локальному сервису call_state_service.py
+# Без запуска curl тот же сброс выполняется через FastAGI:
+#   AGI(agi://127.0.0.1:4573/reset_call)
+
+CALL_STATE_URL="${CALL_STATE_URL:-http://127.0.0.1:8000}"
 
 send_command() {
     echo "$1"
@@ -20,7 +25,7 @@ main() {
 
     if [ -n "$UNIQUEID" ]; then
         # Отправляем запрос на сброс состояния
-        curl -s -X POST http://10.7.35.3:8000/reset_call \
+        curl -s -X POST "$CALL_STATE_URL/reset_call" \
              -H "Content-Type: application/json" \
              -d "{\"unique_id\":\"$UNIQUEID\"}" \
              --connect-timeout 2 \
@@ -0,0 +1,258 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Офлайн-расшифровка записей описания проблемы
+problem_text — результат SpeechBackground(,15) в реальном времени, часто
+обрезанный или шумный. Этот пакетный инструмент заново расшифровывает полные
+записи (problem_audio_path) большой офлайн-моделью Vosk на пуле процессов
+по числу ядер и записывает результат в problem_text_refined пакетами.
+
+Обработанная запись отмечается problem_refined_at, поэтому после прерывания
+инструмент продолжает с необработанных. Файлы с уже известным SHA-256
+содержимого не расшифровываются повторно — текст копируется.
+Пропускная способность выводится в секундах аудио на секунду работы.
+
+Использование:
+    ./retranscribe.py [--model ПУТЬ] [--workers N] [--limit N] [--retry-failed]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from agilib import config
+
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "/opt/vosk/vosk-model-ru-0.42")
+
+# Формат декодирования для модели: моно 16 кГц, 16 бит
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+CHUNK_BYTES = BYTES_PER_SECOND // 2
+
+# Записей на чтение из БД и на одно обновление
+CHUNK_ROWS = 200
+UPDATE_BATCH = 50
+
+logger = logging.getLogger(__name__)
+
+# Модель загружается до запуска пула и наследуется процессами через fork
+_model = None
+
+
+def file_sha256(path: str) -> Optional[str]:
+    """SHA-256 содержимого файла или None, если файл недоступен"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def transcribe(path: str) -> Tuple[str, Optional[str], float, str]:
+    """
+    Расшифровывает файл в процессе пула
+
+    Returns:
+        (путь, текст_или_None, длительность_аудио_сек, ошибка)
+    """
+    from vosk import KaldiRecognizer
+
+    recognizer = KaldiRecognizer(_model, SAMPLE_RATE)
+    try:
+        process = subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+             "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        return path, None, 0.0, f"ffmpeg недоступен: {e}"
+    parts = []
+    audio_bytes = 0
+    while True:
+        data = process.stdout.read(CHUNK_BYTES)
+        if not data:
+            break
+        audio_bytes += len(data)
+        if recognizer.AcceptWaveform(data):
+            parts.append(json.loads(recognizer.Result()).get("text", ""))
+    parts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+    error = process.stderr.read().decode("utf-8", "replace").strip()
+    process.wait()
+
+    duration = audio_bytes / BYTES_PER_SECOND
+    if process.returncode != 0:
+        return path, None, duration, error or f"ffmpeg завершился с кодом {process.returncode}"
+    return path, " ".join(part for part in parts if part), duration, ""
+
+
+class Retranscriber:
+    """Пакетная расшифровка записей с возобновлением"""
+
+    def __init__(self, workers: int, retry_failed: bool = False, limit: int = 0):
+        self.workers = workers
+        self.retry_failed = retry_failed
+        self.limit = limit
+        self.conn = psycopg2.connect(**config.db_config("retranscribe"))
+        self.updates: List[Tuple[int, Optional[str], Optional[str]]] = []
+
+        self.started = time.monotonic()
+        self.audio_seconds = 0.0
+        self.transcribed = 0
+        self.reused = 0
+        self.failed = 0
+
+    def pending(self, after_id: int) -> List[Tuple[int, str]]:
+        """Следующая порция необработанных записей (по возрастанию id)"""
+        condition = ("problem_refined_at IS NOT NULL AND problem_text_refined IS NULL" if self.retry_failed
+                     else "problem_refined_at IS NULL")
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, problem_audio_path
+                FROM verification_logs
+                WHERE problem_audio_path IS NOT NULL AND problem_audio_path <> ''
+                  AND {condition} AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id, CHUNK_ROWS))
+            return cursor.fetchall()
+
+    def known_texts(self, hashes: List[str]) -> Dict[str, str]:
+        """Готовые расшифровки файлов с теми же SHA-256"""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT ON (problem_audio_sha256) problem_audio_sha256, problem_text_refined
+                FROM verification_logs
+                WHERE problem_audio_sha256 = ANY(%s) AND problem_text_refined IS NOT NULL
+            """, (hashes,))
+            return dict(cursor.fetchall())
+
+    def store(self, log_id: int, text: Optional[str], sha256: Optional[str]) -> None:
+        """Добавляет результат в пакет и записывает пакет при заполнении"""
+        self.updates.append((log_id, text, sha256))
+        if len(self.updates) >= UPDATE_BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        """Записывает накопленные результаты одной транзакцией"""
+        if not self.updates:
+            return
+        with self.conn.cursor() as cursor:
+            execute_values(cursor, """
+                UPDATE verification_logs AS v
+                SET problem_text_refined = u.text,
+                    problem_audio_sha256 = u.sha256,
+                    problem_refined_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS u(id, text, sha256)
+                WHERE v.id = u.id
+            """, self.updates, template="(%s::bigint, %s::text, %s::char(64))")
+        self.conn.commit()
+        self.updates = []
+        self.report()
+
+    def report(self) -> None:
+        elapsed = time.monotonic() - self.started
+        logger.info(
+            f"Расшифровано: {self.transcribed}, по хэшу: {self.reused}, ошибок: {self.failed}; "
+            f"аудио {self.audio_seconds:.0f} с за {elapsed:.0f} с — "
+            f"{self.audio_seconds / elapsed if elapsed else 0:.1f} с аудио/с"
+        )
+
+    def process_chunk(self, pool, rows: List[Tuple[int, str]]) -> None:
+        """Обрабатывает порцию записей: хэши, повторное использование, расшифровка"""
+        by_hash: Dict[str, List[int]] = {}
+        paths: Dict[str, str] = {}
+        for log_id, path in rows:
+            sha256 = file_sha256(path)
+            if sha256 is None:
+                logger.warning(f"Файл записи {log_id} недоступен: {path}")
+                self.failed += 1
+                self.store(log_id, None, None)
+                continue
+            by_hash.setdefault(sha256, []).append(log_id)
+            paths.setdefault(sha256, path)
+
+        known = self.known_texts(list(by_hash)) if by_hash else {}
+        for sha256, text in known.items():
+            for log_id in by_hash.pop(sha256):
+                self.reused += 1
+                self.store(log_id, text, sha256)
+
+        # Одинаковые файлы внутри порции расшифровываются один раз
+        hash_by_path = {paths[sha256]: sha256 for sha256 in by_hash}
+        for path, text, duration, error in pool.imap_unordered(transcribe, list(hash_by_path)):
+            sha256 = hash_by_path[path]
+            self.audio_seconds += duration
+            if text is None:
+                logger.warning(f"Не удалось расшифровать {path}: {error}")
+                self.failed += len(by_hash[sha256])
+            else:
+                self.transcribed += len(by_hash[sha256])
+            for log_id in by_hash[sha256]:
+                self.store(log_id, text, sha256)
+
+    def run(self) -> None:
+        context = multiprocessing.get_context("fork")
+        after_id = 0
+        processed = 0
+        with context.Pool(self.workers) as pool:
+            try:
+                while not self.limit or processed < self.limit:
+                    rows = self.pending(after_id)
+                    if self.limit:
+                        rows = rows[:self.limit - processed]
+                    if not rows:
+                        break
+                    self.process_chunk(pool, rows)
+                    after_id = rows[-1][0]
+                    processed += len(rows)
+            finally:
+                # Результаты, полученные до прерывания, не теряются
+                self.flush()
+                pool.terminate()
+        self.report()
+        self.conn.close()
+
+
+def main():
+    global _model
+
+    parser = argparse.ArgumentParser(description="Офлайн-расшифровка записей описания проблемы")
+    parser.add_argument("--model", default=VOSK_MODEL_PATH, help="Каталог офлайн-модели Vosk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов расшифровки")
+    parser.add_argument("--limit", type=int, default=0, help="Обработать не больше N записей")
+    parser.add_argument("--retry-failed", action="store_true", help="Повторить записи, которые не удалось расшифровать")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - RETRANSCRIBE - %(levelname)s - %(message)s')
+
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    logger.info(f"🔄 Загрузка модели {args.model}, процессов: {args.workers}")
+    _model = Model(args.model)
+
+    try:
+        Retranscriber(args.workers, args.retry_failed, args.limit).run()
+    except KeyboardInterrupt:
+        logger.info("Прервано, обработка продолжится с необработанных записей")
+    except psycopg2.Error as e:
+        logger.error(f"❌ Ошибка БД: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
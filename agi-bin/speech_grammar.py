@@ -0,0 +1,170 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Генератор грамматик Vosk для этапов распознавания
+  inn      — числительные из словарей InnVerifier (digit_map/tens_map/hundreds_map)
+  codeword — кодовые слова активных клиентов (clients.code_word)
+
+Грамматика — JSON-список фраз в формате phrase_list сервера Vosk
+({"config": {"phrase_list": [...]}}) с фразой "[unk]" для всего остального
+(чтение на пути вызова — agilib/grammar.py).
+Файлы публикуются в GRAMMAR_DIR атомарной заменой и перезаписываются
+только при изменении содержимого. В режиме --watch генератор опрашивает
+отпечаток таблицы clients (число строк и max(updated_at)) и пересобирает
+грамматику кодовых слов только после изменения клиентов
+
+Использование:
+    ./speech_grammar.py [--stage inn|codeword] [--watch СЕКУНДЫ] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Any, List, Optional, Tuple
+
+from agilib.grammar import GRAMMAR_DIR, STAGES, UNK, grammar_path
+from agilib.snapshot import clients_fingerprint
+
+# Модель Vosk русская — английские числительные из digit_map в грамматику не попадают
+CYRILLIC_WORD = re.compile(r"^[а-яё]+$")
+
+logger = logging.getLogger(__name__)
+
+
+def inn_phrases() -> List[str]:
+    """Словарь этапа ИНН из словарей InnVerifier"""
+    from agilib.inn import InnVerifier
+
+    verifier = InnVerifier.parser()
+
+    words = set()
+    for mapping in (verifier.digit_map, verifier.tens_map, verifier.hundreds_map):
+        words.update(word for word in mapping if CYRILLIC_WORD.match(word))
+    return sorted(words) + [UNK]
+
+
+def codeword_phrases(cursor) -> List[str]:
+    """Словарь этапа кодового слова из активных клиентов"""
+    cursor.execute("""
+        SELECT DISTINCT lower(trim(code_word))
+        FROM clients
+        WHERE active = true AND code_word IS NOT NULL AND trim(code_word) <> ''
+    """)
+    phrases = {re.sub(r"\s+", " ", row[0]) for row in cursor.fetchall()}
+    return sorted(phrases) + [UNK]
+
+
+def publish(stage: str, phrases: List[str], grammar_dir: str = GRAMMAR_DIR, force: bool = False) -> bool:
+    """
+    Публикует грамматику, если она изменилась
+
+    Returns:
+        True, если файл был перезаписан
+    """
+    body = json.dumps(phrases, ensure_ascii=False, indent=0).encode("utf-8")
+    path = grammar_path(stage, grammar_dir)
+    if not force:
+        try:
+            with open(path, "rb") as f:
+                if hashlib.sha256(f.read()).digest() == hashlib.sha256(body).digest():
+                    return False
+        except OSError:
+            pass
+
+    os.makedirs(grammar_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    # Грамматика кодовых слов содержит секреты клиентов
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+    with os.fdopen(fd, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return True
+
+
+class GrammarBuilder:
+    """Сборка и публикация грамматик этапов"""
+
+    def __init__(self, grammar_dir: str = GRAMMAR_DIR, force: bool = False):
+        self.grammar_dir = grammar_dir
+        self.force = force
+        self.conn = None
+        self.fingerprint: Optional[Tuple[Any, ...]] = None
+
+    def _cursor(self):
+        """Курсор к БД (переподключение при необходимости)"""
+        import psycopg2
+
+        from agilib import config
+
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(**config.db_config("speech_grammar"))
+            self.conn.autocommit = True
+        return self.conn.cursor()
+
+    def build_inn(self) -> None:
+        phrases = inn_phrases()
+        if publish("inn", phrases, self.grammar_dir, self.force):
+            logger.info(f"✅ Грамматика inn опубликована: {len(phrases)} фраз")
+        else:
+            logger.info("Грамматика inn не изменилась")
+
+    def build_codeword(self, only_if_changed: bool = False) -> None:
+        with self._cursor() as cursor:
+            fingerprint = clients_fingerprint(cursor)
+            if only_if_changed and fingerprint == self.fingerprint:
+                return
+            phrases = codeword_phrases(cursor)
+        self.fingerprint = fingerprint
+        if publish("codeword", phrases, self.grammar_dir, self.force):
+            logger.info(f"✅ Грамматика codeword опубликована: {len(phrases)} фраз")
+        else:
+            logger.info("Грамматика codeword не изменилась")
+
+    def watch(self, interval: float) -> None:
+        """Пересобирает грамматику кодовых слов после изменения клиентов"""
+        import psycopg2
+
+        logger.info(f"🔄 Отслеживание изменений clients каждые {interval} сек")
+        while True:
+            try:
+                self.build_codeword(only_if_changed=True)
+            except psycopg2.Error as e:
+                logger.error(f"❌ БД недоступна: {e}")
+                self.conn = None
+            time.sleep(interval)
+
+
+def main():
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description="Генератор грамматик Vosk")
+    parser.add_argument("--stage", choices=STAGES, help="Собрать только указанный этап")
+    parser.add_argument("--dir", default=GRAMMAR_DIR, help="Каталог публикации грамматик")
+    parser.add_argument("--watch", type=float, default=0, help="Пересобирать при изменении клиентов каждые N секунд")
+    parser.add_argument("--force", action="store_true", help="Перезаписать даже без изменений")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - GRAMMAR - %(levelname)s - %(message)s')
+
+    builder = GrammarBuilder(args.dir, args.force)
+    try:
+        if args.stage in (None, "inn"):
+            builder.build_inn()
+        if args.stage in (None, "codeword"):
+            builder.build_codeword()
+        if args.watch:
+            builder.watch(args.watch)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"❌ Ошибка сборки грамматик: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
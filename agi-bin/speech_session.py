@@ -0,0 +1,13 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Точка входа AGI: EAGI-сессия распознавания речи
+Реализация — agilib/speech.py; скрипт только импортирует её,
+чтобы байткод пакета брался из __pycache__ и не компилировался на каждый вызов
+"""
+
+from agilib.speech import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Подбор таймаутов распознавания по истории фраз
+Таймауты SpeechBackground/EAGI были зашиты в диалплан (10, 8 и 15 секунд):
+быстрые абоненты дослушивают тишину, медленных обрывает таймаут.
+Задача собирает, когда абоненты начинают говорить и сколько говорят:
+  - этапы inn и codeword — из таблицы speech_utterances, куда
+    speech_session.py пишет каждую фразу через спул отложенных записей
+  - этап problem — из записей проблемы (problem_audio_path): начало и конец
+    речи находятся по энергии звука, результат тоже сохраняется
+    в speech_utterances, и запись не анализируется повторно
+и считает по этапам (и по абонентам с достаточной историей) перцентили.
+
+Таймаут ожидания = перцентиль ONSET_QUANTILE начала речи + запас.
+Начала речи цензурированы текущим таймаутом: кто не успел заговорить,
+в выборку не попал. Если у таймаута много поздних начал (доля CENSORED_LIMIT),
+таймаут не снижается, а поднимается — обрывы важнее экономии.
+Предел длительности фразы = перцентиль DURATION_QUANTILE длительности + запас.
+
+Рекомендации публикуются в SPEECH_TIMEOUTS_PATH, в начале вызова их читает
+speech_timeouts.py (agilib/timeouts.py) и устанавливает переменные канала.
+
+Использование:
+    ./speech_stats.py [--days 30] [--dry-run] [--skip-recordings] [--limit N]
+"""
+
+import argparse
+import array
+import logging
+import math
+import os
+import subprocess
+import sys
+import time
+import wave
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from agilib import config
+from agilib import timeouts as speech_timeouts
+
+# Таймауты диалплана по умолчанию (с ними собрана история до первой публикации), сек
+DEFAULT_TIMEOUTS = {"inn": 10.0, "codeword": 8.0, "problem": 15.0}
+# Этапы с пределом длительности фразы (EAGI-сессия)
+UTTERANCE_STAGES = ("inn", "codeword")
+DEFAULT_MAX_UTTERANCE = float(os.getenv("SPEECH_MAX_UTTERANCE", "30"))
+
+ONSET_QUANTILE = float(os.getenv("SPEECH_STATS_ONSET_QUANTILE", "0.98"))
+DURATION_QUANTILE = float(os.getenv("SPEECH_STATS_DURATION_QUANTILE", "0.99"))
+ONSET_MARGIN = float(os.getenv("SPEECH_STATS_ONSET_MARGIN", "1.0"))
+DURATION_MARGIN = float(os.getenv("SPEECH_STATS_DURATION_MARGIN", "2.0"))
+
+# Границы рекомендаций, сек
+MIN_TIMEOUT = float(os.getenv("SPEECH_STATS_MIN_TIMEOUT", "3"))
+MAX_TIMEOUT = float(os.getenv("SPEECH_STATS_MAX_TIMEOUT", "20"))
+MIN_UTTERANCE = float(os.getenv("SPEECH_STATS_MIN_UTTERANCE", "8"))
+MAX_UTTERANCE = float(os.getenv("SPEECH_STATS_MAX_UTTERANCE", "60"))
+
+# Доля начал речи у самого таймаута / обрывов фраз, при которой значение не снижается
+CENSORED_LIMIT = float(os.getenv("SPEECH_STATS_CENSORED_LIMIT", "0.01"))
+TRUNCATION_LIMIT = float(os.getenv("SPEECH_STATS_TRUNCATION_LIMIT", "0.02"))
+
+# Минимум фраз этапа и абонента; личное значение публикуется при отличии от этапа
+MIN_STAGE_SAMPLES = int(os.getenv("SPEECH_STATS_MIN_STAGE_SAMPLES", "50"))
+MIN_CALLER_SAMPLES = int(os.getenv("SPEECH_STATS_MIN_CALLER_SAMPLES", "8"))
+MIN_CALLER_DIFFERENCE = 1.0
+
+# Детектор речи по энергии: кадр 20 мс, порог относительно шума записи
+FRAME_MS = 20
+VOICE_MIN_RMS = 300
+VOICE_NOISE_RATIO = 3.0
+# Речь в последние TRUNCATION_TAIL_MS записи — фразу оборвал конец записи
+TRUNCATION_TAIL_MS = 500
+DECODE_RATE = 8000
+
+# Записей проблемы на одну порцию анализа
+CHUNK_ROWS = 200
+
+logger = logging.getLogger(__name__)
+
+
+def round_up(seconds: float, step: float = 0.5) -> float:
+    return math.ceil(seconds / step) * step
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def read_samples(path: str) -> Tuple[array.array, int]:
+    """
+    Отсчёты моно 16 бит записи
+
+    Returns:
+        (отсчёты, частота_дискретизации)
+    """
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() == 2 and w.getnchannels() == 1:
+                samples = array.array("h")
+                samples.frombytes(w.readframes(w.getnframes()))
+                return samples, w.getframerate()
+
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+         "-ac", "1", "-ar", str(DECODE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        raise OSError(result.stderr.decode("utf-8", "replace").strip() or f"ffmpeg: код {result.returncode}")
+    samples = array.array("h")
+    samples.frombytes(result.stdout[:len(result.stdout) // 2 * 2])
+    return samples, DECODE_RATE
+
+
+def speech_bounds(samples: array.array, rate: int) -> Tuple[Optional[int], Optional[int], int]:
+    """
+    Начало и конец речи в записи по энергии кадров
+
+    Returns:
+        (начало_мс или None, конец_мс или None, длина_записи_мс)
+    """
+    frame = rate * FRAME_MS // 1000
+    energies = []
+    for start in range(0, len(samples) - frame + 1, frame):
+        chunk = samples[start:start + frame]
+        energies.append(math.sqrt(sum(s * s for s in chunk) / frame))
+    length_ms = len(samples) * 1000 // rate if rate else 0
+    if not energies:
+        return None, None, length_ms
+
+    # Шум — нижний дециль энергии кадров
+    noise = sorted(energies)[len(energies) // 10]
+    threshold = max(VOICE_MIN_RMS, noise * VOICE_NOISE_RATIO)
+    voiced = [i for i, energy in enumerate(energies) if energy >= threshold]
+    if not voiced:
+        return None, None, length_ms
+    return voiced[0] * FRAME_MS, (voiced[-1] + 1) * FRAME_MS, length_ms
+
+
+class SpeechStats:
+    """Сбор длительностей фраз и расчёт рекомендаций"""
+
+    def __init__(self, days: int):
+        self.days = days
+        self.conn = psycopg2.connect(**config.db_config("speech_stats"))
+
+    # ────────────────────────────────────────────────
+    # Этап problem: анализ записей
+    # ────────────────────────────────────────────────
+    def unmeasured_recordings(self, after_id: int) -> List[Tuple[Any, ...]]:
+        """Записи проблемы за окно, ещё не попавшие в speech_utterances"""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT v.id, v.call_uniqueid, v.caller_number, v.problem_audio_path, v.created_at
+                FROM verification_logs v
+                WHERE v.problem_audio_path IS NOT NULL AND v.problem_audio_path <> ''
+                  AND v.created_at >= NOW() - make_interval(days => %s)
+                  AND v.id > %s
+                  AND NOT EXISTS (SELECT 1 FROM speech_utterances u WHERE u.verification_log_id = v.id)
+                ORDER BY v.id
+                LIMIT %s
+            """, (self.days, after_id, CHUNK_ROWS))
+            return cursor.fetchall()
+
+    def measure_recordings(self, limit: int = 0) -> int:
+        """
+        Находит начало и конец речи в записях проблемы
+
+        Returns:
+            Число обработанных записей
+        """
+        # Таймаут, с которым записаны новые вызовы: опубликованный или из диалплана
+        published = (speech_timeouts.load() or {}).get("stages", {}).get("problem", {})
+        timeout_ms = int(published.get("timeout", DEFAULT_TIMEOUTS["problem"]) * 1000)
+        after_id = 0
+        measured = 0
+        while not limit or measured < limit:
+            rows = self.unmeasured_recordings(after_id)
+            if limit:
+                rows = rows[:limit - measured]
+            if not rows:
+                break
+
+            values = []
+            for log_id, uniqueid, caller_number, path, created_at in rows:
+                try:
+                    onset_ms, end_ms, length_ms = speech_bounds(*read_samples(path))
+                except (OSError, wave.Error, EOFError) as e:
+                    logger.warning(f"Запись {log_id} не прочитана ({path}): {e}")
+                    values.append((uniqueid, caller_number, None, None, timeout_ms, "UNREADABLE", False, log_id, created_at))
+                    continue
+                if onset_ms is None:
+                    values.append((uniqueid, caller_number, None, None, timeout_ms, "TIMEOUT", False, log_id, created_at))
+                    continue
+                truncated = length_ms - end_ms < TRUNCATION_TAIL_MS
+                values.append((uniqueid, caller_number, onset_ms, end_ms - onset_ms, timeout_ms,
+                               "END_OF_SPEECH", truncated, log_id, created_at))
+
+            with self.conn.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO speech_utterances
+                        (call_uniqueid, caller_number, stage, onset_ms, duration_ms,
+                         timeout_ms, stop_reason, truncated, verification_log_id, created_at)
+                    VALUES (%s, %s, 'problem', %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                """, values)
+            self.conn.commit()
+            after_id = rows[-1][0]
+            measured += len(rows)
+            logger.info(f"Проанализировано записей проблемы: {measured}")
+        return measured
+
+    # ────────────────────────────────────────────────
+    # Перцентили и рекомендации
+    # ────────────────────────────────────────────────
+    def percentiles(self, by_caller: bool) -> List[Dict[str, Any]]:
+        """
+        Перцентили начала и длительности речи по этапам (и абонентам)
+        Этапы inn+codeword и inn объединяются: таймаут у них общий
+        """
+        group = "caller_number, " if by_caller else ""
+        callers = "AND caller_number <> ''" if by_caller else ""
+        having = "HAVING count(onset_ms) >= %(min_caller)s" if by_caller else ""
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {group}split_part(stage, '+', 1) AS stage_key,
+                       count(*) AS samples,
+                       count(onset_ms) AS heard,
+                       percentile_cont(%(onset_q)s) WITHIN GROUP (ORDER BY onset_ms) AS onset_q,
+                       percentile_cont(%(duration_q)s) WITHIN GROUP (ORDER BY duration_ms) AS duration_q,
+                       avg((onset_ms >= timeout_ms - %(margin_ms)s)::int) AS censored,
+                       avg(truncated::int) FILTER (WHERE onset_ms IS NOT NULL) AS truncated,
+                       percentile_disc(0.5) WITHIN GROUP (ORDER BY timeout_ms) AS timeout_ms
+                FROM speech_utterances
+                WHERE created_at >= NOW() - make_interval(days => %(days)s)
+                  AND stop_reason NOT IN ('HANGUP', 'UNREADABLE')
+                  {callers}
+                GROUP BY {group}stage_key
+                {having}
+            """, {
+                "onset_q": ONSET_QUANTILE, "duration_q": DURATION_QUANTILE,
+                "margin_ms": ONSET_MARGIN * 1000, "days": self.days, "min_caller": MIN_CALLER_SAMPLES,
+            })
+            columns = [c.name for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def cutoff_share(self, stage: str, timeout: float) -> float:
+        """Доля фраз этапа, начавшихся позже таймаута (оборвались бы при нём)"""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT coalesce(avg((onset_ms > %s)::int), 0)
+                FROM speech_utterances
+                WHERE split_part(stage, '+', 1) = %s AND onset_ms IS NOT NULL
+                  AND created_at >= NOW() - make_interval(days => %s)
+            """, (timeout * 1000, stage, self.days))
+            return float(cursor.fetchone()[0])
+
+    @staticmethod
+    def recommend(row: Dict[str, Any]) -> Dict[str, float]:
+        """Таймаут ожидания речи и предел длительности по строке перцентилей"""
+        stage = row["stage_key"]
+        current = (row["timeout_ms"] or 0) / 1000 or DEFAULT_TIMEOUTS.get(stage, MAX_TIMEOUT)
+        values = {}
+
+        if row["onset_q"] is not None:
+            timeout = round_up(row["onset_q"] / 1000 + ONSET_MARGIN)
+            if (row["censored"] or 0) > CENSORED_LIMIT:
+                # Часть абонентов заговорила у самого таймаута — его не хватает
+                timeout = max(timeout, round_up(current + ONSET_MARGIN))
+            values["timeout"] = clamp(timeout, MIN_TIMEOUT, MAX_TIMEOUT)
+
+        if stage in UTTERANCE_STAGES and row["duration_q"] is not None:
+            max_utterance = round_up(row["duration_q"] / 1000 + DURATION_MARGIN)
+            if (row["truncated"] or 0) > TRUNCATION_LIMIT:
+                max_utterance = max(max_utterance, DEFAULT_MAX_UTTERANCE)
+            values["max_utterance"] = clamp(max_utterance, MIN_UTTERANCE, MAX_UTTERANCE)
+        return values
+
+    def build(self) -> Dict[str, Any]:
+        """Рекомендации по этапам и абонентам с отчётом"""
+        stages: Dict[str, Dict[str, Any]] = {}
+        for row in self.percentiles(by_caller=False):
+            stage = row["stage_key"]
+            if row["heard"] < MIN_STAGE_SAMPLES:
+                logger.info(f"Этап {stage}: мало фраз ({row['heard']}), рекомендаций нет")
+                continue
+            values = self.recommend(row)
+            stages[stage] = {**values, "samples": row["samples"]}
+
+            current = (row["timeout_ms"] or 0) / 1000
+            timeout = values.get("timeout", current)
+            logger.info(
+                f"Этап {stage}: фраз {row['samples']}, с речью {row['heard']}; "
+                f"начало речи p{ONSET_QUANTILE * 100:g} {(row['onset_q'] or 0) / 1000:.1f} с, "
+                f"у таймаута {(row['censored'] or 0) * 100:.1f}%, оборвано {(row['truncated'] or 0) * 100:.1f}%; "
+                f"таймаут {current:g} -> {timeout:g} с "
+                f"(начали бы позже: {self.cutoff_share(stage, timeout) * 100:.1f}%)"
+                + (f", предел фразы {values['max_utterance']:g} с" if "max_utterance" in values else "")
+            )
+
+        callers: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for row in self.percentiles(by_caller=True):
+            stage = row["stage_key"]
+            if stage not in stages:
+                continue
+            personal = {
+                name: value for name, value in self.recommend(row).items()
+                if abs(value - stages[stage].get(name, value)) >= MIN_CALLER_DIFFERENCE
+            }
+            if personal:
+                callers.setdefault(row["caller_number"], {})[stage] = personal
+        logger.info(f"Личные таймауты: {len(callers)} абонентов")
+
+        return {"built_at": time.time(), "days": self.days, "stages": stages, "callers": callers}
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор таймаутов распознавания по истории фраз")
+    parser.add_argument("--days", type=int, default=30, help="Окно истории, дней")
+    parser.add_argument("--output", default=speech_timeouts.TIMEOUTS_PATH, help="Файл рекомендаций")
+    parser.add_argument("--dry-run", action="store_true", help="Только отчёт, без публикации")
+    parser.add_argument("--skip-recordings", action="store_true", help="Не анализировать новые записи проблемы")
+    parser.add_argument("--limit", type=int, default=0, help="Проанализировать не больше N записей")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - SPEECH_STATS - %(levelname)s - %(message)s')
+
+    try:
+        stats = SpeechStats(args.days)
+        try:
+            if not args.skip_recordings:
+                stats.measure_recordings(args.limit)
+            result = stats.build()
+        finally:
+            stats.close()
+    except psycopg2.Error as e:
+        logger.error(f"❌ Ошибка БД: {e}")
+        sys.exit(1)
+
+    if args.dry_run:
+        return
+    speech_timeouts.publish(args.output, result)
+    logger.info(f"✅ Рекомендации опубликованы: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Точка входа AGI: таймауты распознавания из истории фраз
+Реализация — agilib/timeouts.py; скрипт только импортирует её,
+чтобы байткод пакета брался из __pycache__ и не компилировался на каждый вызов
+"""
+
+from agilib.timeouts import main
+
+if __name__ == "__main__":
+    main()
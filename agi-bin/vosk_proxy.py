@@ -0,0 +1,320 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Прокси распознавания с пулом прогретых сессий Vosk
+Каждый SpeechCreate(vosk) и каждая EAGI-сессия открывают к серверу Vosk новое
+WebSocket-соединение, и установка соединения вместе с созданием распознавателя
+на сервере попадает на путь абонента. Прокси держит к одному или нескольким
+серверам Vosk пул прогретых соединений (распознаватель уже создан) и передаёт
+по ним сессии вызовов по очереди:
+  - конец сессии клиента ({"eof" : 1}) пересылается серверу как {"reset" : 1}:
+    сервер отдаёт финальный результат и сбрасывает распознаватель,
+    не закрывая соединение, и оно возвращается в пул
+  - соединения различаются конфигурацией ({"config": ...}: sample_rate,
+    phrase_list), она задаётся при создании распознавателя
+  - сессия направляется на наименее загруженный здоровый сервер
+  - фоновая проверка пополняет пул, пингует простаивающие соединения
+    и выводит из ротации недоступные серверы
+
+res_speech_vosk.conf и VOSK_URL скриптов указывают на прокси:
+    url = ws://127.0.0.1:2800
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from agilib import metrics as agi_metrics
+
+logging.basicConfig(
+    level=getattr(logging, os.getenv("LOG_LEVEL", "INFO")),
+    format='%(asctime)s - VOSK_PROXY - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("websockets").setLevel(logging.WARNING)
+
+PROXY_HOST = os.getenv("VOSK_PROXY_HOST", "127.0.0.1")
+PROXY_PORT = int(os.getenv("VOSK_PROXY_PORT", "2800"))
+
+# Серверы Vosk через запятую
+VOSK_BACKENDS = [url.strip() for url in os.getenv("VOSK_BACKENDS", "ws://10.7.35.3:2700").split(",") if url.strip()]
+
+# Прогретых соединений без конфигурации на сервер и предел соединений на сервер
+MIN_IDLE = int(os.getenv("VOSK_PROXY_MIN_IDLE", "4"))
+MAX_CONNECTIONS = int(os.getenv("VOSK_PROXY_MAX_CONNECTIONS", "32"))
+
+# Период проверки серверов и время жизни простаивающих соединений с грамматикой, сек
+HEALTH_INTERVAL = float(os.getenv("VOSK_PROXY_HEALTH_INTERVAL", "5"))
+IDLE_TTL = float(os.getenv("VOSK_PROXY_IDLE_TTL", "300"))
+CONNECT_TIMEOUT = float(os.getenv("VOSK_PROXY_CONNECT_TIMEOUT", "3"))
+
+# Сообщения протокола Vosk
+RESET = '{"reset" : 1}'
+DEFAULT_CONFIG = ""
+
+# 100 мс тишины slin 8 кГц — создаёт распознаватель при прогреве
+WARMUP_CHUNK = b"\x00" * 1600
+
+
+def config_key(message: str) -> Optional[str]:
+    """Каноническая конфигурация сессии из сообщения {"config": ...} или None"""
+    try:
+        parsed = json.loads(message)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict) and "config" in parsed:
+        return json.dumps(parsed, sort_keys=True, ensure_ascii=False)
+    return None
+
+
+def is_eof(message) -> bool:
+    if not isinstance(message, str):
+        return False
+    try:
+        parsed = json.loads(message)
+    except ValueError:
+        return False
+    return isinstance(parsed, dict) and "eof" in parsed
+
+
+class BackendConnection:
+    """Соединение с сервером Vosk с созданным распознавателем"""
+
+    def __init__(self, ws, key: str):
+        self.ws = ws
+        self.key = key
+        self.idle_since = time.monotonic()
+
+    @property
+    def open(self) -> bool:
+        return self.ws.close_code is None
+
+    async def close(self) -> None:
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
+
+
+class Backend:
+    """Сервер Vosk: пул простаивающих соединений по конфигурации и счётчик сессий"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = True
+        self.active = 0
+        self.connections = 0
+        self.idle: Dict[str, List[BackendConnection]] = {}
+
+    def idle_count(self, key: str) -> int:
+        return len(self.idle.get(key, ()))
+
+    async def connect(self, key: str) -> BackendConnection:
+        """Открывает соединение и создаёт на сервере распознаватель"""
+        started = time.monotonic()
+        ws = await websockets.connect(self.url, open_timeout=CONNECT_TIMEOUT)
+        self.connections += 1
+        conn = BackendConnection(ws, key)
+        try:
+            if key != DEFAULT_CONFIG:
+                await ws.send(key)
+            await ws.send(WARMUP_CHUNK)
+            await asyncio.wait_for(ws.recv(), CONNECT_TIMEOUT)
+            await ws.send(RESET)
+            await asyncio.wait_for(ws.recv(), CONNECT_TIMEOUT)
+        except Exception:
+            await self.discard(conn)
+            raise
+        agi_metrics.emit("vosk_proxy_connect_ms_total", (time.monotonic() - started) * 1000, backend=self.url)
+        return conn
+
+    def take(self, key: str) -> Optional[BackendConnection]:
+        """Свободное прогретое соединение с нужной конфигурацией"""
+        pool = self.idle.get(key)
+        while pool:
+            conn = pool.pop()
+            if conn.open:
+                return conn
+            self.connections -= 1
+        return None
+
+    def give_back(self, conn: BackendConnection) -> None:
+        conn.idle_since = time.monotonic()
+        self.idle.setdefault(conn.key, []).append(conn)
+
+    async def discard(self, conn: BackendConnection) -> None:
+        self.connections -= 1
+        await conn.close()
+
+
+class VoskProxy:
+    """Приём сессий вызовов и их передача по пулу соединений"""
+
+    def __init__(self, urls: List[str]):
+        self.backends = [Backend(url) for url in urls]
+
+    def route(self, key: str) -> List[Backend]:
+        """Серверы в порядке выбора: здоровые, наименее загруженные, с прогретым соединением"""
+        healthy = [b for b in self.backends if b.healthy] or self.backends
+        return sorted(healthy, key=lambda b: (b.active, -b.idle_count(key)))
+
+    async def acquire(self, key: str) -> Tuple[Backend, BackendConnection]:
+        """Соединение для сессии: из пула или новое"""
+        last_error: Optional[Exception] = None
+        for backend in self.route(key):
+            conn = backend.take(key)
+            if conn is not None:
+                return backend, conn
+            if backend.connections >= MAX_CONNECTIONS:
+                continue
+            try:
+                agi_metrics.emit("vosk_proxy_pool_miss_total", backend=backend.url)
+                return backend, await backend.connect(key)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                logger.warning(f"⚠️ {backend.url} недоступен: {e}")
+                backend.healthy = False
+                last_error = e
+        raise ConnectionError(f"нет доступных серверов Vosk: {last_error}")
+
+    async def relay(self, client, conn: BackendConnection, first) -> bool:
+        """
+        Передаёт одну сессию клиента через соединение с сервером
+
+        Returns:
+            True, если соединение осталось в согласованном состоянии
+            (ответ на {"reset" : 1} получен) и его можно вернуть в пул
+        """
+        owed = 0
+        finished = False
+
+        async def upstream():
+            nonlocal owed, finished
+            message = first
+            try:
+                while not is_eof(message):
+                    if message is not None and (isinstance(message, bytes) or config_key(message) is None):
+                        owed += 1
+                        await conn.ws.send(message)
+                    message = await client.recv()
+            except ConnectionClosed:
+                # Клиент ушёл без eof — распознаватель всё равно сбрасывается
+                pass
+            owed += 1
+            finished = True
+            await conn.ws.send(RESET)
+
+        async def downstream():
+            nonlocal owed
+            while not (finished and owed == 0):
+                response = await conn.ws.recv()
+                owed -= 1
+                try:
+                    await client.send(response)
+                except ConnectionClosed:
+                    pass
+
+        tasks = [asyncio.ensure_future(upstream()), asyncio.ensure_future(downstream())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return True
+
+    async def handle(self, client) -> None:
+        """Сессия клиента: первое сообщение определяет конфигурацию"""
+        try:
+            first = await client.recv()
+        except ConnectionClosed:
+            return
+        key = config_key(first) if isinstance(first, str) else None
+        if key is not None:
+            first = None
+        else:
+            key = DEFAULT_CONFIG
+
+        try:
+            backend, conn = await self.acquire(key)
+        except ConnectionError as e:
+            logger.error(f"❌ {e}")
+            await client.close(1011, "no backend")
+            return
+
+        backend.active += 1
+        started = time.monotonic()
+        reusable = False
+        try:
+            reusable = await self.relay(client, conn, first)
+        except (websockets.WebSocketException, OSError) as e:
+            logger.warning(f"⚠️ Сессия через {backend.url} прервана: {e}")
+        finally:
+            backend.active -= 1
+            if reusable and conn.open:
+                backend.give_back(conn)
+            else:
+                await backend.discard(conn)
+            await client.close()
+            agi_metrics.emit("vosk_proxy_sessions_total", backend=backend.url, reused=str(reusable).lower())
+            agi_metrics.emit("vosk_proxy_session_ms_total", (time.monotonic() - started) * 1000, backend=backend.url)
+
+    async def check(self, backend: Backend) -> None:
+        """Проверка сервера: пинг и очистка пула, пополнение прогретых соединений"""
+        now = time.monotonic()
+        for key, pool in list(backend.idle.items()):
+            dead = []
+            # Снимок: пока идёт пинг, соединения из пула могут забрать сессии
+            for conn in list(pool):
+                expired = key != DEFAULT_CONFIG and now - conn.idle_since > IDLE_TTL
+                if not expired and conn.open:
+                    try:
+                        await asyncio.wait_for(await conn.ws.ping(), CONNECT_TIMEOUT)
+                        continue
+                    except Exception:
+                        pass
+                dead.append(conn)
+            for conn in dead:
+                if conn in pool:
+                    pool.remove(conn)
+                    await backend.discard(conn)
+
+        try:
+            while backend.idle_count(DEFAULT_CONFIG) < MIN_IDLE and backend.connections < MAX_CONNECTIONS:
+                backend.give_back(await backend.connect(DEFAULT_CONFIG))
+            if not backend.healthy:
+                logger.info(f"✅ {backend.url} снова доступен")
+            backend.healthy = True
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            if backend.healthy:
+                logger.warning(f"⚠️ {backend.url} выведен из ротации: {e}")
+            backend.healthy = False
+
+    async def health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self.check(backend) for backend in self.backends))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+
+async def main():
+    """Главная функция"""
+    proxy = VoskProxy(VOSK_BACKENDS)
+    checker = asyncio.create_task(proxy.health_loop())
+    try:
+        async with websockets.serve(proxy.handle, PROXY_HOST, PROXY_PORT):
+            logger.info(f"✅ Прокси Vosk слушает ws://{PROXY_HOST}:{PROXY_PORT}, серверы: {', '.join(VOSK_BACKENDS)}")
+            await asyncio.Future()
+    finally:
+        checker.cancel()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Прокси Vosk остановлен")
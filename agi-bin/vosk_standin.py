@@ -0,0 +1,66 @@
+#!/var/lib/asterisk/agi-bin/.venv/bin/python3
+# -*- coding: utf-8 -*-
+
+"""
+Заглушка сервера Vosk для проверки vosk_proxy.py без модели
+Повторяет протокол vosk-server (asr_server.py): {"config": ...} до первого
+аудио, ответ на каждый фрагмент аудио ({"partial": ...}),
+{"eof" : 1} — финальный результат и закрытие соединения,
+{"reset" : 1} — финальный результат без закрытия.
+Создание распознавателя при первом аудио занимает VOSK_STANDIN_WARMUP_MS мс
+(как создание сессии модели на настоящем сервере)
+
+Использование:
+    ./vosk_standin.py [--port 2700] [--warmup-ms 300]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+import websockets
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - VOSK_STANDIN - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+async def recognize(ws, warmup: float) -> None:
+    """Сессия одного соединения"""
+    recognizer = None
+    words = []
+    async for message in ws:
+        if isinstance(message, str) and "config" in message:
+            logger.debug(f"Конфигурация: {json.loads(message)['config']}")
+            continue
+        if recognizer is None:
+            await asyncio.sleep(warmup)
+            recognizer = True
+
+        if message in ('{"eof" : 1}', '{"reset" : 1}'):
+            await ws.send(json.dumps({"text": " ".join(words)}, ensure_ascii=False))
+            words = []
+            if message == '{"eof" : 1}':
+                break
+            continue
+
+        if any(message):
+            words.append(f"слово{len(words) + 1}")
+        await ws.send(json.dumps({"partial": " ".join(words)}, ensure_ascii=False))
+
+
+async def main(args) -> None:
+    async with websockets.serve(lambda ws: recognize(ws, args.warmup_ms / 1000), args.host, args.port):
+        logger.info(f"✅ Заглушка Vosk слушает ws://{args.host}:{args.port}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка сервера Vosk")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2700)
+    parser.add_argument("--warmup-ms", type=float, default=300, help="Задержка создания распознавателя, мс")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,20 @@
+-- Уточнённая расшифровка описания проблемы (agi-bin/retranscribe.py)
+-- Для существующей базы выполнить вручную:
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/02-problem-refined.sql
+
+ALTER TABLE public.verification_logs
+    ADD COLUMN IF NOT EXISTS problem_text_refined TEXT,
+    ADD COLUMN IF NOT EXISTS problem_audio_sha256 CHAR(64),
+    ADD COLUMN IF NOT EXISTS problem_refined_at TIMESTAMP WITHOUT TIME ZONE;
+
+COMMENT ON COLUMN public.verification_logs.problem_text_refined IS 'Расшифровка полной записи проблемы офлайн-моделью';
+COMMENT ON COLUMN public.verification_logs.problem_audio_sha256 IS 'SHA-256 содержимого аудиофайла на момент расшифровки';
+COMMENT ON COLUMN public.verification_logs.problem_refined_at IS 'Время обработки записи (NULL — ещё не обработана)';
+
+-- Очередь необработанных записей
+CREATE INDEX IF NOT EXISTS idx_verif_problem_unrefined ON public.verification_logs(id)
+    WHERE problem_audio_path IS NOT NULL AND problem_refined_at IS NULL;
+
+-- Повторное использование расшифровки одинаковых файлов
+CREATE INDEX IF NOT EXISTS idx_verif_problem_audio_sha256 ON public.verification_logs(problem_audio_sha256)
+    WHERE problem_audio_sha256 IS NOT NULL;
@@ -0,0 +1,29 @@
+-- Длительности фраз по этапам для подбора таймаутов распознавания (agi-bin/speech_stats.py)
+-- Для существующей базы выполнить вручную:
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/03-speech-utterances.sql
+
+CREATE TABLE IF NOT EXISTS public.speech_utterances (
+    id BIGSERIAL PRIMARY KEY,
+    call_uniqueid VARCHAR(255),
+    caller_number VARCHAR(50),
+    stage VARCHAR(32) NOT NULL,
+    onset_ms INTEGER,
+    duration_ms INTEGER,
+    timeout_ms INTEGER NOT NULL,
+    stop_reason VARCHAR(32) NOT NULL,
+    truncated BOOLEAN NOT NULL DEFAULT false,
+    verification_log_id BIGINT REFERENCES public.verification_logs(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE public.speech_utterances IS 'Фразы абонентов: когда началась речь и сколько длилась';
+COMMENT ON COLUMN public.speech_utterances.onset_ms IS 'От начала прослушивания до начала речи (NULL — речи не было)';
+COMMENT ON COLUMN public.speech_utterances.duration_ms IS 'От начала до конца речи';
+COMMENT ON COLUMN public.speech_utterances.timeout_ms IS 'Таймаут ожидания речи, с которым шло прослушивание';
+COMMENT ON COLUMN public.speech_utterances.truncated IS 'Фраза оборвана пределом длительности или концом записи';
+COMMENT ON COLUMN public.speech_utterances.verification_log_id IS 'Запись проблемы, по которой измерена фраза (этап problem)';
+
+CREATE INDEX IF NOT EXISTS idx_speech_utterances_stage_created ON public.speech_utterances(stage, created_at);
+CREATE INDEX IF NOT EXISTS idx_speech_utterances_caller ON public.speech_utterances(caller_number, stage);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_speech_utterances_log ON public.speech_utterances(verification_log_id)
+    WHERE verification_log_id IS NOT NULL;
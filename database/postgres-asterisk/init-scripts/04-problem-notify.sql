@@ -0,0 +1,29 @@
+-- Уведомление notifier о сохранённой проблеме (telegram-bot-v2/notifier.py слушает канал problem_ready)
+-- Для существующей базы выполнить вручную:
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/04-problem-notify.sql
+
+CREATE OR REPLACE FUNCTION public.notify_problem_ready()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Уведомление доставляется слушателям при фиксации транзакции
+    PERFORM pg_notify('problem_ready', NEW.id::text);
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS notify_problem_ready_insert ON public.verification_logs;
+CREATE TRIGGER notify_problem_ready_insert
+    AFTER INSERT ON public.verification_logs
+    FOR EACH ROW
+    WHEN (NEW.problem_text IS NOT NULL AND NEW.problem_text <> '')
+    EXECUTE FUNCTION public.notify_problem_ready();
+
+DROP TRIGGER IF EXISTS notify_problem_ready_update ON public.verification_logs;
+CREATE TRIGGER notify_problem_ready_update
+    AFTER UPDATE OF problem_text ON public.verification_logs
+    FOR EACH ROW
+    WHEN (NEW.problem_text IS NOT NULL AND NEW.problem_text <> ''
+          AND NEW.problem_text IS DISTINCT FROM OLD.problem_text)
+    EXECUTE FUNCTION public.notify_problem_ready();
@@ -0,0 +1,17 @@
+-- file_id аудиозаписей проблем, уже загруженных в Telegram (telegram-bot-v2/notifier.py)
+-- Запись загружается один раз, остальные чаты и повторные отправки получают её по file_id
+-- Для существующей базы выполнить вручную:
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/05-telegram-audio-files.sql
+
+CREATE TABLE IF NOT EXISTS public.telegram_audio_files (
+    audio_path TEXT PRIMARY KEY,
+    media_type VARCHAR(16) NOT NULL,
+    file_id TEXT NOT NULL,
+    file_unique_id TEXT,
+    uploaded_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE public.telegram_audio_files IS 'Аудиозаписи проблем, загруженные в Telegram';
+COMMENT ON COLUMN public.telegram_audio_files.audio_path IS 'Путь к записи (verification_logs.problem_audio_path)';
+COMMENT ON COLUMN public.telegram_audio_files.media_type IS 'Как Telegram сохранил файл: audio, voice или document';
+COMMENT ON COLUMN public.telegram_audio_files.file_id IS 'file_id для повторной отправки без загрузки';
@@ -0,0 +1,56 @@
+-- Очередь уведомлений: строка на каждую пару проблема × привязанный чат (telegram-bot-v2/notifier.py)
+-- Строки добавляет триггер verification_logs в той же транзакции, что сохраняет problem_text,
+-- поэтому проблема, записанная пока notifier не работал, не теряется
+-- Для существующей базы выполнить вручную (после 04-problem-notify.sql):
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/06-notification-outbox.sql
+
+CREATE TABLE IF NOT EXISTS public.notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    verification_log_id BIGINT NOT NULL REFERENCES public.verification_logs(id) ON DELETE CASCADE,
+    chat_id BIGINT NOT NULL,
+    state VARCHAR(16) NOT NULL DEFAULT 'pending'
+        CHECK (state IN ('pending', 'sending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_at TIMESTAMP WITHOUT TIME ZONE,
+    sent_at TIMESTAMP WITHOUT TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT notification_outbox_problem_chat_key UNIQUE (verification_log_id, chat_id)
+);
+
+COMMENT ON TABLE public.notification_outbox IS 'Уведомления о проблемах для Telegram-чатов и их состояние доставки';
+COMMENT ON COLUMN public.notification_outbox.state IS 'pending — ждёт отправки, sending — у notifier, sent — доставлено, failed — попытки исчерпаны';
+COMMENT ON COLUMN public.notification_outbox.attempts IS 'Сколько раз notifier брал строку в отправку';
+COMMENT ON COLUMN public.notification_outbox.next_attempt_at IS 'Не отправлять раньше (отсрочка после неудачи)';
+
+-- Выборка очереди к отправке
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON public.notification_outbox(next_attempt_at, id)
+    WHERE state = 'pending';
+CREATE INDEX IF NOT EXISTS idx_outbox_sending ON public.notification_outbox(claimed_at)
+    WHERE state = 'sending';
+
+-- Триггер из 04-problem-notify.sql: строки очереди по активным привязкам клиента
+-- (по id клиента или по ИНН — найденному либо названному), затем уведомление notifier
+CREATE OR REPLACE FUNCTION public.notify_problem_ready()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    problem_inn BIGINT;
+BEGIN
+    SELECT c.inn INTO problem_inn FROM public.clients c WHERE c.id = NEW.matched_client_id;
+    problem_inn := COALESCE(problem_inn, NEW.spoken_inn);
+
+    INSERT INTO public.notification_outbox (verification_log_id, chat_id)
+    SELECT DISTINCT NEW.id, b.chat_id
+    FROM public.telegram_group_bindings b
+    WHERE b.active = true
+      AND (b.client_id = NEW.matched_client_id OR b.client_inn = problem_inn)
+    ON CONFLICT (verification_log_id, chat_id) DO NOTHING;
+
+    -- Уведомление доставляется слушателям при фиксации транзакции
+    PERFORM pg_notify('problem_ready', NEW.id::text);
+    RETURN NEW;
+END;
+$$;
@@ -0,0 +1,54 @@
+-- Изменения привязок чатов для индекса notifier (telegram-bot-v2/bindings.py)
+-- Каждое изменение telegram_group_bindings увеличивает версию и уведомляет канал
+-- bindings_changed; notifier применяет изменения к индексу без полной перезагрузки,
+-- а по расхождению версий перечитывает таблицу целиком
+-- Для существующей базы выполнить вручную:
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/07-bindings-notify.sql
+
+CREATE TABLE IF NOT EXISTS public.telegram_bindings_version (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+COMMENT ON TABLE public.telegram_bindings_version IS 'Версия telegram_group_bindings: увеличивается при каждом изменении';
+
+INSERT INTO public.telegram_bindings_version (id, version) VALUES (true, 0)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.notify_bindings_changed()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    binding RECORD;
+    new_version BIGINT;
+BEGIN
+    -- Строка версии блокируется до фиксации: версии идут в порядке фиксации транзакций
+    UPDATE public.telegram_bindings_version SET version = version + 1
+    WHERE id
+    RETURNING version INTO new_version;
+
+    IF TG_OP = 'DELETE' THEN
+        binding := OLD;
+    ELSE
+        binding := NEW;
+    END IF;
+
+    PERFORM pg_notify('bindings_changed', json_build_object(
+        'version', new_version,
+        'id', binding.id,
+        'chat_id', binding.chat_id,
+        'client_id', binding.client_id,
+        'client_inn', binding.client_inn,
+        'company_name', binding.company_name,
+        'active', TG_OP <> 'DELETE' AND binding.active
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS notify_bindings_changed ON public.telegram_group_bindings;
+CREATE TRIGGER notify_bindings_changed
+    AFTER INSERT OR UPDATE OR DELETE ON public.telegram_group_bindings
+    FOR EACH ROW
+    EXECUTE FUNCTION public.notify_bindings_changed();
@@ -0,0 +1,37 @@
+-- Несколько экземпляров notifier на одной очереди notification_outbox (telegram-bot-v2/notifier.py)
+-- Чат обслуживает один notifier — тот, кто держит аренду чата, поэтому порядок и лимиты чата
+-- соблюдаются. Строки берутся в отправку с арендой; аренды упавшего экземпляра истекают,
+-- и его чаты и строки забирают остальные
+-- Для существующей базы выполнить вручную (после 06-notification-outbox.sql):
+--   docker exec -i postgres-asterisk-v3 psql -U postgres -d asterisk_db < init-scripts/08-notifier-leases.sql
+
+ALTER TABLE public.notification_outbox ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE public.notification_outbox ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITHOUT TIME ZONE;
+
+COMMENT ON COLUMN public.notification_outbox.claimed_by IS 'Экземпляр notifier, который взял строку в отправку последним';
+COMMENT ON COLUMN public.notification_outbox.lease_expires_at IS 'Строка в sending принадлежит claimed_by до этого времени, затем её забирает любой notifier';
+
+-- Строки в отправке ищутся по истечению аренды, а не по времени взятия
+DROP INDEX IF EXISTS public.idx_outbox_sending;
+CREATE INDEX IF NOT EXISTS idx_outbox_lease ON public.notification_outbox(lease_expires_at)
+    WHERE state = 'sending';
+CREATE INDEX IF NOT EXISTS idx_outbox_chat ON public.notification_outbox(chat_id, id)
+    WHERE state IN ('pending', 'sending');
+
+-- Аренда чата: строки чата берёт только её держатель
+CREATE TABLE IF NOT EXISTS public.notification_chat_leases (
+    chat_id BIGINT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
+
+COMMENT ON TABLE public.notification_chat_leases IS 'Какой экземпляр notifier обслуживает чат и до какого времени';
+
+-- Живые экземпляры notifier: делят между собой общий лимит отправки бота
+CREATE TABLE IF NOT EXISTS public.notification_workers (
+    worker_id TEXT PRIMARY KEY,
+    started_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE public.notification_workers IS 'Экземпляры notifier и время их последнего продления аренд';
@@ -0,0 +1,147 @@
+"""
+Дисковый кэш сконвертированных аудиозаписей (OGG)
+Ключ — SHA-256 содержимого исходной записи, поэтому одна запись,
+отправленная повторно или в несколько чатов, конвертируется один раз.
+Файлы кэша переживают перезапуск notifier.
+
+Размер кэша ограничен AUDIO_CACHE_MAX_MB: при превышении удаляются
+давно не использованные файлы (время использования — mtime, обновляется
+при каждом попадании). Готовый файл появляется в кэше атомарно —
+конвертер пишет во временный файл, который затем переименовывается,
+поэтому каталог можно делить между несколькими notifier.
+
+Если каталог кэша недоступен (например, смонтированный каталог хоста
+принадлежит root), кэш работает во временном каталоге процесса и не
+переживает перезапуск — notifier при этом запускается.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "/app/cache/audio")
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv("AUDIO_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# Временные файлы старше этого срока остались от прерванных конвертаций, сек
+STALE_TEMP_AGE = 3600
+TEMP_PREFIX = ".tmp-"
+SUFFIX = ".ogg"
+
+
+class AudioCache:
+    """Каталог OGG-файлов с ключом по содержимому и LRU-вытеснением по размеру"""
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.persistent = True
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if not os.access(directory, os.W_OK | os.X_OK):
+                raise PermissionError(f"нет прав на запись в {directory}")
+        except OSError as e:
+            logger.error(f"❌ Каталог кэша аудио недоступен: {e}")
+            directory = tempfile.mkdtemp(prefix="notifier_audio_")
+            self.persistent = False
+            logger.warning(f"⚠️ Кэш аудио во временном каталоге {directory}, после перезапуска не сохранится")
+        self.directory = directory
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def key(source: str) -> str:
+        """SHA-256 содержимого файла (читает файл — вызывать вне цикла событий)"""
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к файлу из кэша или None; попадание обновляет время использования"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.counters["misses"] += 1
+            metrics.emit("notifier_audio_cache_total", result="miss")
+            return None
+        self.counters["hits"] += 1
+        metrics.emit("notifier_audio_cache_total", result="hit")
+        return path
+
+    def temp_path(self) -> str:
+        """Временный файл в каталоге кэша для записи конвертером"""
+        return os.path.join(self.directory, f"{TEMP_PREFIX}{uuid.uuid4().hex}{SUFFIX}")
+
+    def put(self, key: str, temp_path: str) -> str:
+        """Переносит готовый файл в кэш (атомарно) и вытесняет лишнее"""
+        path = self.path(key)
+        os.replace(temp_path, path)
+        self.counters["stored"] += 1
+        metrics.emit("notifier_audio_cache_bytes_stored_total", os.path.getsize(path))
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Удаляет давно не использованные файлы, пока кэш больше max_bytes
+
+        Returns:
+            Размер кэша после вытеснения, байт
+        """
+        now = time.time()
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith(TEMP_PREFIX):
+                    if now - stat.st_mtime > STALE_TEMP_AGE:
+                        self._unlink(entry.path)
+                    continue
+                if entry.name.endswith(SUFFIX):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if self._unlink(path):
+                total -= size
+                self.counters["evicted"] += 1
+                metrics.emit("notifier_audio_cache_evictions_total")
+                logger.debug(f"🗑️ Вытеснен из кэша: {path}")
+        return total
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+    def close(self) -> None:
+        """Удаляет временный каталог кэша (постоянный кэш сохраняется)"""
+        if not self.persistent:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,130 @@
+"""
+Бенчмарк отправки уведомлений в 1, 10 и 100 привязанных чатов
+Для каждого числа чатов отправляет --problems проблем во все чаты через
+заглушку Bot API (botapi_standin.py, в том же процессе, с лимитами Telegram):
+  - последовательно, как раньше: чат за чатом с паузой 1 сек
+  - через NotificationDispatcher
+и выводит время, сообщения в секунду и число ответов 429
+
+Использование:
+    python bench_dispatcher.py [--chats 1 10 100] [--problems 3] [--audio]
+                               [--baseline-max-chats 10]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import FSInputFile
+
+from botapi_standin import BotApiStandin, serve
+from dispatcher import NotificationDispatcher
+
+TOKEN = "123456:bench-token"
+
+
+class Sender:
+    """Отправка одного уведомления (текст или аудио) через бота"""
+
+    def __init__(self, bot: Bot, audio_path: str = ""):
+        self.bot = bot
+        self.audio_path = audio_path
+
+    async def send(self, chat_id: int, text: str) -> bool:
+        if self.audio_path:
+            await self.bot.send_audio(chat_id=chat_id, audio=FSInputFile(self.audio_path), caption=text)
+        else:
+            await self.bot.send_message(chat_id=chat_id, text=text)
+        return True
+
+
+async def sequential(sender: Sender, chats: List[int], problems: int) -> int:
+    """Прежняя схема: проблемы по очереди, чаты по очереди с паузой 1 сек"""
+    sent = 0
+    for problem in range(problems):
+        for chat_id in chats:
+            while True:
+                try:
+                    await sender.send(chat_id, f"Проблема {problem}")
+                    break
+                except TelegramRetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+            sent += 1
+            await asyncio.sleep(1)
+    return sent
+
+
+async def dispatched(sender: Sender, chats: List[int], problems: int) -> int:
+    dispatcher = NotificationDispatcher()
+    dispatcher.start()
+    futures = [
+        dispatcher.submit(chat_id, lambda chat_id=chat_id, problem=problem: sender.send(chat_id, f"Проблема {problem}"))
+        for problem in range(problems)
+        for chat_id in chats
+    ]
+    results = await asyncio.gather(*futures)
+    await dispatcher.close()
+    return sum(results)
+
+
+async def run_case(mode: str, chats_count: int, args) -> Dict[str, Any]:
+    standin = BotApiStandin(args.text_ms / 1000, args.upload_ms / 1000)
+    runner = await serve(standin, "127.0.0.1", args.port)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.port}"))
+    bot = Bot(token=TOKEN, session=session)
+    sender = Sender(bot, args.audio_path)
+    # Привязки — группы
+    chats = [-1000000000 - number for number in range(chats_count)]
+    try:
+        started = time.perf_counter()
+        sent = await (sequential if mode == "sequential" else dispatched)(sender, chats, args.problems)
+        elapsed = time.perf_counter() - started
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return {"mode": mode, "chats": chats_count, "sent": sent, "seconds": elapsed,
+            "per_second": sent / elapsed if elapsed else 0.0, "429": standin.counters["too_many_requests"]}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отправки уведомлений")
+    parser.add_argument("--chats", type=int, nargs="+", default=[1, 10, 100], help="Числа привязанных чатов")
+    parser.add_argument("--problems", type=int, default=3, help="Проблем на каждый чат")
+    parser.add_argument("--audio", action="store_true", help="Отправлять аудио (sendAudio) вместо текста")
+    parser.add_argument("--text-ms", type=float, default=50, help="Задержка заглушки на текст, мс")
+    parser.add_argument("--upload-ms", type=float, default=300, help="Задержка заглушки на загрузку, мс")
+    parser.add_argument("--baseline-max-chats", type=int, default=10,
+                        help="Последовательная схема только до стольких чатов (она медленная)")
+    parser.add_argument("--port", type=int, default=18081)
+    args = parser.parse_args()
+
+    args.audio_path = ""
+    if args.audio:
+        fd, args.audio_path = tempfile.mkstemp(suffix=".ogg")
+        os.write(fd, os.urandom(64 * 1024))
+        os.close(fd)
+
+    try:
+        print(f"{'схема':<12} {'чатов':>6} {'сообщений':>10} {'сек':>8} {'сообщ/сек':>10} {'429':>5}")
+        for chats_count in args.chats:
+            modes = ["dispatcher"]
+            if chats_count <= args.baseline_max_chats:
+                modes.insert(0, "sequential")
+            for mode in modes:
+                r = await run_case(mode, chats_count, args)
+                print(f"{r['mode']:<12} {r['chats']:>6} {r['sent']:>10} {r['seconds']:>8.2f} "
+                      f"{r['per_second']:>10.2f} {r['429']:>5}")
+    finally:
+        if args.audio_path:
+            os.remove(args.audio_path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Индекс привязок Telegram-чатов к клиентам
+Чаты клиента находятся по id клиента и по ИНН словарями, без перебора
+всех привязок. Индекс обновляется по одной привязке из уведомлений
+bindings_changed (init-scripts/07-bindings-notify.sql); у каждого изменения
+есть версия, и пропуск версии означает, что индекс нужно перечитать целиком.
+"""
+
+from typing import Any, Dict, Iterable, Mapping, Optional, Set
+
+
+class BindingIndex:
+    """Активные привязки: по id привязки, клиенту, ИНН и чату"""
+
+    def __init__(self):
+        self.version = 0
+        self.bindings: Dict[int, Dict[str, Any]] = {}
+        # client_id / ИНН -> {chat_id: id привязки}
+        self.by_client: Dict[int, Dict[int, int]] = {}
+        self.by_inn: Dict[int, Dict[int, int]] = {}
+        # chat_id -> id привязок
+        self.by_chat: Dict[int, Set[int]] = {}
+
+    def load(self, version: int, rows: Iterable[Mapping[str, Any]]) -> None:
+        """Заменяет индекс полной выборкой активных привязок версии version"""
+        self.version = version
+        self.bindings, self.by_client, self.by_inn, self.by_chat = {}, {}, {}, {}
+        for row in rows:
+            self._add(row)
+
+    def apply(self, event: Mapping[str, Any]) -> bool:
+        """
+        Применяет изменение одной привязки
+
+        Args:
+            event: Уведомление bindings_changed (version, id, chat_id, client_id,
+                   client_inn, company_name, active)
+
+        Returns:
+            False, если пропущена версия и индекс нужно перечитать
+        """
+        version = event['version']
+        if version <= self.version:
+            # Уже учтено полной выборкой
+            return True
+        if version != self.version + 1:
+            return False
+
+        self.version = version
+        self._remove(event['id'])
+        if event['active']:
+            self._add(event)
+        return True
+
+    def _add(self, row: Mapping[str, Any]) -> None:
+        binding = {
+            'id': row['id'],
+            'chat_id': row['chat_id'],
+            'client_id': row['client_id'],
+            'client_inn': row['client_inn'],
+            'company_name': row['company_name'],
+        }
+        self.bindings[binding['id']] = binding
+        self.by_client.setdefault(binding['client_id'], {})[binding['chat_id']] = binding['id']
+        self.by_inn.setdefault(binding['client_inn'], {})[binding['chat_id']] = binding['id']
+        self.by_chat.setdefault(binding['chat_id'], set()).add(binding['id'])
+
+    def _remove(self, binding_id: int) -> None:
+        binding = self.bindings.pop(binding_id, None)
+        if binding is None:
+            return
+        chat_id = binding['chat_id']
+        for index, key in ((self.by_client, binding['client_id']), (self.by_inn, binding['client_inn'])):
+            chats = index.get(key)
+            if chats is not None and chats.get(chat_id) == binding_id:
+                del chats[chat_id]
+                if not chats:
+                    del index[key]
+        chat_bindings = self.by_chat.get(chat_id)
+        if chat_bindings is not None:
+            chat_bindings.discard(binding_id)
+            if not chat_bindings:
+                del self.by_chat[chat_id]
+
+    def remove_chat(self, chat_id: int) -> None:
+        """Убирает все привязки чата"""
+        for binding_id in list(self.by_chat.get(chat_id, ())):
+            self._remove(binding_id)
+
+    def chats_for_client(self, client_id: Optional[int], client_inn: Optional[int]) -> Set[int]:
+        """Чаты, привязанные к клиенту по id или по ИНН"""
+        chats = set(self.by_client.get(client_id, ())) if client_id else set()
+        if client_inn:
+            chats.update(self.by_inn.get(client_inn, ()))
+        return chats
+
+    def __len__(self) -> int:
+        return len(self.bindings)
+
+    @property
+    def chats_count(self) -> int:
+        return len(self.by_chat)
@@ -0,0 +1,148 @@
+"""
+Заглушка Telegram Bot API для бенчмарков отправки
+Отвечает на sendMessage/sendAudio/sendVoice/sendDocument с заданной задержкой
+(загрузка файла — --upload-ms, отправка текста или по file_id — --text-ms)
+и соблюдает лимиты Bot API так же, как сервер Telegram: при превышении
+отвечает 429 с parameters.retry_after
+  - 30 сообщений в секунду на бота
+  - 1 сообщение в секунду в личный чат, 20 сообщений в минуту в группу
+
+Использование:
+    python botapi_standin.py [--port 8081] [--text-ms 50] [--upload-ms 300]
+Бот подключается к заглушке через AiohttpSession(api=TelegramAPIServer.from_base(url))
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Лимиты: (сообщений, окно в секундах)
+GLOBAL_LIMIT = (30, 1.0)
+PRIVATE_LIMIT = (1, 1.0)
+GROUP_LIMIT = (20, 60.0)
+
+UPLOAD_METHODS = {"sendaudio", "sendvoice", "senddocument", "sendmediagroup"}
+
+
+class BotApiStandin:
+    """Обработчик методов Bot API с лимитами и задержкой"""
+
+    def __init__(self, text_delay: float = 0.05, upload_delay: float = 0.3, enforce_limits: bool = True):
+        self.text_delay = text_delay
+        self.upload_delay = upload_delay
+        self.enforce_limits = enforce_limits
+        self.sent: Deque[float] = deque()
+        self.chat_sent: Dict[int, Deque[float]] = {}
+        self.message_ids = itertools.count(1)
+        self.counters = {"ok": 0, "too_many_requests": 0, "uploads": 0}
+
+    @staticmethod
+    def _retry_after(history: Deque[float], limit: Tuple[int, float], now: float) -> int:
+        """Через сколько секунд окно освободится (0 — лимит не превышен)"""
+        count, window = limit
+        while history and now - history[0] >= window:
+            history.popleft()
+        if len(history) < count:
+            return 0
+        return max(1, math.ceil(window - (now - history[0])))
+
+    def check_limits(self, chat_id: int) -> int:
+        if not self.enforce_limits:
+            return 0
+        now = time.monotonic()
+        history = self.chat_sent.setdefault(chat_id, deque())
+        retry_after = max(
+            self._retry_after(self.sent, GLOBAL_LIMIT, now),
+            self._retry_after(history, GROUP_LIMIT if chat_id < 0 else PRIVATE_LIMIT, now),
+        )
+        if not retry_after:
+            self.sent.append(now)
+            history.append(now)
+        return retry_after
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        chat_id = int(form.get("chat_id", 0))
+
+        retry_after = self.check_limits(chat_id)
+        if retry_after:
+            self.counters["too_many_requests"] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            })
+
+        # Загрузка файла дольше отправки по file_id
+        upload = any(isinstance(value, web.FileField) for value in form.values())
+        await asyncio.sleep(self.upload_delay if upload else self.text_delay)
+        self.counters["ok"] += 1
+        if upload:
+            self.counters["uploads"] += 1
+
+        chat = {"id": chat_id, "type": "group" if chat_id < 0 else "private"}
+        if method == "sendmediagroup":
+            # Медиагруппа: сообщение на каждый файл
+            return web.json_response({"ok": True, "result": [
+                self._audio_message(chat, item.get("caption", ""))
+                for item in json.loads(form.get("media", "[]"))
+            ]})
+        message = {"message_id": next(self.message_ids), "date": int(time.time()), "chat": chat}
+        if method == "sendmessage":
+            message["text"] = form.get("text", "")
+        elif method in UPLOAD_METHODS:
+            message = self._audio_message(chat, form.get("caption", ""))
+        return web.json_response({"ok": True, "result": message})
+
+    def _audio_message(self, chat: dict, caption: str) -> dict:
+        message_id = next(self.message_ids)
+        unique = f"standin{message_id}"
+        return {"message_id": message_id, "date": int(time.time()), "chat": chat, "caption": caption,
+                "audio": {"file_id": unique, "file_unique_id": unique, "duration": 1}}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+
+async def serve(standin: BotApiStandin, host: str, port: int) -> web.AppRunner:
+    """Запускает заглушку в текущем цикле событий"""
+    runner = web.AppRunner(standin.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--text-ms", type=float, default=50, help="Задержка ответа на текст, мс")
+    parser.add_argument("--upload-ms", type=float, default=300, help="Задержка ответа на загрузку файла, мс")
+    parser.add_argument("--no-limits", action="store_true", help="Не отвечать 429")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - BOTAPI_STANDIN - %(levelname)s - %(message)s')
+    standin = BotApiStandin(args.text_ms / 1000, args.upload_ms / 1000, not args.no_limits)
+    await serve(standin, args.host, args.port)
+    logger.info(f"✅ Заглушка Bot API слушает http://{args.host}:{args.port}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,88 @@
+"""
+Объединение уведомлений одного чата за короткое окно
+Первое уведомление чата уходит сразу. Уведомления, пришедшие в этот чат
+в течение окна после последней отправки, копятся и уходят одной сводкой
+по окончании окна (или сразу, когда их набралось max_items). Так частые
+звонки одного клиента или одновременные проблемы нескольких клиентов
+группы не превращаются в поток отдельных сообщений и загрузок.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+COALESCE_WINDOW = float(os.getenv("NOTIFIER_COALESCE_WINDOW", "5"))
+
+# Больше 10 файлов в одной медиагруппе Telegram не принимает
+COALESCE_MAX_ITEMS = 10
+
+Flush = Callable[[int, List[Any]], None]
+
+
+class ChatBuffer:
+    """Накопленные уведомления чата и время последней отправки"""
+
+    __slots__ = ("items", "sent_at", "timer")
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.sent_at = float("-inf")
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class ChatCoalescer:
+    """Окно объединения уведомлений по чатам"""
+
+    def __init__(self, flush: Flush, window: float = COALESCE_WINDOW, max_items: int = COALESCE_MAX_ITEMS):
+        self.flush = flush
+        self.window = window
+        self.max_items = max_items
+        self.chats: Dict[int, ChatBuffer] = {}
+
+    def add(self, chat_id: int, item: Any) -> None:
+        """
+        Добавляет уведомление чата
+
+        Уведомление уходит сразу, если чат не получал уведомлений
+        последние window секунд и ничего не ждёт отправки
+        """
+        if self.window <= 0:
+            self.flush(chat_id, [item])
+            return
+
+        buffer = self.chats.get(chat_id)
+        if buffer is None:
+            buffer = self.chats[chat_id] = ChatBuffer()
+
+        now = time.monotonic()
+        if not buffer.items and now - buffer.sent_at >= self.window:
+            buffer.sent_at = now
+            self.flush(chat_id, [item])
+            return
+
+        buffer.items.append(item)
+        if len(buffer.items) >= self.max_items:
+            self._flush(chat_id)
+        elif buffer.timer is None:
+            delay = max(0.0, buffer.sent_at + self.window - now)
+            buffer.timer = asyncio.get_running_loop().call_later(delay, self._flush, chat_id)
+
+    def _flush(self, chat_id: int) -> None:
+        buffer = self.chats[chat_id]
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+            buffer.timer = None
+        items, buffer.items = buffer.items, []
+        buffer.sent_at = time.monotonic()
+        if items:
+            self.flush(chat_id, items)
+
+    def flush_all(self) -> None:
+        """Отправляет всё накопленное (при остановке)"""
+        for chat_id, buffer in list(self.chats.items()):
+            if buffer.items:
+                self._flush(chat_id)
+
+    def pending(self) -> int:
+        return sum(len(buffer.items) for buffer in self.chats.values())
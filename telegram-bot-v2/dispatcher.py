@@ -0,0 +1,368 @@
+"""
+Параллельная отправка уведомлений с ограничением скорости
+Пул из DISPATCH_WORKERS исполнителей отправляет сообщения в разные чаты
+одновременно, соблюдая лимиты Telegram Bot API:
+  - не больше ~30 сообщений в секунду на бота (общий token bucket)
+  - не больше 1 сообщения в секунду в личный чат
+  - не больше 20 сообщений в минуту в группу (chat_id < 0)
+
+У каждого чата своя очередь: сообщения одного чата уходят по порядку,
+а чат, которому рано отправлять, не занимает исполнителя — он
+возвращается в очередь готовых, когда наполнится его ведро.
+Ответ 429 (TelegramRetryAfter) откладывает чат на retry_after секунд,
+сообщение отправляется повторно.
+
+Исполнители никогда не спят: отложенные действия (повтор после ошибки,
+retry_after, ожидание токена) ставятся в RetryScheduler — кучу сроков,
+которую обслуживает одна задача-таймер. Ошибки отправки делятся на
+временные (сеть, 5xx — повтор с экспоненциальной отсрочкой и разбросом),
+постоянные для сообщения (400 — без повторов), потерю чата (бот удалён,
+чат не найден) и перенос группы в супергруппу. При потере или переносе
+чата остальные сообщения чата сразу завершаются той же ошибкой; при потере
+владелец диспетчера деактивирует привязки чата, при переносе — переводит
+их и сообщения на новый id чата.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramMigrateToChat,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+
+# Лимиты: сообщений в секунду и допустимый всплеск
+# Общий лимит чуть ниже 30/сек и без всплеска: ведро с запасом 30 за первую
+# секунду пропустило бы до 60 сообщений, а сервер считает окно по прибытию
+GLOBAL_RATE = float(os.getenv("DISPATCH_GLOBAL_RATE", "28"))
+GLOBAL_BURST = float(os.getenv("DISPATCH_GLOBAL_BURST", "1"))
+PRIVATE_RATE = float(os.getenv("DISPATCH_PRIVATE_RATE", "1"))
+PRIVATE_BURST = float(os.getenv("DISPATCH_PRIVATE_BURST", "1"))
+GROUP_RATE = float(os.getenv("DISPATCH_GROUP_PER_MINUTE", "20")) / 60
+GROUP_BURST = float(os.getenv("DISPATCH_GROUP_BURST", "3"))
+
+# Сколько раз повторять сообщение после 429
+MAX_RETRY_AFTER = int(os.getenv("DISPATCH_MAX_RETRY_AFTER", "5"))
+
+# Повторы после временных ошибок: число и отсрочка (удваивается, с разбросом 50–100%), сек
+MAX_RETRIES = int(os.getenv("DISPATCH_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("DISPATCH_RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("DISPATCH_RETRY_MAX_DELAY", "60"))
+
+# Виды ошибок отправки
+RETRY = "retry"
+PERMANENT = "permanent"
+CHAT_GONE = "chat_gone"
+MIGRATED = "migrated"
+
+# Ответы 400, означающие, что чата для бота больше нет
+CHAT_GONE_MESSAGES = ("chat not found", "bot was kicked", "user is deactivated")
+
+Send = Callable[[], Awaitable[bool]]
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Вид ошибки отправки
+
+    Returns:
+        RETRY — временная, стоит повторить; PERMANENT — повтор не поможет;
+        CHAT_GONE — бот удалён из чата или чата больше нет;
+        MIGRATED — группа стала супергруппой (новый id в migrate_to_chat_id)
+    """
+    if isinstance(error, TelegramMigrateToChat):
+        return MIGRATED
+    if isinstance(error, TelegramForbiddenError):
+        return CHAT_GONE
+    if isinstance(error, TelegramBadRequest):
+        message = error.message.lower()
+        return CHAT_GONE if any(text in message for text in CHAT_GONE_MESSAGES) else PERMANENT
+    if isinstance(error, (TelegramServerError, TelegramNetworkError)):
+        return RETRY
+    if isinstance(error, TelegramAPIError):
+        # 401, 404, 409: ошибка бота или запроса, повтор не поможет
+        return PERMANENT
+    # Таймауты, обрывы соединения и прочие ошибки клиента
+    return RETRY
+
+
+def retry_delay(retries: int) -> float:
+    """Отсрочка повтора номер retries + 1: экспоненциальная, с разбросом"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** retries)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class RetryScheduler:
+    """Отложенные действия: куча сроков и одна задача-таймер"""
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, Callable[[], None]]] = []
+        self.sequence = itertools.count()
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run(), name="dispatch-scheduler")
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        """Выполнит callback через delay секунд"""
+        due = time.monotonic() + delay
+        heapq.heappush(self.heap, (due, next(self.sequence), callback))
+        if self.heap[0][0] == due:
+            # Новый ближайший срок — таймер пересчитывает ожидание
+            self.changed.set()
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self.heap and self.heap[0][0] <= now:
+                _, _, callback = heapq.heappop(self.heap)
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка отложенного действия: {e}")
+            timeout = self.heap[0][0] - now if self.heap else None
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.heap.clear()
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """Меняет скорость; накопленное по старой скорости сохраняется"""
+        self._refill(time.monotonic())
+        self.rate = rate
+
+    def delay(self) -> float:
+        """Через сколько секунд будет доступен токен (0 — уже доступен)"""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> float:
+        """
+        Резервирует токен (ведро может уйти в минус)
+
+        Returns:
+            Сколько секунд подождать до использования токена
+        """
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def block(self, seconds: float) -> None:
+        """Опустошает ведро на seconds секунд (ответ 429)"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class ChatQueue:
+    """Очередь сообщений одного чата"""
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        if chat_id < 0:
+            self.bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+        else:
+            self.bucket = TokenBucket(PRIVATE_RATE, PRIVATE_BURST)
+        self.jobs: Deque[Tuple[Send, asyncio.Future, int]] = deque()
+        # Чат в очереди готовых, у исполнителя или ждёт таймера
+        self.scheduled = False
+
+
+class NotificationDispatcher:
+    """Пул исполнителей отправки с лимитами по чатам и на бота"""
+
+    def __init__(self, workers: int = DISPATCH_WORKERS,
+                 global_rate: float = GLOBAL_RATE, global_burst: float = GLOBAL_BURST,
+                 on_chat_gone: Optional[Callable[[int, BaseException], None]] = None):
+        self.workers_count = workers
+        self.on_chat_gone = on_chat_gone
+        self.scheduler = RetryScheduler()
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        # Ведро чата переживает его пустую очередь; число чатов ограничено привязками
+        self.chats: Dict[int, ChatQueue] = {}
+        self.ready: "asyncio.Queue[int]" = asyncio.Queue()
+        self.workers: Set[asyncio.Task] = set()
+        self.pending = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.counters = {"sent": 0, "failed": 0, "retry_after": 0, "retried": 0, "chat_gone": 0, "migrated": 0}
+
+    def start(self) -> None:
+        self.scheduler.start()
+        for number in range(self.workers_count):
+            self.workers.add(asyncio.create_task(self._worker(), name=f"dispatch-{number}"))
+        logger.info(f"📮 Диспетчер отправки: {self.workers_count} исполнителей, "
+                    f"до {self.global_bucket.rate:g} сообщений/сек")
+
+    def submit(self, chat_id: int, send: Send) -> asyncio.Future:
+        """
+        Ставит отправку в очередь чата
+
+        Args:
+            chat_id: ID чата
+            send: Корутина-функция отправки, возвращает True при успехе
+
+        Returns:
+            Future с результатом отправки; при ошибке, которую не исправили
+            повторы, — с исключением (вид — classify_error)
+        """
+        future = asyncio.get_running_loop().create_future()
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            chat = self.chats[chat_id] = ChatQueue(chat_id)
+        chat.jobs.append((send, future, 0))
+        self.pending += 1
+        self.idle.clear()
+        if not chat.scheduled:
+            chat.scheduled = True
+            self.ready.put_nowait(chat_id)
+        return future
+
+    def set_global_rate(self, rate: float) -> None:
+        """Меняет лимит на бота (доля общего лимита при нескольких экземплярах notifier)"""
+        if rate != self.global_bucket.rate:
+            self.global_bucket.set_rate(rate)
+            logger.info(f"📮 Лимит отправки: до {rate:g} сообщений/сек")
+
+    def _reschedule(self, chat: ChatQueue, delay: float) -> None:
+        """Возвращает чат в очередь готовых через delay секунд"""
+        if delay > 0:
+            chat_id = chat.chat_id
+            self.scheduler.call_later(delay, lambda: self.ready.put_nowait(chat_id))
+        else:
+            self.ready.put_nowait(chat.chat_id)
+
+    def _finish(self, future: asyncio.Future, result: bool = False, error: Optional[BaseException] = None) -> None:
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        self.counters["sent" if result and error is None else "failed"] += 1
+        self.pending -= 1
+        if self.pending == 0:
+            self.idle.set()
+
+    def _drop_chat(self, chat: ChatQueue, kind: str, error: BaseException) -> None:
+        """Чата больше нет или он перенесён: остальные сообщения завершаются той же ошибкой"""
+        self.counters[kind] += 1
+        while chat.jobs:
+            _, future, _ = chat.jobs.popleft()
+            self._finish(future, error=error)
+        if kind == CHAT_GONE and self.on_chat_gone is not None:
+            self.on_chat_gone(chat.chat_id, error)
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self.ready.get()
+            chat = self.chats[chat_id]
+            if not chat.jobs:
+                chat.scheduled = False
+                continue
+
+            # Чату или боту ещё рано: исполнитель не ждёт, чат вернётся по таймеру
+            delay = max(chat.bucket.delay(), self.global_bucket.delay())
+            if delay > 0:
+                self._reschedule(chat, delay)
+                continue
+
+            send, future, retries = chat.jobs.popleft()
+            chat.bucket.take()
+            self.global_bucket.take()
+
+            try:
+                result = await send()
+            except TelegramRetryAfter as e:
+                self.counters["retry_after"] += 1
+                chat.bucket.block(e.retry_after)
+                if retries < MAX_RETRY_AFTER:
+                    logger.warning(f"⏳ Чат {chat_id}: 429, повтор через {e.retry_after} сек")
+                    chat.jobs.appendleft((send, future, retries + 1))
+                    self._reschedule(chat, e.retry_after)
+                    continue
+                logger.error(f"❌ Чат {chat_id}: 429 после {retries} повторов, сообщение не отправлено")
+                self._finish(future, error=e)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == RETRY and retries < MAX_RETRIES:
+                    delay = retry_delay(retries)
+                    self.counters["retried"] += 1
+                    logger.warning(f"⏳ Ошибка отправки в чат {chat_id}: {e}. "
+                                   f"Повтор через {delay:.1f} сек (попытка {retries + 1}/{MAX_RETRIES})")
+                    chat.jobs.appendleft((send, future, retries + 1))
+                    self._reschedule(chat, delay)
+                    continue
+                logger.error(f"❌ Ошибка отправки в чат {chat_id} ({kind}): {e}")
+                self._finish(future, error=e)
+                if kind in (CHAT_GONE, MIGRATED):
+                    self._drop_chat(chat, kind, e)
+            else:
+                self._finish(future, result)
+
+            if chat.jobs:
+                self._reschedule(chat, chat.bucket.delay())
+            else:
+                chat.scheduled = False
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт отправки всех поставленных сообщений. Возвращает True, если успели"""
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self, timeout: Optional[float] = 30) -> None:
+        """Дожидается очереди (не дольше timeout) и останавливает исполнителей"""
+        if not await self.drain(timeout):
+            logger.warning(f"⚠️ Не отправлено при остановке: {self.pending}")
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers.clear()
+        await self.scheduler.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": self.pending, "chats": len(self.chats), "scheduled": len(self.scheduler),
+                **self.counters}
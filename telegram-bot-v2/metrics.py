@@ -0,0 +1,38 @@
+"""
+Метрики notifier
+Счётчики отправляются UDP-датаграммами в call_state_service.py
+(agi-bin/call_state_service.py, тот же формат, что agilib.metrics.emit),
+который отдаёт их на /metrics и /stats. Контейнер бота работает в сети
+хоста, поэтому сервис доступен по 127.0.0.1
+"""
+
+import json
+import os
+import socket
+from typing import Any, Optional
+
+METRICS_HOST = os.getenv("AGI_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("AGI_METRICS_PORT", "8125"))
+
+_socket: Optional[socket.socket] = None
+
+
+def emit(name: str, value: float = 1, **tags: Any) -> None:
+    """
+    Увеличивает счётчик name на value
+
+    Args:
+        name: Имя метрики
+        value: Приращение
+        tags: Метки метрики
+    """
+    global _socket
+    try:
+        if _socket is None:
+            _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _socket.setblocking(False)
+        payload = {"name": name, "value": value, "tags": {k: str(v) for k, v in tags.items()}}
+        _socket.sendto(json.dumps(payload).encode("utf-8"), (METRICS_HOST, METRICS_PORT))
+    except OSError:
+        # Метрики не должны влиять на отправку уведомлений
+        pass
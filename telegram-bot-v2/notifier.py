@@ -4,21 +4,50 @@
 и отправки уведомлений в привязанные Telegram группы
 Поддерживает множество клиентов в одной группе и отправку аудиофайлов
 Версия: конвертация WAV в OGG через внешний скрипт на хосте
+
+Уведомления берутся из очереди notification_outbox: триггер verification_logs
+(init-scripts/06-notification-outbox.sql) при сохранении problem_text
+добавляет строку на каждый привязанный чат и уведомляет канал problem_ready.
+Notifier слушает канал на отдельном соединении и забирает строки пачками;
+состояние доставки (pending/sending/sent/failed), число попыток и время
+следующей попытки хранятся в БД, поэтому после простоя очередь дорабатывается
+с того места, где остановилась. Редкий резервный опрос подбирает уведомления,
+потерянные при переподключении
+
+Экземпляров notifier может быть несколько (init-scripts/08-notifier-leases.sql):
+каждый берёт строки только тех чатов, аренду которых держит, строки
+забираются через FOR UPDATE SKIP LOCKED, а аренды продлеваются, пока
+экземпляр жив. Аренды упавшего экземпляра истекают через NOTIFIER_LEASE_TIMEOUT
+секунд, и его чаты забирают остальные. Общий лимит отправки бота делится
+между живыми экземплярами
 """
 
 import asyncio
+import json
 import logging
 import os
+import socket
 import sys
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, NamedTuple, Optional, Any, Set, Tuple
 
 import asyncpg
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaAudio, Message
 from aiogram.client.session.aiohttp import AiohttpSession
 from dotenv import load_dotenv
 
+import metrics
+from audio_cache import AudioCache
+from bindings import BindingIndex
+from coalescer import ChatCoalescer
+from dispatcher import GLOBAL_RATE, MIGRATED, PERMANENT, RETRY, NotificationDispatcher, classify_error
+from transcoder import TranscodePool, find_converter
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -48,15 +77,69 @@ if not BOT_TOKEN:
     logger.error("BOT_TOKEN не установлен!")
     sys.exit(1)
 
-# Интервал проверки
-CHECK_INTERVAL = int(os.getenv("NOTIFIER_INTERVAL", "5"))
+# Канал уведомлений триггера и интервал резервного опроса, сек
+NOTIFY_CHANNEL = "problem_ready"
+FALLBACK_INTERVAL = int(os.getenv("NOTIFIER_FALLBACK_INTERVAL", "60"))
+
+# Канал изменений привязок (init-scripts/07-bindings-notify.sql)
+BINDINGS_CHANNEL = "bindings_changed"
+
+# Период сверки версии индекса привязок с БД и проверки соединения слушателя, сек
+BINDINGS_REFRESH_INTERVAL = int(os.getenv("NOTIFIER_BINDINGS_REFRESH", "300"))
+LISTEN_KEEPALIVE = 30
+
+# Очередь уведомлений: строк за раз (и не больше в отправке), попыток на строку,
+# отсрочка после неудачи (удваивается с каждой попыткой), сек
+OUTBOX_BATCH = int(os.getenv("NOTIFIER_OUTBOX_BATCH", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("NOTIFIER_OUTBOX_ATTEMPTS", "5"))
+OUTBOX_RETRY_DELAY = int(os.getenv("NOTIFIER_OUTBOX_RETRY_DELAY", "60"))
+OUTBOX_RETRY_MAX = 3600
+
+# Имя экземпляра notifier (по умолчанию уникально для каждого запуска) и срок аренды
+# его чатов и строк очереди, сек; аренды продлеваются каждую треть срока
+WORKER_ID = os.getenv("NOTIFIER_WORKER_ID") or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+LEASE_TIMEOUT = int(os.getenv("NOTIFIER_LEASE_TIMEOUT", "60"))
+LEASE_RENEW_INTERVAL = LEASE_TIMEOUT / 3
+
+# Поля проблемы для уведомления
+PROBLEM_QUERY = """
+    SELECT
+        v.id,
+        v.call_uniqueid,
+        v.caller_number,
+        v.spoken_inn,
+        v.matched_client_id,
+        v.problem_text,
+        v.problem_recognized_at,
+        v.created_at,
+        v.success,
+        v.problem_audio_path,
+        c.id as client_db_id,
+        c.inn as client_inn,
+        c.company_name,
+        c.code_word,
+        c.phone_number
+    FROM verification_logs v
+    LEFT JOIN clients c ON v.matched_client_id = c.id
+"""
+
+# Сколько file_id загруженных записей держать в памяти (остальные — в БД)
+AUDIO_FILE_IDS_LIMIT = 1000
+
+# Ограничения Telegram на длину текста сообщения и подписи к файлу
+MESSAGE_LIMIT = 4096
+MEDIA_CAPTION_LIMIT = 1024
 
 # Путь к скрипту конвертации на хосте
 CONVERT_SCRIPT = os.getenv("CONVERT_SCRIPT", "/usr/local/bin/convert_audio.sh")
 
-# Временная директория для сконвертированных файлов
-TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/telegram_bot_audio")
-os.makedirs(TEMP_DIR, exist_ok=True)
+
+
+class Notification(NamedTuple):
+    """Строка очереди с подготовленным уведомлением"""
+    row: Dict[str, Any]
+    text: str
+    audio_path: Optional[str]
 
 
 class ProblemNotifier:
@@ -71,17 +154,39 @@ class ProblemNotifier:
         # Инициализируем бота с нашей сессией
         self.bot = Bot(token=BOT_TOKEN, session=session)
         self.db_pool = None
-        self.last_check_id = 0
         self.running = True
-        self.bindings_cache = {}  # Кэш привязок для оптимизации
-
-        # Проверяем доступность скрипта конвертации
-        # self.convert_script_available = os.path.exists(CONVERT_SCRIPT)
-        self.convert_script_available = False
-        if self.convert_script_available:
-            logger.info(f"✅ Скрипт конвертации найден: {CONVERT_SCRIPT}")
+        # Индекс привязок чатов; stale — перечитать целиком (пропущено изменение)
+        self.bindings = BindingIndex()
+        self.bindings_stale = False
+        self.bindings_checked_at = 0.0
+
+        # Пробуждение цикла очереди: NOTIFY, переподключение слушателя, освободилось место
+        self.wakeup = asyncio.Event()
+        self.listen_conn = None
+
+        # Параллельная отправка с лимитами Telegram (запускается в run)
+        self.dispatcher = NotificationDispatcher(on_chat_gone=self._on_chat_gone)
+        # Окно объединения уведомлений чата в сводку
+        self.coalescer = ChatCoalescer(self._dispatch)
+        # Строки очереди в отправке (id -> chat_id) и задачи записи их итога в БД
+        self.inflight: Dict[int, int] = {}
+        # Сколько экземпляров notifier делят лимит бота
+        self.workers_alive = 1
+        self.backlog = False
+        self.completions: Set[asyncio.Task] = set()
+
+        # file_id загруженных записей: (media_type, file_id) по пути к записи
+        self.audio_file_ids: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self.upload_locks: Dict[str, asyncio.Lock] = {}
+
+        # Пул конвертации (скрипт на хосте, иначе ffmpeg) с дисковым кэшем результатов
+        self.audio_cache = AudioCache()
+        self.transcoder = TranscodePool(find_converter(CONVERT_SCRIPT), self.audio_cache)
+        if self.transcoder.available:
+            logger.info(f"✅ Конвертация: {self.transcoder.command[0]}, "
+                        f"до {self.transcoder.workers} процессов одновременно")
         else:
-            logger.warning(f"⚠️ Скрипт конвертации не найден: {CONVERT_SCRIPT}")
+            logger.warning(f"⚠️ Скрипт конвертации не найден: {CONVERT_SCRIPT}, ffmpeg тоже нет")
             logger.warning("⚠️ Аудиофайлы будут отправляться в исходном формате WAV")
 
     async def init_db(self):
@@ -91,12 +196,25 @@ class ProblemNotifier:
             logger.info("✅ Подключение к БД установлено")
 
             async with self.db_pool.acquire() as conn:
-                self.last_check_id = await conn.fetchval(
-                    "SELECT COALESCE(MAX(id), 0) FROM verification_logs"
-                )
-                logger.info(f"🆔 Начальный ID для мониторинга: {self.last_check_id}")
-
-                # Загружаем кэш привязок
+                await self.heartbeat(conn)
+                # Строки, взятые этим же экземпляром до перезапуска (при постоянном NOTIFIER_WORKER_ID),
+                # возвращаются сразу; строки других экземпляров освободятся истечением аренды
+                await conn.execute("""
+                    UPDATE notification_outbox
+                    SET state = 'pending', lease_expires_at = NULL
+                    WHERE state = 'sending' AND claimed_by = $1
+                """, WORKER_ID)
+                waiting, orphaned = await conn.fetchrow("""
+                    SELECT COUNT(*) FILTER (WHERE state = 'pending'),
+                           COUNT(*) FILTER (WHERE state = 'sending' AND lease_expires_at < CURRENT_TIMESTAMP)
+                    FROM notification_outbox
+                    WHERE state IN ('pending', 'sending')
+                """)
+                logger.info(f"📬 Очередь уведомлений: {waiting} к отправке, "
+                            f"{orphaned} с истёкшей арендой; экземпляр {WORKER_ID}, "
+                            f"всего живых: {self.workers_alive}")
+
+                # Загружаем индекс привязок
                 await self._refresh_bindings_cache(conn)
 
         except Exception as e:
@@ -104,164 +222,429 @@ class ProblemNotifier:
             raise
 
     async def _refresh_bindings_cache(self, conn=None):
-        """Обновление кэша привязок"""
+        """Полная перезагрузка индекса привязок вместе с их версией"""
         close_conn = False
         if not conn:
             conn = await self.db_pool.acquire()
             close_conn = True
 
         try:
-            rows = await conn.fetch("""
-                SELECT chat_id, client_id, client_inn, company_name
-                FROM telegram_group_bindings 
-                WHERE active = true
-            """)
+            # Версия и привязки из одного снимка БД
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                version = await conn.fetchval("SELECT version FROM telegram_bindings_version")
+                rows = await conn.fetch("""
+                    SELECT id, chat_id, client_id, client_inn, company_name
+                    FROM telegram_group_bindings 
+                    WHERE active = true
+                """)
 
-            self.bindings_cache = {}
-            for row in rows:
-                chat_id = row['chat_id']
-                if chat_id not in self.bindings_cache:
-                    self.bindings_cache[chat_id] = []
+            self.bindings.load(version or 0, rows)
+            self.bindings_stale = False
+            self.bindings_checked_at = time.monotonic()
+            logger.info(f"📚 Индекс привязок загружен (версия {self.bindings.version}): "
+                        f"{self.bindings.chats_count} чатов, {len(self.bindings)} привязок")
+
+        finally:
+            if close_conn:
+                await self.db_pool.release(conn)
+
+    async def check_bindings_version(self) -> bool:
+        """
+        Сверяет версию индекса привязок с БД и перечитывает его при расхождении
+
+        Returns:
+            True, если индекс перечитан
+        """
+        async with self.db_pool.acquire() as conn:
+            version = await conn.fetchval("SELECT version FROM telegram_bindings_version")
+            self.bindings_checked_at = time.monotonic()
+            if not self.bindings_stale and (version or 0) == self.bindings.version:
+                return False
+            logger.warning(f"⚠️ Индекс привязок устарел (версия {self.bindings.version}, в БД {version}), "
+                           f"перезагрузка")
+            await self._refresh_bindings_cache(conn)
+            return True
+
+    def get_chats_for_client(self, client_id: Optional[int], client_inn: Optional[int]) -> Set[int]:
+        """Чаты, привязанные к клиенту (по id клиента или по ИНН)"""
+        return self.bindings.chats_for_client(client_id, client_inn)
+
+    async def is_chat_bound(self, chat_id: int, problem: Dict[str, Any]) -> bool:
+        """Привязан ли ещё чат к клиенту проблемы; при промахе индекс сверяется с БД"""
+        client_id = problem.get('matched_client_id')
+        client_inn = problem.get('client_inn') or problem.get('spoken_inn')
+        if chat_id in self.get_chats_for_client(client_id, client_inn):
+            return True
+        # Уведомление о новой привязке могло ещё не дойти
+        return (await self.check_bindings_version()
+                and chat_id in self.get_chats_for_client(client_id, client_inn))
+
+    async def claim_outbox(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Забирает в отправку строки очереди, которым подошло время
+
+        Строки берутся только из чатов, аренду которых держит или получил
+        этот экземпляр: так чат обслуживает один notifier, и порядок
+        уведомлений и лимиты чата соблюдаются. Строки в sending с истёкшей
+        арендой (экземпляр упал) забираются так же, как pending.
+
+        Args:
+            limit: Сколько строк взять
+
+        Returns:
+            Строки по порядку id: id, verification_log_id, chat_id, attempts,
+            age (сек с постановки в очередь)
+        """
+        own = list(self.inflight)
+        async with self.db_pool.acquire() as conn:
+            # Чаты с готовыми строками, кроме арендованных другими
+            chats = await conn.fetch("""
+                SELECT o.chat_id
+                FROM notification_outbox o
+                LEFT JOIN notification_chat_leases l ON l.chat_id = o.chat_id
+                WHERE ((o.state = 'pending' AND o.next_attempt_at <= CURRENT_TIMESTAMP)
+                       OR (o.state = 'sending' AND o.lease_expires_at < CURRENT_TIMESTAMP))
+                  AND NOT o.id = ANY($3::bigint[])
+                  AND (l.chat_id IS NULL OR l.worker_id = $1 OR l.expires_at < CURRENT_TIMESTAMP)
+                GROUP BY o.chat_id
+                ORDER BY MIN(o.id)
+                LIMIT $2
+            """, WORKER_ID, limit, own)
+            if not chats:
+                return []
+            chat_ids = [row['chat_id'] for row in chats]
+
+            # Строки аренды заводятся заранее, чтобы захватывать их без ожидания.
+            # Порядок по chat_id: одновременные вставки разных экземпляров не блокируют друг друга по кругу
+            await conn.execute("""
+                INSERT INTO notification_chat_leases (chat_id, worker_id, expires_at)
+                SELECT chat_id, '', '-infinity'::timestamp
+                FROM unnest($1::bigint[]) AS chat_id
+                ORDER BY chat_id
+                ON CONFLICT (chat_id) DO NOTHING
+            """, chat_ids)
+
+            async with conn.transaction():
+                # Аренды, занятые другим экземпляром прямо сейчас, пропускаются
+                leased = await conn.fetch("""
+                    UPDATE notification_chat_leases l
+                    SET worker_id = $1, expires_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+                    FROM (
+                        SELECT chat_id FROM notification_chat_leases
+                        WHERE chat_id = ANY($3::bigint[])
+                          AND (worker_id = $1 OR expires_at < CURRENT_TIMESTAMP)
+                        ORDER BY chat_id
+                        FOR UPDATE SKIP LOCKED
+                    ) free
+                    WHERE l.chat_id = free.chat_id
+                    RETURNING l.chat_id
+                """, WORKER_ID, float(LEASE_TIMEOUT), chat_ids)
+                if not leased:
+                    return []
 
-                self.bindings_cache[chat_id].append({
-                    'client_id': row['client_id'],
-                    'client_inn': row['client_inn'],
-                    'company_name': row['company_name']
-                })
+                rows = await conn.fetch("""
+                    UPDATE notification_outbox o
+                    SET state = 'sending', claimed_by = $1, claimed_at = CURRENT_TIMESTAMP,
+                        lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $2),
+                        attempts = o.attempts + 1
+                    FROM (
+                        SELECT id FROM notification_outbox
+                        WHERE chat_id = ANY($3::bigint[])
+                          AND ((state = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                               OR (state = 'sending' AND lease_expires_at < CURRENT_TIMESTAMP))
+                          AND NOT id = ANY($5::bigint[])
+                        ORDER BY id
+                        LIMIT $4
+                        FOR UPDATE SKIP LOCKED
+                    ) due
+                    WHERE o.id = due.id
+                    RETURNING o.id, o.verification_log_id, o.chat_id, o.attempts,
+                              EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - o.created_at)::float AS age
+                """, WORKER_ID, float(LEASE_TIMEOUT), [row['chat_id'] for row in leased], limit, own)
+        return sorted((dict(row) for row in rows), key=lambda row: row['id'])
+
+    async def heartbeat(self, conn=None) -> None:
+        """
+        Продлевает аренды чатов и строк этого экземпляра и делит лимит бота
+        между живыми экземплярами
 
-            logger.info(f"📚 Кэш привязок обновлен: {len(self.bindings_cache)} чатов, "
-                        f"{sum(len(v) for v in self.bindings_cache.values())} привязок")
+        Аренда чата без строк в отправке не продлевается: она истечёт,
+        и чат сможет взять любой экземпляр
+        """
+        close_conn = False
+        if not conn:
+            conn = await self.db_pool.acquire()
+            close_conn = True
 
+        try:
+            async with conn.transaction():
+                await conn.execute("""
+                    INSERT INTO notification_workers (worker_id, heartbeat_at)
+                    VALUES ($1, CURRENT_TIMESTAMP)
+                    ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = EXCLUDED.heartbeat_at
+                """, WORKER_ID)
+                if self.inflight:
+                    await conn.execute("""
+                        UPDATE notification_chat_leases
+                        SET expires_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+                        WHERE worker_id = $1 AND chat_id = ANY($3::bigint[])
+                    """, WORKER_ID, float(LEASE_TIMEOUT), list(set(self.inflight.values())))
+                    await conn.execute("""
+                        UPDATE notification_outbox
+                        SET lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+                        WHERE state = 'sending' AND claimed_by = $1 AND id = ANY($3::bigint[])
+                    """, WORKER_ID, float(LEASE_TIMEOUT), list(self.inflight))
+                alive = await conn.fetchval("""
+                    SELECT COUNT(*) FROM notification_workers
+                    WHERE heartbeat_at > CURRENT_TIMESTAMP - make_interval(secs => $1)
+                """, float(LEASE_TIMEOUT))
         finally:
             if close_conn:
                 await self.db_pool.release(conn)
 
-    async def get_new_problems(self) -> List[Dict[str, Any]]:
-        """Получает новые записи с проблемами, включая путь к аудио"""
+        alive = max(alive, 1)
+        if alive != self.workers_alive:
+            logger.info(f"👥 Экземпляров notifier: {alive}")
+            self.workers_alive = alive
+        self.dispatcher.set_global_rate(GLOBAL_RATE / alive)
+
+    async def keep_leases(self):
+        """Продлевает аренды, пока notifier работает"""
+        while self.running:
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                # Не продлённые вовремя строки и чаты заберут другие экземпляры
+                logger.error(f"❌ Не удалось продлить аренды: {e}")
+
+    async def release_leases(self):
+        """Отдаёт чаты и неотправленные строки другим экземплярам (при остановке)"""
         try:
             async with self.db_pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT 
-                        v.id,
-                        v.call_uniqueid,
-                        v.caller_number,
-                        v.spoken_inn,
-                        v.matched_client_id,
-                        v.problem_text,
-                        v.problem_recognized_at,
-                        v.created_at,
-                        v.success,
-                        v.problem_audio_path,
-                        c.id as client_db_id,
-                        c.inn as client_inn,
-                        c.company_name,
-                        c.code_word,
-                        c.phone_number
-                    FROM verification_logs v
-                    LEFT JOIN clients c ON v.matched_client_id = c.id
-                    WHERE v.id > $1
-                      AND v.problem_text IS NOT NULL 
-                      AND v.problem_text != ''
-                    ORDER BY v.id ASC
-                """, self.last_check_id)
-
-                new_problems = [dict(row) for row in rows]
-
-                if new_problems:
-                    self.last_check_id = max(p['id'] for p in new_problems)
-                    logger.info(f"🔍 Найдено {len(new_problems)} новых проблем. "
-                                f"Новый last_id: {self.last_check_id}")
-
-                    # Логируем информацию об аудиофайлах
-                    for p in new_problems:
-                        if p.get('problem_audio_path'):
-                            logger.info(f"🎵 Проблема {p['id']} имеет аудиофайл: {p['problem_audio_path']}")
-
-                return new_problems
-
+                async with conn.transaction():
+                    released = await conn.fetchval("""
+                        WITH released AS (
+                            UPDATE notification_outbox
+                            SET state = 'pending', lease_expires_at = NULL
+                            WHERE state = 'sending' AND claimed_by = $1
+                            RETURNING 1
+                        )
+                        SELECT COUNT(*) FROM released
+                    """, WORKER_ID)
+                    await conn.execute("DELETE FROM notification_chat_leases WHERE worker_id = $1", WORKER_ID)
+                    await conn.execute("DELETE FROM notification_workers WHERE worker_id = $1", WORKER_ID)
+            logger.info(f"📬 Аренды освобождены, возвращено в очередь: {released}")
         except Exception as e:
-            logger.error(f"Ошибка при получении проблем: {e}")
-            return []
+            logger.error(f"❌ Не удалось освободить аренды (истекут через {LEASE_TIMEOUT} сек): {e}")
 
-    async def get_chats_for_client(self, client_id: int, client_inn: int) -> List[int]:
+    async def next_due_delay(self) -> Optional[float]:
         """
-        Получает список всех чатов, привязанных к клиенту
-        Использует кэш для оптимизации
+        Через сколько секунд этот экземпляр сможет взять ближайшую строку
+        (None — очередь пуста)
+
+        Строка чата, арендованного другим экземпляром, подходит не раньше
+        истечения аренды; строка в sending — по истечении её аренды
         """
-        chats = []
-        for chat_id, clients in self.bindings_cache.items():
-            for client in clients:
-                if (client['client_id'] == client_id or
-                        client['client_inn'] == client_inn):
-                    chats.append(chat_id)
-                    break
+        async with self.db_pool.acquire() as conn:
+            return await conn.fetchval("""
+                SELECT EXTRACT(EPOCH FROM MIN(GREATEST(
+                    CASE WHEN o.state = 'pending' THEN o.next_attempt_at ELSE o.lease_expires_at END,
+                    COALESCE(l.expires_at, '-infinity')
+                )) - CURRENT_TIMESTAMP)::float
+                FROM notification_outbox o
+                LEFT JOIN notification_chat_leases l ON l.chat_id = o.chat_id AND l.worker_id <> $1
+                WHERE o.state = 'pending' OR (o.state = 'sending' AND o.claimed_by IS DISTINCT FROM $1)
+            """, WORKER_ID)
+
+    async def get_problems(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Выбирает записи с проблемами по id"""
+        async with self.db_pool.acquire() as conn:
+            rows = await conn.fetch(PROBLEM_QUERY + """
+                WHERE v.id = ANY($1::bigint[])
+            """, ids)
+        return {row['id']: dict(row) for row in rows}
+
+    async def complete(self, row: Dict[str, Any], success: bool, error: str = "", retry: bool = True) -> None:
+        """
+        Записывает итог отправки строки очереди
 
-        return chats
+        Неудачная строка возвращается в очередь с отсрочкой, после
+        OUTBOX_MAX_ATTEMPTS попыток (или сразу, если retry=False) помечается failed.
+        Итог записывается, только пока строка арендована этим экземпляром
+        """
+        # Строка ещё наша: в sending и взята этим экземпляром
+        owned = "WHERE id = $1 AND state = 'sending' AND claimed_by = $2"
+        try:
+            async with self.db_pool.acquire() as conn:
+                if success:
+                    status = await conn.execute("""
+                        UPDATE notification_outbox
+                        SET state = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL,
+                            lease_expires_at = NULL
+                    """ + owned, row['id'], WORKER_ID)
+                elif row['attempts'] >= OUTBOX_MAX_ATTEMPTS or not retry:
+                    status = await conn.execute("""
+                        UPDATE notification_outbox
+                        SET state = 'failed', last_error = $3, lease_expires_at = NULL
+                    """ + owned, row['id'], WORKER_ID, error)
+                    logger.error(f"❌ Уведомление о проблеме {row['verification_log_id']} в чат {row['chat_id']} "
+                                 f"не доставлено ({row['attempts']} попыток): {error}")
+                else:
+                    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_DELAY * 2 ** (row['attempts'] - 1))
+                    status = await conn.execute("""
+                        UPDATE notification_outbox
+                        SET state = 'pending', last_error = $3, lease_expires_at = NULL,
+                            next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $4)
+                    """ + owned, row['id'], WORKER_ID, error, float(delay))
+                    logger.warning(f"⏳ Уведомление о проблеме {row['verification_log_id']} в чат {row['chat_id']} "
+                                   f"отложено на {delay} сек (попытка {row['attempts']}/{OUTBOX_MAX_ATTEMPTS})")
+            if status == "UPDATE 0":
+                # Аренда истекла (продление не удалось), строку уже взял другой экземпляр
+                logger.warning(f"⚠️ Строка очереди {row['id']} больше не арендована {WORKER_ID}, итог не записан")
+        except Exception as e:
+            # Строка останется в sending и вернётся в очередь по истечении аренды
+            logger.error(f"❌ Не удалось записать итог отправки {row['id']}: {e}")
+        finally:
+            self.inflight.pop(row['id'], None)
+            if self.backlog:
+                self.wakeup.set()
 
-    async def convert_audio_via_host(self, wav_path: str) -> Optional[str]:
+    def _track_completion(self, row: Dict[str, Any], future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.inflight.pop(row['id'], None)
+            return
+        error = future.exception()
+        if error is None:
+            outcome = self.complete(row, future.result(), "не отправлено")
+        elif classify_error(error) == MIGRATED:
+            outcome = self.migrate_chat(row, error.migrate_to_chat_id)
+        else:
+            # Постоянные ошибки (400, бот удалён из чата) не повторяются
+            outcome = self.complete(row, False, str(error), retry=classify_error(error) == RETRY)
+        self._spawn(outcome)
+
+    async def migrate_chat(self, row: Dict[str, Any], new_chat_id: int) -> None:
         """
-        Конвертирует WAV в OGG через скрипт на хост-сервере
+        Группа стала супергруппой: привязки и строка очереди переводятся
+        на новый id чата, строка сразу уходит в отправку заново
+        (попытка не засчитывается)
         """
+        old_chat_id = row['chat_id']
+        try:
+            async with self.db_pool.acquire() as conn:
+                async with conn.transaction():
+                    # Изменения привязок доходят до индекса через bindings_changed
+                    moved = await conn.execute("""
+                        UPDATE telegram_group_bindings b
+                        SET chat_id = $2
+                        WHERE b.chat_id = $1
+                          AND NOT EXISTS (
+                              SELECT 1 FROM telegram_group_bindings n
+                              WHERE n.chat_id = $2 AND n.client_id = b.client_id
+                          )
+                    """, old_chat_id, new_chat_id)
+                    # Клиент уже привязан к супергруппе — старая привязка не нужна
+                    await conn.execute("""
+                        UPDATE telegram_group_bindings SET active = false
+                        WHERE chat_id = $1 AND active = true
+                    """, old_chat_id)
+
+                    status = await conn.execute("""
+                        UPDATE notification_outbox o
+                        SET chat_id = $3, state = 'pending', attempts = o.attempts - 1,
+                            next_attempt_at = CURRENT_TIMESTAMP, lease_expires_at = NULL, last_error = $4
+                        WHERE o.id = $1 AND o.state = 'sending' AND o.claimed_by = $2
+                          AND NOT EXISTS (
+                              SELECT 1 FROM notification_outbox d
+                              WHERE d.verification_log_id = o.verification_log_id AND d.chat_id = $3
+                          )
+                    """, row['id'], WORKER_ID, new_chat_id, f"группа {old_chat_id} стала супергруппой")
+                    if status == "UPDATE 0":
+                        # Уведомление о той же проблеме в новый чат уже в очереди
+                        await conn.execute("""
+                            UPDATE notification_outbox
+                            SET state = 'failed', last_error = $3, lease_expires_at = NULL
+                            WHERE id = $1 AND state = 'sending' AND claimed_by = $2
+                        """, row['id'], WORKER_ID, f"перенесено в чат {new_chat_id}")
+            if moved != "UPDATE 0":
+                logger.info(f"🔀 Группа {old_chat_id} стала супергруппой {new_chat_id}: привязки перенесены")
+        except Exception as e:
+            # Строка вернётся в очередь по истечении аренды и снова получит ответ о переносе
+            logger.error(f"❌ Не удалось перенести чат {old_chat_id} -> {new_chat_id}: {e}")
+        finally:
+            self.inflight.pop(row['id'], None)
+            self.wakeup.set()
+
+    def _spawn(self, coroutine) -> None:
+        """Фоновая запись в БД; shutdown дожидается её до закрытия пула"""
+        task = asyncio.create_task(coroutine)
+        self.completions.add(task)
+        task.add_done_callback(self.completions.discard)
+
+    def _on_chat_gone(self, chat_id: int, error: BaseException) -> None:
+        """Бота удалили из чата или чата больше нет — привязки деактивируются"""
+        logger.warning(f"🚫 Чат {chat_id} недоступен: {error}")
+        if chat_id in self.bindings.by_chat:
+            self.bindings.remove_chat(chat_id)
+            self._spawn(self._deactivate_chat_bindings(chat_id))
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        """Обработчик NOTIFY: id записи из триггера"""
+        try:
+            problem_id = int(payload)
+        except ValueError:
+            logger.warning(f"⚠️ Некорректное уведомление {channel}: {payload!r}")
+            return
+        logger.debug(f"🔔 Проблема {problem_id} поставлена в очередь")
+        self.wakeup.set()
 
-        if not self.convert_script_available:
-            logger.warning("⚠️ Скрипт конвертации недоступен, отправляем WAV")
-            return None
-    
-        if not wav_path or not os.path.exists(wav_path):
-            logger.error(f"❌ Аудиофайл не найден: {wav_path}")
-            return None
-    
+    def _on_bindings_changed(self, connection, pid, channel, payload) -> None:
+        """Обработчик NOTIFY: изменение одной привязки"""
         try:
-            # Создаем уникальное имя для выходного файла
-            base_name = os.path.basename(wav_path)
-            name_without_ext = os.path.splitext(base_name)[0]
-            ogg_filename = f"{name_without_ext}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ogg"
-            ogg_path = os.path.join(TEMP_DIR, ogg_filename)
-    
-            logger.info(f"🔄 Запуск конвертации: {wav_path} -> {ogg_path}")
-    
-            # Вызываем скрипт конвертации на хосте
-            cmd = [
-                CONVERT_SCRIPT,
-                wav_path,
-                ogg_path
-            ]
-    
-            # Запускаем процесс и ждем завершения
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-    
-            stdout, stderr = await process.communicate()
-    
-            # Проверяем результат
-            if process.returncode == 0 and os.path.exists(ogg_path):
-                file_size = os.path.getsize(ogg_path)
-                logger.info(f"✅ Конвертация успешна: {ogg_path} ({file_size} байт)")
-                return ogg_path
-            else:
-                error_msg = stderr.decode() if stderr else "Неизвестная ошибка"
-                logger.error(f"❌ Ошибка конвертации (код {process.returncode}): {error_msg}")
-    
-                # Пробуем найти лог-файл скрипта
-                try:
-                    import glob
-                    log_files = glob.glob("/tmp/convert_audio_*.log")
-                    if log_files:
-                        latest_log = max(log_files, key=os.path.getctime)
-                        with open(latest_log, 'r') as f:
-                            log_content = f.read()
-                        logger.error(f"📋 Содержимое лога конвертации:\n{log_content}")
-                except Exception as log_e:
-                    logger.error(f"Не удалось прочитать лог: {log_e}")
-    
-                return None
+            event = json.loads(payload)
+            applied = self.bindings.apply(event)
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"⚠️ Некорректное уведомление {channel}: {payload!r}")
+            applied = False
+        if applied:
+            logger.info(f"🔗 Привязка {event['id']}: чат {event['chat_id']} — клиент {event['client_id']} "
+                        f"{'активна' if event['active'] else 'снята'} (версия {event['version']})")
+        elif not self.bindings_stale:
+            # Пропущено изменение: индекс перечитывается в основном цикле
+            self.bindings_stale = True
+            self.wakeup.set()
+
+    async def listen(self):
+        """Держит соединение LISTEN и переподключается при обрыве"""
+        listen_config = {k: v for k, v in DB_CONFIG.items() if k not in ("max_size", "min_size")}
+        delay = 1
+        while self.running:
+            try:
+                self.listen_conn = await asyncpg.connect(**listen_config)
+                await self.listen_conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                await self.listen_conn.add_listener(BINDINGS_CHANNEL, self._on_bindings_changed)
+                logger.info(f"👂 Подписка на каналы {NOTIFY_CHANNEL}, {BINDINGS_CHANNEL} установлена")
+                delay = 1
+                # Пока соединения не было, уведомления терялись — проверяем очередь
+                # и сверяем версию привязок
+                self.bindings_checked_at = 0.0
+                self.wakeup.set()
+
+                while self.running:
+                    await asyncio.sleep(LISTEN_KEEPALIVE)
+                    await self.listen_conn.execute("SELECT 1")
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка при конвертации аудио: {e}")
-            return None
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"❌ Соединение LISTEN потеряно: {e}. Переподключение через {delay} сек")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                if self.listen_conn is not None and not self.listen_conn.is_closed():
+                    await self.listen_conn.close()
+                self.listen_conn = None
 
     async def format_problem_message(self, problem: Dict[str, Any]) -> str:
         """Форматирует сообщение о проблеме"""
@@ -296,111 +679,176 @@ class ProblemNotifier:
 
         return message
 
-    async def send_notification_with_audio(self, chat_id: int, message_text: str,
-                                           audio_path: Optional[str] = None, retry_count: int = 0) -> bool:
+    async def get_audio_file_id(self, audio_path: str) -> Optional[Tuple[str, str]]:
         """
-        Отправляет уведомление с возможным аудиофайлом и повторными попытками
-
-        Args:
-            chat_id: ID чата
-            message_text: Текст сообщения
-            audio_path: Путь к аудиофайлу (опционально)
-            retry_count: Номер попытки
+        file_id записи, уже загруженной в Telegram
 
         Returns:
-            True если отправка успешна, False в противном случае
+            (media_type, file_id) или None, если запись ещё не загружалась
         """
-        max_retries = 3
-        converted_file = None
+        cached = self.audio_file_ids.get(audio_path)
+        if cached is not None:
+            self.audio_file_ids.move_to_end(audio_path)
+            return cached
+        if not self.db_pool:
+            return None
+        try:
+            async with self.db_pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT media_type, file_id FROM telegram_audio_files WHERE audio_path = $1",
+                    audio_path
+                )
+        except Exception as e:
+            logger.debug(f"Не удалось прочитать file_id для {audio_path}: {e}")
+            return None
+        if row is None:
+            return None
+        return self._remember_file_id(audio_path, (row['media_type'], row['file_id']))
+
+    def _remember_file_id(self, audio_path: str, cached: Tuple[str, str]) -> Tuple[str, str]:
+        self.audio_file_ids[audio_path] = cached
+        self.audio_file_ids.move_to_end(audio_path)
+        while len(self.audio_file_ids) > AUDIO_FILE_IDS_LIMIT:
+            self.audio_file_ids.popitem(last=False)
+        return cached
+
+    async def save_audio_file_id(self, audio_path: str, message: Message) -> None:
+        """Запоминает file_id загруженной записи в памяти и в БД"""
+        for media_type in ("audio", "voice", "document"):
+            media = getattr(message, media_type, None)
+            if media is not None:
+                break
+        else:
+            logger.warning(f"⚠️ В ответе Telegram нет файла для {audio_path}")
+            return
 
+        self._remember_file_id(audio_path, (media_type, media.file_id))
         try:
-            if audio_path and os.path.exists(audio_path):
-                # Пробуем сконвертировать аудио
-                if self.convert_script_available:
-                    converted_file = await self.convert_audio_via_host(audio_path)
-
-                if converted_file and os.path.exists(converted_file):
-                    # Отправляем сконвертированный OGG файл
-                    logger.info(f"📤 Отправка OGG файла: {converted_file} (попытка {retry_count + 1}/{max_retries})")
-                    audio_file = FSInputFile(converted_file)
-
-                    await self.bot.send_audio(
-                        chat_id=chat_id,
-                        audio=audio_file,
-                        caption=message_text,
-                        parse_mode="Markdown",
-                        title=f"Проблема от {datetime.now().strftime('%d.%m.%Y %H:%M')}",
-                        performer="Asterisk VOSK",
-                        request_timeout=120
-                    )
-                    logger.info(f"✅ OGG аудио отправлено в чат {chat_id}")
+            async with self.db_pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO telegram_audio_files (audio_path, media_type, file_id, file_unique_id)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (audio_path) DO UPDATE
+                    SET media_type = EXCLUDED.media_type,
+                        file_id = EXCLUDED.file_id,
+                        file_unique_id = EXCLUDED.file_unique_id,
+                        uploaded_at = CURRENT_TIMESTAMP
+                """, audio_path, media_type, media.file_id, media.file_unique_id)
+        except Exception as e:
+            logger.warning(f"⚠️ file_id для {audio_path} сохранён только в памяти: {e}")
 
-                else:
-                    # Отправляем оригинальный WAV файл
-                    logger.info(f"📤 Отправка WAV файла: {audio_path} (попытка {retry_count + 1}/{max_retries})")
-                    audio_file = FSInputFile(audio_path)
-
-                    await self.bot.send_audio(
-                        chat_id=chat_id,
-                        audio=audio_file,
-                        caption=message_text,
-                        parse_mode="Markdown",
-                        title=f"Проблема от {datetime.now().strftime('%d.%m.%Y %H:%M')} (WAV)",
-                        performer="Asterisk VOSK",
-                        request_timeout=120
-                    )
-                    logger.info(f"✅ WAV аудио отправлено в чат {chat_id}")
-
-                # Удаляем временный сконвертированный файл
-                if converted_file and os.path.exists(converted_file):
-                    try:
-                        os.remove(converted_file)
-                        logger.debug(f"🗑️ Временный файл удален: {converted_file}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Не удалось удалить временный файл: {e}")
+    async def forget_audio_file_id(self, audio_path: str) -> None:
+        """Удаляет file_id, который Telegram больше не принимает"""
+        self.audio_file_ids.pop(audio_path, None)
+        try:
+            async with self.db_pool.acquire() as conn:
+                await conn.execute("DELETE FROM telegram_audio_files WHERE audio_path = $1", audio_path)
+        except Exception as e:
+            logger.debug(f"Не удалось удалить file_id для {audio_path}: {e}")
 
-                return True
+    async def upload_audio(self, chat_id: int, message_text: str, audio_path: str) -> None:
+        """Загружает запись в чат (первый из привязанных) и сохраняет её file_id"""
+        # Конвертация обычно уже запущена при подготовке проблемы
+        converted_file = await self.transcoder.convert(audio_path)
 
-            else:
-                # Отправляем только текст
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text=message_text,
-                    parse_mode="Markdown",
-                    request_timeout=60
-                )
-                logger.info(f"✅ Текстовое уведомление отправлено в чат {chat_id}")
-                return True
+        if converted_file and os.path.exists(converted_file):
+            # Отправляем сконвертированный OGG файл (остаётся в кэше)
+            logger.info(f"📤 Отправка OGG файла: {converted_file}")
+            upload_path, title_suffix, audio_format = converted_file, "", "OGG"
+        else:
+            # Отправляем оригинальный WAV файл
+            logger.info(f"📤 Отправка WAV файла: {audio_path}")
+            upload_path, title_suffix, audio_format = audio_path, " (WAV)", "WAV"
+
+        message = await self.bot.send_audio(
+            chat_id=chat_id,
+            audio=FSInputFile(upload_path),
+            caption=message_text,
+            parse_mode="Markdown",
+            title=f"Проблема от {datetime.now().strftime('%d.%m.%Y %H:%M')}{title_suffix}",
+            performer="Asterisk VOSK",
+            request_timeout=120
+        )
+        logger.info(f"✅ {audio_format} аудио отправлено в чат {chat_id}")
+        await self.save_audio_file_id(audio_path, message)
+
+    async def send_audio_by_file_id(self, chat_id: int, message_text: str, audio_path: str,
+                                    cached: Tuple[str, str]) -> bool:
+        """
+        Отправляет уже загруженную запись по file_id
 
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки в чат {chat_id}: {e}")
-
-            # Повторяем попытку если не превысили лимит
-            if retry_count < max_retries:
-                wait_time = 2 ** retry_count  # Экспоненциальная задержка: 1, 2, 4 секунды
-                logger.info(f"⏳ Повторная попытка через {wait_time} сек (попытка {retry_count + 1}/{max_retries})")
-                await asyncio.sleep(wait_time)
-                return await self.send_notification_with_audio(chat_id, message_text, audio_path, retry_count + 1)
-            else:
-                logger.error(f"❌ Все попытки отправки в чат {chat_id} исчерпаны")
-                return False
+        Returns:
+            False, если Telegram не принял file_id (запись нужно загрузить заново)
+        """
+        media_type, file_id = cached
+        send = {
+            "audio": self.bot.send_audio,
+            "voice": self.bot.send_voice,
+            "document": self.bot.send_document,
+        }[media_type]
+        try:
+            await send(chat_id, file_id, caption=message_text, parse_mode="Markdown", request_timeout=60)
+        except TelegramBadRequest as e:
+            if "file" not in e.message.lower():
+                raise
+            logger.warning(f"⚠️ Telegram не принял file_id записи {audio_path}: {e.message}")
+            await self.forget_audio_file_id(audio_path)
+            return False
+        logger.info(f"✅ Аудио отправлено в чат {chat_id} по file_id")
+        return True
 
-    async def send_notifications(self, problem: Dict[str, Any]):
-        """Отправляет уведомление о проблеме во все привязанные чаты"""
-        client_id = problem.get('matched_client_id')
-        client_inn = problem.get('client_inn') or problem.get('spoken_inn')
+    async def send_notification_with_audio(self, chat_id: int, message_text: str,
+                                           audio_path: Optional[str] = None) -> bool:
+        """
+        Отправляет уведомление с возможным аудиофайлом
 
-        if not client_id and not client_inn:
-            logger.debug(f"Проблема {problem['id']} не привязана к клиенту")
-            return
+        Запись загружается в Telegram один раз: первый чат получает файл,
+        остальные чаты и повторные попытки — по сохранённому file_id.
+        Ошибки не перехватываются: повторы с отсрочкой и разбор ошибок
+        выполняет диспетчер, не задерживая другие отправки
 
-        # Получаем все чаты для этого клиента
-        chat_ids = await self.get_chats_for_client(client_id, client_inn)
+        Args:
+            chat_id: ID чата
+            message_text: Текст сообщения
+            audio_path: Путь к аудиофайлу (опционально)
 
-        if not chat_ids:
-            logger.debug(f"Нет привязанных чатов для клиента {client_id or client_inn}")
-            return
+        Returns:
+            True после успешной отправки
+        """
+        if audio_path and os.path.exists(audio_path):
+            cached = await self.get_audio_file_id(audio_path)
+            if cached is not None and await self.send_audio_by_file_id(chat_id, message_text, audio_path, cached):
+                return True
 
+            # Загружает один чат, остальные ждут и отправляют по file_id
+            lock = self.upload_locks.setdefault(audio_path, asyncio.Lock())
+            try:
+                async with lock:
+                    cached = await self.get_audio_file_id(audio_path)
+                    if cached is None:
+                        await self.upload_audio(chat_id, message_text, audio_path)
+                        return True
+            finally:
+                # Блокировка больше не нужна, кто бы её ни держал: загрузивший или дождавшийся file_id
+                if self.upload_locks.get(audio_path) is lock:
+                    del self.upload_locks[audio_path]
+
+            if not await self.send_audio_by_file_id(chat_id, message_text, audio_path, cached):
+                raise RuntimeError(f"Telegram не принял file_id записи {audio_path}")
+            return True
+
+        # Отправляем только текст
+        await self.bot.send_message(
+            chat_id=chat_id,
+            text=message_text,
+            parse_mode="Markdown",
+            request_timeout=60
+        )
+        logger.info(f"✅ Текстовое уведомление отправлено в чат {chat_id}")
+        return True
+
+    async def prepare_problem(self, problem: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Текст уведомления и путь к аудио (None, если файла нет)"""
         # Форматируем сообщение
         message_text = await self.format_problem_message(problem)
 
@@ -413,24 +861,180 @@ class ProblemNotifier:
             file_size = os.path.getsize(audio_path)
             logger.info(f"🎵 Найден аудиофайл: {audio_path} (размер: {file_size} байт)")
 
-        # Отправляем во все чаты
-        sent_count = 0
-        failed_chats = []
+            # Запись ещё не загружалась — конвертируем заранее, параллельно с другими отправками
+            if self.transcoder.available and await self.get_audio_file_id(audio_path) is None:
+                self.transcoder.start(audio_path)
 
-        for chat_id in chat_ids:
-            success = await self.send_notification_with_audio(chat_id, message_text, audio_path)
+        return message_text, audio_path
 
-            if success:
-                sent_count += 1
-                # Пауза между отправками в разные чаты
-                await asyncio.sleep(1)
-            else:
-                failed_chats.append(chat_id)
+    async def send_notifications(self, rows: List[Dict[str, Any]]):
+        """Ставит строки очереди в диспетчер: чаты обслуживаются параллельно с соблюдением лимитов"""
+        try:
+            problems = await self.get_problems(sorted({row['verification_log_id'] for row in rows}))
+        except Exception as e:
+            logger.error(f"Ошибка при получении проблем: {e}")
+            for row in rows:
+                await self.complete(row, False, str(e))
+            return
+        prepared: Dict[int, Tuple[str, Optional[str]]] = {}
+
+        for row in rows:
+            problem_id = row['verification_log_id']
+            problem = problems.get(problem_id)
+            if problem is None or not problem.get('problem_text'):
+                await self.complete(row, False, "проблема не найдена", retry=False)
+                continue
+
+            if not await self.is_chat_bound(row['chat_id'], problem):
+                await self.complete(row, False, "привязка снята", retry=False)
+                continue
+
+            if problem_id not in prepared:
+                prepared[problem_id] = await self.prepare_problem(problem)
+                if row['attempts'] == 1:
+                    logger.info(f"⏱️ Проблема {problem_id}: {row['age']:.3f} сек от сохранения до отправки")
+            message_text, audio_path = prepared[problem_id]
+
+            # Уведомления чата за короткое окно уходят одной сводкой
+            self.coalescer.add(row['chat_id'], Notification(row, message_text, audio_path))
 
-        logger.info(f"📨 Отправлено {sent_count} уведомлений для проблемы {problem['id']}")
+    def _dispatch(self, chat_id: int, items: List[Notification]) -> None:
+        """
+        Ставит в диспетчер одно уведомление или сводку нескольких
 
-        if failed_chats:
-            logger.warning(f"Не удалось отправить в чаты: {failed_chats}")
+        Каждый запрос к Telegram (медиагруппа, часть текстовой сводки,
+        отдельная запись) — своё задание диспетчера: оно берёт токены чата
+        и бота, а повтор после ошибки не отправляет заново уже доставленное
+        """
+        with_audio = [item for item in items if item.audio_path]
+        without_audio = [item for item in items if not item.audio_path]
+        jobs = 0
+
+        if len(with_audio) > 1:
+            future = self.dispatcher.submit(chat_id, lambda: self.send_audio_group(chat_id, with_audio))
+            future.add_done_callback(lambda f: self._audio_group_done(chat_id, with_audio, f))
+            jobs += 1
+        else:
+            for item in with_audio:
+                self._submit_single(chat_id, item)
+                jobs += 1
+
+        if len(without_audio) > 1:
+            for chunk_items, chunk in self.text_digest_chunks(without_audio, len(items)):
+                future = self.dispatcher.submit(chat_id, lambda chunk=chunk: self.send_text_chunk(chat_id, chunk))
+                self._track_items(chunk_items, future)
+                jobs += 1
+        else:
+            for item in without_audio:
+                self._submit_single(chat_id, item)
+                jobs += 1
+
+        if len(items) > 1:
+            metrics.emit("notifier_digests_total")
+            logger.info(f"🗞️ Сводка в чат {chat_id}: {len(items)} проблем за {jobs} запросов")
+
+    def _submit_single(self, chat_id: int, item: Notification) -> None:
+        future = self.dispatcher.submit(
+            chat_id, lambda: self.send_notification_with_audio(chat_id, item.text, item.audio_path)
+        )
+        future.add_done_callback(lambda f: self._track_completion(item.row, f))
+
+    def _track_items(self, items: List[Notification], future: asyncio.Future) -> None:
+        """Итог одного запроса сводки — итог каждой её строки очереди"""
+        def done(f: asyncio.Future) -> None:
+            if not f.cancelled() and f.exception() is None and f.result():
+                metrics.emit("notifier_messages_saved_total", len(items) - 1)
+            for item in items:
+                self._track_completion(item.row, f)
+        future.add_done_callback(done)
+
+    def _audio_group_done(self, chat_id: int, items: List[Notification], future: asyncio.Future) -> None:
+        """Медиагруппу не приняли (ошибка 400) — записи отправляются по одной"""
+        error = None if future.cancelled() else future.exception()
+        if isinstance(error, TelegramBadRequest) and classify_error(error) == PERMANENT:
+            logger.warning(f"⚠️ Медиагруппа не принята чатом {chat_id}: {error.message}. Отправка по одной записи")
+            for item in items:
+                self._submit_single(chat_id, item)
+            return
+        self._track_items(items, future)
+
+    async def send_audio_group(self, chat_id: int, items: List[Notification]) -> bool:
+        """
+        Записи нескольких проблем одной медиагруппой (подпись — текст проблемы)
+
+        Returns:
+            True после успешной отправки
+        """
+        media = []
+        for item in items:
+            cached = await self.get_audio_file_id(item.audio_path)
+            if cached is not None and cached[0] == "audio":
+                source = cached[1]
+            else:
+                converted_file = await self.transcoder.convert(item.audio_path)
+                source = FSInputFile(converted_file if converted_file and os.path.exists(converted_file)
+                                     else item.audio_path)
+            media.append(InputMediaAudio(
+                media=source,
+                caption=item.text[:MEDIA_CAPTION_LIMIT],
+                parse_mode="Markdown",
+                performer="Asterisk VOSK"
+            ))
+
+        messages = await self.bot.send_media_group(chat_id=chat_id, media=media, request_timeout=120)
+        for item, message in zip(items, messages):
+            if await self.get_audio_file_id(item.audio_path) is None:
+                await self.save_audio_file_id(item.audio_path, message)
+        logger.info(f"✅ Медиагруппа из {len(items)} записей отправлена в чат {chat_id}")
+        return True
+
+    def text_digest_chunks(self, items: List[Notification],
+                           total: int) -> List[Tuple[List[Notification], str]]:
+        """
+        Делит тексты проблем на сообщения не длиннее MESSAGE_LIMIT по границам проблем
+
+        Returns:
+            (уведомления сообщения, текст сообщения); заголовок сводки — в первом
+        """
+        header = f"🗞️ **СВОДКА: {total} проблем за {self.coalescer.window:g} сек**\n\n"
+        separator = "\n\n━━━━━━━━━━\n\n"
+        chunks: List[Tuple[List[Notification], str]] = []
+        current_items: List[Notification] = []
+        current = header
+        for item in items:
+            part = separator + item.text if current_items else item.text
+            if current_items and len(current) + len(part) > MESSAGE_LIMIT:
+                chunks.append((current_items, current))
+                current_items, current, part = [], "", item.text
+            current_items.append(item)
+            current += part
+        chunks.append((current_items, current))
+        return chunks
+
+    async def send_text_chunk(self, chat_id: int, text: str) -> bool:
+        """Одно сообщение текстовой сводки"""
+        await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown", request_timeout=60)
+        logger.info(f"✅ Текстовая сводка отправлена в чат {chat_id}")
+        return True
+
+    async def process_outbox(self):
+        """Забирает строки очереди пачками, пока есть место в отправке"""
+        self.backlog = False
+        while self.running:
+            room = OUTBOX_BATCH - len(self.inflight)
+            if room <= 0:
+                # Продолжим, когда освободится место
+                self.backlog = True
+                return
+            rows = await self.claim_outbox(room)
+            # Аренды взятых строк продлеваются, пока они в отправке
+            for row in rows:
+                self.inflight[row['id']] = row['chat_id']
+            if rows:
+                logger.info(f"🔍 Взято из очереди: {len(rows)} уведомлений")
+                await self.send_notifications(rows)
+            if len(rows) < room:
+                return
 
     async def _deactivate_chat_bindings(self, chat_id: int):
         """Деактивирует все привязки для чата"""
@@ -442,9 +1046,8 @@ class ProblemNotifier:
                     WHERE chat_id = $1 AND active = true
                 """, chat_id)
 
-            # Обновляем кэш
-            if chat_id in self.bindings_cache:
-                del self.bindings_cache[chat_id]
+            # Обновляем индекс, не дожидаясь уведомлений
+            self.bindings.remove_chat(chat_id)
 
             logger.info(f"⚠️ Деактивированы привязки для чата {chat_id}")
 
@@ -453,54 +1056,67 @@ class ProblemNotifier:
 
     async def run(self):
         """Основной цикл мониторинга"""
-        logger.info(f"🔄 Notifier запущен. Интервал проверки: {CHECK_INTERVAL} сек")
+        logger.info(f"🔄 Notifier запущен. Канал: {NOTIFY_CHANNEL}, резервный опрос: {FALLBACK_INTERVAL} сек")
 
-        if self.convert_script_available:
-            logger.info("✅ Режим: конвертация WAV -> OGG через внешний скрипт")
+        if self.transcoder.available:
+            logger.info("✅ Режим: конвертация WAV -> OGG в пуле процессов")
         else:
             logger.info("⚠️ Режим: отправка WAV файлов без конвертации")
 
-        refresh_counter = 0
-        while self.running:
-            try:
-                # Получаем новые проблемы
-                new_problems = await self.get_new_problems()
-
-                # Отправляем уведомления
-                for problem in new_problems:
-                    await self.send_notifications(problem)
-
-                # Периодически обновляем кэш привязок (каждые 60 циклов)
-                refresh_counter += 1
-                if refresh_counter >= 60:
-                    await self._refresh_bindings_cache()
-                    refresh_counter = 0
-
-                await asyncio.sleep(CHECK_INTERVAL)
+        self.dispatcher.start()
+        listener = asyncio.create_task(self.listen())
+        leases = asyncio.create_task(self.keep_leases())
+        try:
+            while self.running:
+                try:
+                    # Пропущено изменение привязок или пора сверить версию индекса
+                    if (self.bindings_stale or
+                            time.monotonic() - self.bindings_checked_at >= BINDINGS_REFRESH_INTERVAL):
+                        await self.check_bindings_version()
+
+                    await self.process_outbox()
+
+                    # Ждём уведомления, освобождения места или ближайшей отложенной строки
+                    timeout = FALLBACK_INTERVAL
+                    if not self.backlog:
+                        due = await self.next_due_delay()
+                        if due is not None:
+                            timeout = min(timeout, max(due, 0.1))
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    self.wakeup.clear()
 
-            except asyncio.CancelledError:
-                logger.info("Получен сигнал остановки")
-                break
-            except Exception as e:
-                logger.error(f"❌ Ошибка в основном цикле: {e}")
-                await asyncio.sleep(CHECK_INTERVAL)
+                except asyncio.CancelledError:
+                    logger.info("Получен сигнал остановки")
+                    break
+                except Exception as e:
+                    logger.error(f"❌ Ошибка в основном цикле: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            listener.cancel()
+            leases.cancel()
 
     async def shutdown(self):
         """Корректное завершение работы"""
         logger.info("Завершение работы notifier...")
         self.running = False
+        self.coalescer.flush_all()
+        await self.dispatcher.close()
+        # Итоги отправленных строк записываются до закрытия пула
+        if self.completions:
+            await asyncio.gather(*self.completions, return_exceptions=True)
+        await self.transcoder.close()
         if self.db_pool:
+            await self.release_leases()
             await self.db_pool.close()
         if self.bot:
             await self.bot.session.close()
 
-        # Очистка временной директории
-        try:
-            import shutil
-            shutil.rmtree(TEMP_DIR, ignore_errors=True)
-            logger.info(f"🗑️ Временная директория очищена: {TEMP_DIR}")
-        except Exception as e:
-            logger.warning(f"⚠️ Не удалось очистить временную директорию: {e}")
+        # Кэш сконвертированных записей сохраняется до следующего запуска
+        logger.info(f"📦 Кэш аудио {self.audio_cache.directory}: {self.audio_cache.stats()}")
+        self.audio_cache.close()
 
         logger.info("Notifier остановлен")
 
@@ -0,0 +1,166 @@
+"""
+Пул конвертации аудиозаписей проблем для Telegram (WAV -> OGG)
+Одновременно работает не больше TRANSCODE_WORKERS процессов конвертации,
+каждый ограничен TRANSCODE_TIMEOUT секунд. Повторный запрос той же записи
+не запускает второй процесс: все ожидающие получают результат одной
+конвертации. Конвертация запускается, как только строка очереди взята
+в отправку, и идёт параллельно с отправкой других уведомлений.
+Результаты хранятся в дисковом кэше (audio_cache.py): запись с тем же
+содержимым повторно не конвертируется.
+
+Конвертирует скрипт на хосте (CONVERT_SCRIPT, аргументы: вход, выход),
+если его нет — ffmpeg из образа (кодек Opus), если нет и его — записи
+отправляются в WAV.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+from typing import Dict, List, Optional
+
+from audio_cache import AudioCache
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "60"))
+
+# Сколько байт stderr конвертера выводить в лог при ошибке
+STDERR_TAIL = 2000
+
+
+# Подстановки в команде конвертации
+SOURCE = "{source}"
+OUTPUT = "{output}"
+
+
+def find_converter(script: str) -> Optional[List[str]]:
+    """Команда конвертации с подстановками SOURCE и OUTPUT (None — конвертировать нечем)"""
+    if script and os.path.exists(script):
+        return [script, SOURCE, OUTPUT]
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        # Кодек задан явно, а не выбран ffmpeg по расширению .ogg
+        return [ffmpeg, "-nostdin", "-loglevel", "error", "-y", "-i", SOURCE,
+                "-vn", "-c:a", "libopus", "-b:a", "32k", OUTPUT]
+    return None
+
+
+class TranscodePool:
+    """Ограниченный пул процессов конвертации с объединением одинаковых запросов"""
+
+    def __init__(self, command: Optional[List[str]], cache: AudioCache,
+                 workers: int = TRANSCODE_WORKERS, timeout: float = TRANSCODE_TIMEOUT):
+        self.command = command
+        self.cache = cache
+        self.timeout = timeout
+        self.slots = asyncio.Semaphore(workers)
+        self.workers = workers
+        # Идущие конвертации по исходному пути
+        self.jobs: Dict[str, asyncio.Task] = {}
+        self.counters = {"started": 0, "shared": 0, "failed": 0, "timeouts": 0}
+
+    @property
+    def available(self) -> bool:
+        return self.command is not None
+
+    def start(self, source: str) -> asyncio.Task:
+        """
+        Запускает конвертацию записи или возвращает уже запущенную
+
+        Returns:
+            Задача с путём к OGG или None при ошибке
+        """
+        job = self.jobs.get(source)
+        if job is not None:
+            self.counters["shared"] += 1
+            return job
+        job = self.jobs[source] = asyncio.create_task(self._convert(source))
+        job.add_done_callback(lambda _: self.jobs.pop(source, None))
+        self.counters["started"] += 1
+        return job
+
+    async def convert(self, source: str) -> Optional[str]:
+        """Путь к OGG для записи (None — отправлять исходный файл)"""
+        if not self.available:
+            return None
+        # shield: отмена одного ожидающего не прерывает общую конвертацию
+        return await asyncio.shield(self.start(source))
+
+    async def _convert(self, source: str) -> Optional[str]:
+        try:
+            key = await asyncio.to_thread(self.cache.key, source)
+        except OSError as e:
+            logger.error(f"❌ Не удалось прочитать запись {source}: {e}")
+            self.counters["failed"] += 1
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"📦 Конвертация {source} взята из кэша: {cached}")
+            return cached
+
+        output = self.cache.temp_path()
+        async with self.slots:
+            logger.info(f"🔄 Запуск конвертации: {source} -> {output}")
+            try:
+                arguments = [{SOURCE: source, OUTPUT: output}.get(arg, arg) for arg in self.command]
+                process = await asyncio.create_subprocess_exec(
+                    *arguments,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                    # Своя группа процессов: по таймауту убиваются и дочерние (ffmpeg из скрипта)
+                    start_new_session=True
+                )
+            except OSError as e:
+                logger.error(f"❌ Не удалось запустить конвертацию: {e}")
+                self.counters["failed"] += 1
+                return None
+
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                logger.error(f"❌ Конвертация {source} не уложилась в {self.timeout:g} сек")
+                self.counters["timeouts"] += 1
+                self._discard(output)
+                return None
+            except asyncio.CancelledError:
+                await self._kill(process)
+                self._discard(output)
+                raise
+
+        if process.returncode == 0 and os.path.exists(output) and os.path.getsize(output) > 0:
+            path = await asyncio.to_thread(self.cache.put, key, output)
+            logger.info(f"✅ Конвертация успешна: {path} ({os.path.getsize(path)} байт)")
+            return path
+
+        error_msg = stderr[-STDERR_TAIL:].decode(errors="replace").strip() if stderr else "Неизвестная ошибка"
+        logger.error(f"❌ Ошибка конвертации (код {process.returncode}): {error_msg}")
+        self.counters["failed"] += 1
+        self._discard(output)
+        return None
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def close(self) -> None:
+        """Останавливает идущие конвертации (готовые остаются в кэше)"""
+        jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)